@@ -0,0 +1,293 @@
+"""
+Adelgazado de PDFs escaneados antes de enviarlos a Gemini
+
+Los trabajos escaneados con el celular suelen pesar 20-60 MB por tener cada
+página como JPEG a resolución completa. Antes de enviarlos se genera una copia
+ligera:
+- las imágenes se recomprimen como JPEG con resolución máxima ADELGAZAR_MAX_DPI
+  (respecto al tamaño de la página) y calidad ADELGAZAR_CALIDAD
+- se descartan objetos no referenciados por las páginas, metadatos del
+  documento (Info/XMP) y miniaturas de página
+
+La copia solo se usa para la solicitud a la API; el Cal_*.pdf se sigue
+generando con el PDF original. Las copias se guardan en una caché en disco
+indexada por el contenido del PDF y los parámetros, así que cada PDF se
+adelgaza una sola vez.
+
+Las imágenes recomprimidas se escriben como objetos de flujo nuevos, con la
+API pública de PyPDF2 (versión fijada en requirements.txt).
+
+Imágenes que no se tocan: máscaras, imágenes con /Decode, CMYK, JPEG2000,
+CCITT y cualquier otra que no sea RGB/gris de 8 bits; tampoco las que no
+quedarían al menos un 10% más pequeñas.
+
+BackendAdelgazado envuelve cualquier backend de backends_calificacion y aplica
+el adelgazado a los PDFs de generar() y generar_lote().
+
+Memoria: adelgazar un PDF lo tiene varias veces en memoria (objetos de PyPDF2,
+imágenes decodificadas, la copia que se escribe), así que con un
+PresupuestoMemoria cada adelgazado reserva COPIAS_ADELGAZADO veces el tamaño
+del PDF. Conviene pasar el mismo presupuesto que limita los envíos del backend.
+"""
+
+import hashlib
+import zlib
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import NameObject, NumberObject, StreamObject
+
+try:
+    from PIL import Image
+    PIL_DISPONIBLE = True
+except ImportError:
+    PIL_DISPONIBLE = False
+
+from backends_calificacion import BackendCalificacion, LectorBytes, RespuestaBackend
+from cache_contenido import CacheContenido, calcular_clave
+from memoria_pdf import PresupuestoMemoria
+
+
+VERSION_ADELGAZADO = "1"
+AHORRO_MINIMO = 0.9  # Solo se reemplaza lo que queda por debajo del 90% del original
+COPIAS_ADELGAZADO = 3  # Memoria de un adelgazado: objetos leídos, imágenes y copia escrita
+
+FILTROS_PREVIOS = {'/ASCII85Decode', '/ASCIIHexDecode', '/FlateDecode'}
+CLAVES_PAGINA_DESCARTABLES = ['/Thumb', '/PieceInfo', '/Metadata']
+# Claves de la imagen original que no describen a la imagen recomprimida
+CLAVES_IMAGEN_REEMPLAZADAS = {'/Filter', '/DecodeParms', '/Length', '/Width', '/Height',
+                              '/ColorSpace', '/BitsPerComponent'}
+
+
+def _filtros(imagen) -> List[str]:
+    filtro = imagen.get('/Filter')
+    if filtro is None:
+        return []
+    if isinstance(filtro, list):
+        return [str(f) for f in filtro]
+    return [str(filtro)]
+
+
+def _modo_color(imagen) -> Optional[str]:
+    """Modo de Pillow para el espacio de color de la imagen, o None si no se soporta"""
+    espacio = imagen.get('/ColorSpace')
+    if espacio is None:
+        return None
+    espacio = espacio.get_object()
+
+    if espacio == '/DeviceRGB':
+        return 'RGB'
+    if espacio == '/DeviceGray':
+        return 'L'
+    if isinstance(espacio, list) and len(espacio) == 2 and espacio[0] == '/ICCBased':
+        componentes = espacio[1].get_object().get('/N')
+        return {3: 'RGB', 1: 'L'}.get(componentes)
+    return None
+
+
+def _reducir_imagen(imagen, ancho_pagina_pt: float, alto_pagina_pt: float,
+                    max_dpi: int, calidad: int) -> Optional[StreamObject]:
+    """
+    Imagen recomprimida como un nuevo objeto de flujo (JPEG), o None si la
+    imagen no se puede o no conviene recomprimir.
+    """
+    if imagen.get('/ImageMask') or '/Mask' in imagen or '/Decode' in imagen:
+        return None
+    if imagen.get('/BitsPerComponent') != 8:
+        return None
+
+    modo = _modo_color(imagen)
+    filtros = _filtros(imagen)
+    if modo is None or not filtros:
+        return None
+
+    es_jpeg = filtros[-1] == '/DCTDecode' and set(filtros[:-1]) <= FILTROS_PREVIOS
+    es_flate = set(filtros) <= FILTROS_PREVIOS
+    if not (es_jpeg or es_flate):
+        return None
+
+    ancho, alto = int(imagen['/Width']), int(imagen['/Height'])
+
+    # La imagen no necesita más resolución que max_dpi ocupando toda la página
+    escala = min(1.0,
+                 max_dpi * ancho_pagina_pt / 72.0 / ancho,
+                 max_dpi * alto_pagina_pt / 72.0 / alto)
+    destino = (max(1, round(ancho * escala)), max(1, round(alto * escala)))
+
+    try:
+        # get_data() quita los filtros previos; el JPEG se entrega tal cual
+        datos = imagen.get_data()
+        if es_jpeg:
+            original = len(datos)
+            img = Image.open(BytesIO(datos))
+            img.draft(modo, destino)  # Decodifica el JPEG directamente a escala reducida
+        else:
+            original = len(zlib.compress(datos))  # Aproxima el tamaño comprimido en el PDF
+            img = Image.frombytes(modo, (ancho, alto), datos)
+        img = img.convert(modo)
+    except Exception:
+        return None  # Imagen que Pillow no entiende: se deja igual
+
+    if img.size != destino and escala < 1.0:
+        img = img.resize(destino, Image.LANCZOS)
+
+    salida = BytesIO()
+    img.save(salida, format='JPEG', quality=calidad, optimize=True)
+    nuevo = salida.getvalue()
+
+    if len(nuevo) >= original * AHORRO_MINIMO:
+        return None
+
+    # Objeto nuevo en lugar de modificar los datos del flujo leído: solo API pública de PyPDF2
+    entradas = {clave: valor for clave, valor in imagen.items() if clave not in CLAVES_IMAGEN_REEMPLAZADAS}
+    entradas.update({
+        NameObject('/Filter'): NameObject('/DCTDecode'),
+        NameObject('/Width'): NumberObject(img.width),
+        NameObject('/Height'): NumberObject(img.height),
+        NameObject('/ColorSpace'): NameObject('/DeviceRGB' if modo == 'RGB' else '/DeviceGray'),
+        NameObject('/BitsPerComponent'): NumberObject(8),
+        NameObject('/Length'): NumberObject(len(nuevo)),
+        '__streamdata__': nuevo
+    })
+    return StreamObject.initialize_from_dictionary(entradas)
+
+
+def adelgazar_pdf(pdf_data: bytes, max_dpi: int = 150, calidad: int = 60) -> Optional[bytes]:
+    """
+    Retorna una copia ligera del PDF para enviarla a la API, o None si no se
+    logra una reducción de al menos el 10%.
+    """
+    if not PIL_DISPONIBLE:
+        return None
+
+    # Se lee directamente de pdf_data (bytes o mmap) sin copiarlo a un BytesIO
+    lector = LectorBytes(pdf_data)
+    try:
+        resultado = _escribir_adelgazado(PdfReader(lector), max_dpi, calidad)
+    finally:
+        lector.close()  # Libera la vista para que el mmap se pueda cerrar
+
+    if len(resultado) >= len(pdf_data) * AHORRO_MINIMO:
+        return None
+    return resultado
+
+
+def _escribir_adelgazado(reader: PdfReader, max_dpi: int, calidad: int) -> bytes:
+    """Copia de las páginas del PDF con las imágenes recomprimidas"""
+    writer = PdfWriter()
+
+    # Las imágenes se reemplazan en las páginas leídas, antes de copiarlas: el
+    # writer solo copia lo que cuelga de ellas, así que la imagen original no se
+    # escribe y el flujo nuevo se convierte en objeto indirecto
+    reemplazos: Dict[int, Optional[StreamObject]] = {}  # id de la imagen -> recomprimida (None: se deja)
+    for pagina in reader.pages:
+        for clave in CLAVES_PAGINA_DESCARTABLES:
+            if clave in pagina:
+                del pagina[clave]
+
+        recursos = pagina.get('/Resources')
+        recursos = recursos.get_object() if recursos is not None else {}
+        xobjetos = recursos.get('/XObject')
+        if xobjetos is not None:
+            ancho_pt = float(pagina.mediabox.width)
+            alto_pt = float(pagina.mediabox.height)
+            xobjetos = xobjetos.get_object()
+            for nombre in list(xobjetos):
+                imagen = xobjetos[nombre].get_object()
+                if imagen.get('/Subtype') != '/Image':
+                    continue
+                if id(imagen) not in reemplazos:
+                    nueva = _reducir_imagen(imagen, ancho_pt, alto_pt, max_dpi, calidad)
+                    reemplazos[id(imagen)] = nueva
+                    if nueva is not None:
+                        reemplazos[id(nueva)] = None  # Recursos compartidos entre páginas
+                if reemplazos[id(imagen)] is not None:
+                    xobjetos[NameObject(nombre)] = reemplazos[id(imagen)]
+
+        # Copiar solo las páginas: lo que no cuelga de ellas (objetos huérfanos,
+        # metadatos del catálogo, Info del documento) no se escribe
+        writer.add_page(pagina)
+
+    for pagina in writer.pages:
+        pagina.compress_content_streams()
+
+    salida = BytesIO()
+    writer.write(salida)
+    return salida.getvalue()
+
+
+class AdelgazadorPDF:
+    """Adelgaza PDFs grandes y guarda el resultado en caché por contenido"""
+
+    def __init__(self, cache: Optional[CacheContenido], max_dpi: int = 150,
+                 calidad: int = 60, min_bytes: int = 1024 * 1024,
+                 presupuesto: Optional[PresupuestoMemoria] = None):
+        self.cache = cache
+        self.max_dpi = max_dpi
+        self.calidad = calidad
+        self.min_bytes = min_bytes
+        self.presupuesto = presupuesto
+
+    def preparar(self, pdf_data: bytes, nombre: str = '') -> bytes:
+        """PDF a enviar: la copia ligera si conviene, si no el original"""
+        if len(pdf_data) < self.min_bytes or not PIL_DISPONIBLE:
+            return pdf_data
+
+        clave = calcular_clave(
+            hashlib.sha256(pdf_data).hexdigest(), VERSION_ADELGAZADO,
+            str(self.max_dpi), str(self.calidad)
+        )
+        if self.cache is not None:
+            previo = self.cache.obtener_bytes(clave)
+            if previo is not None:
+                return previo or pdf_data  # Vacío: ya se intentó y no convenía
+
+        try:
+            if self.presupuesto is None:
+                ligero = adelgazar_pdf(pdf_data, self.max_dpi, self.calidad)
+            else:
+                with self.presupuesto.reservar(len(pdf_data) * COPIAS_ADELGAZADO):
+                    ligero = adelgazar_pdf(pdf_data, self.max_dpi, self.calidad)
+        except Exception as e:
+            print(f"[!] No se pudo adelgazar {nombre}: {e}")
+            return pdf_data
+
+        if ligero:
+            print(f"[+] PDF adelgazado para el envío{': ' + nombre if nombre else ''} "
+                  f"({len(pdf_data) / 1024 / 1024:.1f} MB → {len(ligero) / 1024 / 1024:.1f} MB)")
+
+        if self.cache is not None:
+            self.cache.guardar_bytes(clave, ligero or b'')
+        return ligero or pdf_data
+
+
+class BackendAdelgazado:
+    """Backend que adelgaza los PDFs antes de delegar en otro backend"""
+
+    def __init__(self, backend: BackendCalificacion, adelgazador: AdelgazadorPDF):
+        self.backend = backend
+        self.adelgazador = adelgazador
+        self.nombre_modelo = backend.nombre_modelo
+
+    def registrar_prefijo(self, prefijo: str) -> str:
+        return self.backend.registrar_prefijo(prefijo)
+
+    def liberar_prefijos(self) -> None:
+        self.backend.liberar_prefijos()
+
+    def generar(self, prompt: str, pdf_data: bytes,
+                prefijo_id: Optional[str] = None,
+                esquema: Optional[Dict] = None) -> RespuestaBackend:
+        ligero = self.adelgazador.preparar(pdf_data)
+        respuesta = self.backend.generar(prompt, ligero, prefijo_id=prefijo_id, esquema=esquema)
+        respuesta.bytes_enviados = len(ligero)
+        return respuesta
+
+    def generar_lote(self, prompt: str, pdfs: List[Tuple[str, bytes]],
+                     prefijo_id: Optional[str] = None,
+                     esquema: Optional[Dict] = None) -> RespuestaBackend:
+        ligeros = [(archivo, self.adelgazador.preparar(datos, archivo)) for archivo, datos in pdfs]
+        respuesta = self.backend.generar_lote(prompt, ligeros, prefijo_id=prefijo_id, esquema=esquema)
+        respuesta.bytes_enviados = sum(len(d) for _, d in ligeros)
+        return respuesta
@@ -0,0 +1,527 @@
+"""
+Backends de calificación
+
+calificar_gemini.py no llama directamente a google.generativeai: habla con un
+"backend" que recibe el prompt y el PDF y devuelve el texto de la respuesta.
+
+Backends disponibles:
+- BackendGemini: API real de Gemini (requiere gemini_api_key)
+- BackendFalso:  respuestas locales deterministas con latencia simulada,
+                 para perfilar y hacer pruebas de carga sin conexión
+
+Prefijos compartidos:
+Todas las entregas de una tarea comparten el mismo bloque inicial del prompt
+(rúbrica, instrucciones y formato JSON). El pipeline lo registra una sola vez
+por tarea con registrar_prefijo() y después envía solo la parte de cada alumno
+(observaciones del profesor + PDF) con generar(..., prefijo_id=...). Un
+prefijo_id que nunca se registró lanza ErrorPrefijo en lugar de enviar la
+solicitud sin rúbrica; uno liberado con liberar_prefijos() se vuelve a registrar.
+Las cachés de contexto de Gemini viven TTL_PREFIJO_SEGUNDOS: antes de usar una
+a la que le quedan menos de MARGEN_RENOVACION_SEGUNDOS se extiende su TTL, y si
+Gemini ya no la encuentra (NotFound) se crea de nuevo y se repite la solicitud.
+Así un proceso largo (vigilar_tareas.py, lotes de más de una hora) no envía
+solicitudes contra cachés vencidas.
+
+Memoria:
+pdf_data puede ser bytes o el archivo mapeado en memoria (mmap, ver
+memoria_pdf.abrir_pdf). BackendGemini envía en línea los PDFs de hasta
+MAX_BYTES_EN_LINEA; los mayores se suben con la File API leyéndolos por
+bloques, sin las copias en base64 de una solicitud en línea. Los bytes en
+vuelo entre todos los hilos se limitan con un PresupuestoMemoria.
+
+Solicitudes sin PDF:
+generar() con pdf_data vacío envía solo el texto del prompt (lo usa la
+agregación de los PDFs calificados por partes).
+
+Salida estructurada:
+generar() y generar_lote() aceptan esquema, un response_schema de Gemini (ver
+esquema_calificacion.py); la respuesta llega como JSON con ese formato. Si la
+API o el SDK instalado no aceptan el esquema, se pide solo JSON
+(response_mime_type) y el esquema se deja de enviar.
+
+Lotes:
+generar_lote() envía varios PDFs pequeños de la misma tarea en una sola
+solicitud; cada PDF va precedido por una línea "ARCHIVO: <nombre>" para que
+el modelo pueda devolver un arreglo de calificaciones indexado por archivo.
+
+Selección en credentials.json:
+    "backend": "gemini"        (por defecto)
+    "backend": "falso",
+    "latencia_falsa": 2.0      (segundos por solicitud)
+    "memoria_envio_mb": 512    (presupuesto de memoria para envíos a Gemini)
+"""
+
+import datetime
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Protocol, Tuple
+
+try:
+    import google.generativeai as genai
+    from google.api_core.exceptions import NotFound
+    GEMINI_DISPONIBLE = True
+except ImportError:
+    GEMINI_DISPONIBLE = False
+
+from memoria_pdf import PresupuestoMemoria
+
+
+MODELO_GEMINI = 'gemini-1.5-flash'
+TTL_PREFIJO_SEGUNDOS = 3600  # Vida de la caché de contexto en Gemini
+MARGEN_RENOVACION_SEGUNDOS = 300  # Se extiende el TTL si le queda menos que esto
+MAX_BYTES_EN_LINEA = 15 * 1024 * 1024  # PDFs mayores se suben con la File API
+COPIAS_EN_LINEA = 4  # Copias que hace el SDK de un PDF en línea (bytes, proto, base64, JSON)
+MEMORIA_ENVIO_MB = 512  # Presupuesto de memoria para PDFs en vuelo hacia Gemini
+
+
+class ErrorPrefijo(LookupError):
+    """prefijo_id que no se registró en el backend (la solicitud iría sin rúbrica)"""
+
+
+def id_prefijo(prefijo: str) -> str:
+    """Identificador estable de un prefijo de prompt"""
+    return hashlib.sha256(prefijo.encode('utf-8')).hexdigest()[:16]
+
+
+class LectorBytes(io.RawIOBase):
+    """Archivo de solo lectura sobre bytes o mmap, sin copiarlos (para la File API)"""
+
+    def __init__(self, datos):
+        self._vista = memoryview(datos)
+        self._posicion = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, destino) -> int:
+        n = min(len(destino), len(self._vista) - self._posicion)
+        destino[:n] = self._vista[self._posicion:self._posicion + n]
+        self._posicion += n
+        return n
+
+    def seek(self, posicion: int, desde: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._posicion, io.SEEK_END: len(self._vista)}[desde]
+        self._posicion = max(0, base + posicion)
+        return self._posicion
+
+    def tell(self) -> int:
+        return self._posicion
+
+    def close(self) -> None:
+        if not self.closed:
+            self._vista.release()  # Permite cerrar el mmap de origen
+        super().close()
+
+
+class RespuestaBackend:
+    """Respuesta de un backend: texto generado y uso de tokens"""
+
+    def __init__(self, texto: str, tokens_prompt: int = 0, tokens_respuesta: int = 0,
+                 tokens_cache: int = 0, latencia: float = 0.0):
+        self.text = texto
+        self.tokens_prompt = tokens_prompt
+        self.tokens_respuesta = tokens_respuesta
+        self.tokens_cache = tokens_cache  # Tokens del prompt servidos desde caché
+        self.latencia = latencia  # Segundos de la llamada a la API (sin esperas del limitador)
+        self.bytes_enviados = 0  # Tamaño de los PDFs enviados, si difiere del original
+
+
+class BackendCalificacion(Protocol):
+    """Interfaz que debe cumplir cualquier backend de calificación"""
+
+    nombre_modelo: str
+
+    def registrar_prefijo(self, prefijo: str) -> str:
+        """Registra un prefijo compartido de prompt; retorna su identificador"""
+        ...
+
+    def generar(self, prompt: str, pdf_data: bytes,
+                prefijo_id: Optional[str] = None,
+                esquema: Optional[Dict] = None) -> RespuestaBackend:
+        """
+        Envía el prompt y el PDF; retorna la respuesta del modelo.
+        Si se indica prefijo_id, el prompt es solo la parte posterior al prefijo.
+        Con pdf_data vacío se envía solo el prompt.
+        Con esquema, la respuesta se pide como JSON con ese formato.
+        """
+        ...
+
+    def generar_lote(self, prompt: str, pdfs: List[Tuple[str, bytes]],
+                     prefijo_id: Optional[str] = None,
+                     esquema: Optional[Dict] = None) -> RespuestaBackend:
+        """Envía varios PDFs (nombre de archivo, contenido) en una sola solicitud"""
+        ...
+
+    def liberar_prefijos(self) -> None:
+        """Libera los prefijos registrados (cachés remotas incluidas)"""
+        ...
+
+
+class BackendGemini:
+    """Backend que usa la API real de Gemini"""
+
+    def __init__(self, api_key: str, nombre_modelo: str = MODELO_GEMINI,
+                 presupuesto: Optional[PresupuestoMemoria] = None):
+        if not GEMINI_DISPONIBLE:
+            raise ImportError(
+                "google-generativeai no está instalado. "
+                "Instala con: pip install google-generativeai"
+            )
+
+        genai.configure(api_key=api_key)
+        self.nombre_modelo = nombre_modelo
+        self.model = genai.GenerativeModel(nombre_modelo)
+        self.presupuesto = presupuesto or PresupuestoMemoria(MEMORIA_ENVIO_MB * 1024 * 1024)
+
+        self._lock = threading.Lock()
+        self._textos_prefijo: Dict[str, str] = {}  # Se conservan para volver a registrar
+        self._modelos_prefijo: Dict[str, object] = {}
+        self._caches_prefijo: Dict[str, object] = {}  # Cachés de contexto remotas por prefijo
+        self._expiraciones: Dict[str, float] = {}  # time.monotonic() en que vence cada caché
+        self._esquema_soportado = True
+
+    def registrar_prefijo(self, prefijo: str) -> str:
+        """
+        Intenta crear una caché de contexto en Gemini con el prefijo. La API exige
+        un mínimo de tokens y una versión fija del modelo; si no se cumple, el
+        prefijo se usa como instrucción de sistema de un modelo dedicado a la tarea.
+        """
+        clave = id_prefijo(prefijo)
+
+        with self._lock:
+            self._textos_prefijo[clave] = prefijo
+            if clave not in self._modelos_prefijo:
+                self._registrar(clave, prefijo)
+
+        return clave
+
+    def _registrar(self, clave: str, prefijo: str) -> object:
+        """Crea el modelo del prefijo (con self._lock tomado)"""
+        inicio = time.monotonic()
+        try:
+            cache = genai.caching.CachedContent.create(
+                model=self.nombre_modelo,
+                display_name=f"rubrica-{clave}",
+                system_instruction=prefijo,
+                ttl=datetime.timedelta(seconds=TTL_PREFIJO_SEGUNDOS)
+            )
+            modelo = genai.GenerativeModel.from_cached_content(cache)
+            self._caches_prefijo[clave] = cache
+            self._expiraciones[clave] = inicio + TTL_PREFIJO_SEGUNDOS
+            print(f"[+] Prefijo de rúbrica registrado en la caché de contexto de Gemini")
+        except Exception as e:
+            print(f"[+] Caché de contexto no disponible ({e.__class__.__name__}); "
+                  f"se usará el prefijo como instrucción de sistema")
+            modelo = genai.GenerativeModel(self.nombre_modelo, system_instruction=prefijo)
+
+        self._modelos_prefijo[clave] = modelo
+        return modelo
+
+    def _olvidar(self, clave: str) -> None:
+        """Descarta el modelo y la caché de un prefijo (con self._lock tomado)"""
+        self._modelos_prefijo.pop(clave, None)
+        self._caches_prefijo.pop(clave, None)
+        self._expiraciones.pop(clave, None)
+
+    def _renovar(self, clave: str) -> None:
+        """Extiende el TTL de la caché del prefijo o la crea de nuevo (con self._lock tomado)"""
+        inicio = time.monotonic()
+        try:
+            self._caches_prefijo[clave].update(ttl=datetime.timedelta(seconds=TTL_PREFIJO_SEGUNDOS))
+            self._expiraciones[clave] = inicio + TTL_PREFIJO_SEGUNDOS
+        except Exception as e:
+            print(f"[!] No se pudo extender la caché de contexto ({e.__class__.__name__}), se crea de nuevo")
+            self._olvidar(clave)
+            self._registrar(clave, self._textos_prefijo[clave])
+
+    def _subir(self, pdf_data) -> object:
+        """Sube un PDF grande con la File API y espera a que esté disponible"""
+        lector = LectorBytes(pdf_data)
+        try:
+            archivo = genai.upload_file(lector, mime_type='application/pdf')
+        finally:
+            lector.close()
+
+        while archivo.state.name == 'PROCESSING':
+            time.sleep(1)
+            archivo = genai.get_file(archivo.name)
+        if archivo.state.name != 'ACTIVE':
+            raise RuntimeError(f"La File API no pudo procesar el PDF ({archivo.state.name})")
+        return archivo
+
+    def generar(self, prompt: str, pdf_data: bytes,
+                prefijo_id: Optional[str] = None,
+                esquema: Optional[Dict] = None) -> RespuestaBackend:
+        if len(pdf_data) <= MAX_BYTES_EN_LINEA:
+            with self.presupuesto.reservar(len(pdf_data) * COPIAS_EN_LINEA):
+                partes = [prompt]
+                if pdf_data:
+                    partes.append({
+                        'mime_type': 'application/pdf',
+                        'data': bytes(pdf_data)
+                    })
+                return self._enviar(partes, prefijo_id, esquema)
+
+        # La subida lee el PDF por bloques; en memoria queda a lo sumo un bloque
+        with self.presupuesto.reservar(len(pdf_data)):
+            archivo = self._subir(pdf_data)
+        try:
+            return self._enviar([prompt, archivo], prefijo_id, esquema)
+        finally:
+            try:
+                genai.delete_file(archivo.name)
+            except Exception as e:
+                print(f"[!] No se pudo eliminar el PDF subido a Gemini: {e}")
+
+    def generar_lote(self, prompt: str, pdfs: List[Tuple[str, bytes]],
+                     prefijo_id: Optional[str] = None,
+                     esquema: Optional[Dict] = None) -> RespuestaBackend:
+        partes = [prompt]
+        for archivo, pdf_data in pdfs:
+            partes.append(f"ARCHIVO: {archivo}")
+            partes.append({
+                'mime_type': 'application/pdf',
+                'data': bytes(pdf_data)
+            })
+
+        with self.presupuesto.reservar(sum(len(d) for _, d in pdfs) * COPIAS_EN_LINEA):
+            return self._enviar(partes, prefijo_id, esquema)
+
+    def _configuracion(self, esquema: Optional[Dict]):
+        """generation_config para pedir JSON (con el esquema si está soportado)"""
+        if esquema is None:
+            return None
+        if self._esquema_soportado:
+            try:
+                return genai.GenerationConfig(response_mime_type='application/json',
+                                              response_schema=esquema)
+            except TypeError:
+                self._esquema_soportado = False  # SDK anterior a response_schema
+        return genai.GenerationConfig(response_mime_type='application/json')
+
+    def _modelo(self, prefijo_id: Optional[str]):
+        """
+        Modelo con el prefijo indicado: vuelve a registrar un prefijo ya liberado
+        y extiende la caché de contexto si está por vencer.
+        """
+        if prefijo_id is None:
+            return self.model
+        with self._lock:
+            prefijo = self._textos_prefijo.get(prefijo_id)
+            if prefijo is None:
+                raise ErrorPrefijo(f"Prefijo {prefijo_id} no registrado en el backend")
+            if prefijo_id not in self._modelos_prefijo:
+                print(f"[+] El prefijo {prefijo_id} se había liberado, se vuelve a registrar")
+                return self._registrar(prefijo_id, prefijo)
+            if prefijo_id in self._caches_prefijo and \
+                    self._expiraciones[prefijo_id] - time.monotonic() < MARGEN_RENOVACION_SEGUNDOS:
+                self._renovar(prefijo_id)
+            return self._modelos_prefijo[prefijo_id]
+
+    def _generar_contenido(self, modelo, partes: List, esquema: Optional[Dict]):
+        configuracion = self._configuracion(esquema)
+        try:
+            return modelo.generate_content(partes, generation_config=configuracion)
+        except Exception as e:
+            # Un modelo que no acepta response_schema responde 400 sin consumir tokens
+            if esquema is None or not self._esquema_soportado or 'schema' not in str(e).lower():
+                raise
+            print(f"[!] El modelo no acepta response_schema, se pedirá solo JSON: {e}")
+            self._esquema_soportado = False
+            return modelo.generate_content(partes, generation_config=self._configuracion(esquema))
+
+    def _enviar(self, partes: List, prefijo_id: Optional[str],
+                esquema: Optional[Dict] = None) -> RespuestaBackend:
+        modelo = self._modelo(prefijo_id)
+        try:
+            response = self._generar_contenido(modelo, partes, esquema)
+        except NotFound:
+            # La caché de contexto venció o se borró en Gemini: se crea de nuevo y se repite
+            with self._lock:
+                if prefijo_id not in self._caches_prefijo:
+                    raise
+                if self._modelos_prefijo.get(prefijo_id) is modelo:
+                    print("[!] La caché de contexto ya no existe en Gemini, se vuelve a registrar el prefijo")
+                    self._olvidar(prefijo_id)
+                    self._registrar(prefijo_id, self._textos_prefijo[prefijo_id])
+            response = self._generar_contenido(self._modelo(prefijo_id), partes, esquema)
+
+        uso = getattr(response, 'usage_metadata', None)
+        return RespuestaBackend(
+            response.text,
+            tokens_prompt=getattr(uso, 'prompt_token_count', 0) or 0,
+            tokens_respuesta=getattr(uso, 'candidates_token_count', 0) or 0,
+            tokens_cache=getattr(uso, 'cached_content_token_count', 0) or 0
+        )
+
+    def liberar_prefijos(self) -> None:
+        with self._lock:
+            for cache in self._caches_prefijo.values():
+                try:
+                    cache.delete()
+                except Exception as e:
+                    print(f"[!] No se pudo eliminar la caché de contexto: {e}")
+            self._caches_prefijo.clear()
+            self._expiraciones.clear()
+            self._modelos_prefijo.clear()
+
+
+class BackendFalso:
+    """
+    Backend local sin red. Devuelve calificaciones válidas según el formato de
+    construir_prompt, deterministas para un mismo (prompt, PDF), después de una
+    latencia simulada.
+
+    Los criterios se toman de las líneas de la rúbrica con el formato
+    "1. Nombre del criterio (3 puntos)"; los de 0 puntos se omiten (como en
+    reparar_calificacion) y, si no queda ninguno, se usan criterios genéricos.
+    """
+
+    CRITERIOS_GENERICOS = [
+        ("Contenido", 4.0),
+        ("Documentación", 3.0),
+        ("Presentación", 3.0),
+    ]
+
+    PATRON_CRITERIO = re.compile(
+        r'^\s*\d+\.\s*(.+?)\s*\((\d+(?:\.\d+)?)\s*puntos?\)', re.MULTILINE
+    )
+
+    def __init__(self, latencia: float = 2.0, variacion: float = 0.0,
+                 nombre_modelo: str = 'falso'):
+        self.latencia = latencia
+        self.variacion = variacion
+        self.nombre_modelo = nombre_modelo
+        self._prefijos: Dict[str, str] = {}
+
+    def _criterios(self, prompt: str) -> List[tuple]:
+        encontrados = [
+            (nombre, float(puntos))
+            for nombre, puntos in self.PATRON_CRITERIO.findall(prompt)
+            if float(puntos) > 0
+        ]
+        return encontrados or self.CRITERIOS_GENERICOS
+
+    def registrar_prefijo(self, prefijo: str) -> str:
+        clave = id_prefijo(prefijo)
+        self._prefijos[clave] = prefijo
+        return clave
+
+    def liberar_prefijos(self) -> None:
+        pass  # Sin recursos remotos; como en Gemini, un prefijo liberado se puede seguir usando
+
+    def _prefijo(self, prefijo_id: Optional[str]) -> str:
+        if not prefijo_id:
+            return ''
+        if prefijo_id not in self._prefijos:
+            raise ErrorPrefijo(f"Prefijo {prefijo_id} no registrado en el backend")
+        return self._prefijos[prefijo_id]
+
+    def _calificacion(self, prompt_completo: str, pdf_data: bytes) -> Dict:
+        h = hashlib.sha256(prompt_completo.encode('utf-8'))
+        h.update(pdf_data)  # Sin concatenar: pdf_data puede ser un mmap grande
+        rng = random.Random(h.digest())
+
+        criterios = []
+        for nombre, maximo in self._criterios(prompt_completo):
+            obtenidos = round(rng.uniform(0.5, 1.0) * maximo, 1)
+            criterios.append({
+                'nombre': nombre,
+                'puntos_obtenidos': obtenidos,
+                'puntos_maximos': maximo,
+                'comentario': f"Evaluación simulada del criterio '{nombre}'."
+            })
+
+        maximo_total = sum(c['puntos_maximos'] for c in criterios)
+        obtenido_total = sum(c['puntos_obtenidos'] for c in criterios)
+
+        return {
+            'calificacion_total': round(10.0 * obtenido_total / maximo_total, 1),
+            'calificacion_maxima': 10.0,
+            'criterios': criterios,
+            'retroalimentacion_general': "Calificación generada por el backend falso (sin IA).",
+            'fortalezas': ["Fortaleza simulada 1", "Fortaleza simulada 2"],
+            'areas_mejora': ["Área de mejora simulada 1", "Área de mejora simulada 2"]
+        }
+
+    def _esperar(self, semilla: bytes) -> None:
+        """Simula la latencia de red"""
+        espera = self.latencia
+        if self.variacion:
+            espera += random.Random(semilla).uniform(-self.variacion, self.variacion)
+        time.sleep(max(0.0, espera))
+
+    def generar(self, prompt: str, pdf_data: bytes,
+                prefijo_id: Optional[str] = None,
+                esquema: Optional[Dict] = None) -> RespuestaBackend:
+        prefijo = self._prefijo(prefijo_id)
+        prompt_completo = prefijo + prompt
+
+        self._esperar(hashlib.sha256(pdf_data).digest())
+        texto = json.dumps(self._calificacion(prompt_completo, pdf_data), ensure_ascii=False)
+
+        # Estimación aproximada de tokens (~4 caracteres por token)
+        return RespuestaBackend(
+            texto,
+            tokens_prompt=len(prompt_completo) // 4 + len(pdf_data) // 1000,
+            tokens_respuesta=len(texto) // 4,
+            tokens_cache=len(prefijo) // 4
+        )
+
+    def generar_lote(self, prompt: str, pdfs: List[Tuple[str, bytes]],
+                     prefijo_id: Optional[str] = None,
+                     esquema: Optional[Dict] = None) -> RespuestaBackend:
+        prefijo = self._prefijo(prefijo_id)
+        prompt_completo = prefijo + prompt
+
+        self._esperar(hashlib.sha256(b''.join(pdf_data for _, pdf_data in pdfs)).digest())
+
+        calificaciones = []
+        for archivo, pdf_data in pdfs:
+            calificacion = self._calificacion(prompt_completo, pdf_data)
+            calificaciones.append({'archivo': archivo, **calificacion})
+
+        texto = json.dumps(calificaciones, ensure_ascii=False)
+
+        return RespuestaBackend(
+            texto,
+            tokens_prompt=len(prompt_completo) // 4 + sum(len(d) for _, d in pdfs) // 1000,
+            tokens_respuesta=len(texto) // 4,
+            tokens_cache=len(prefijo) // 4
+        )
+
+
+def presupuesto_envio(credentials: Dict) -> PresupuestoMemoria:
+    """Presupuesto de memoria para PDFs en vuelo según credentials.json"""
+    return PresupuestoMemoria(int(credentials.get('memoria_envio_mb', MEMORIA_ENVIO_MB)) * 1024 * 1024)
+
+
+def crear_backend(credentials: Dict, presupuesto: Optional[PresupuestoMemoria] = None) -> BackendCalificacion:
+    """
+    Crea el backend indicado en credentials.json ('gemini' o 'falso').
+    presupuesto permite compartir el límite de memoria con otras etapas.
+    """
+    tipo = credentials.get('backend', 'gemini')
+
+    if tipo == 'falso':
+        return BackendFalso(
+            latencia=float(credentials.get('latencia_falsa', 2.0)),
+            variacion=float(credentials.get('variacion_latencia_falsa', 0.0))
+        )
+
+    if tipo == 'gemini':
+        return BackendGemini(
+            credentials['gemini_api_key'],
+            credentials.get('gemini_model', MODELO_GEMINI),
+            presupuesto or presupuesto_envio(credentials)
+        )
+
+    raise ValueError(f"Backend de calificación desconocido: {tipo}")
@@ -0,0 +1,158 @@
+"""
+Backends de transcripción
+
+transcribir_audios.py no llama directamente a whisper: habla con un "backend"
+que decodifica el audio y lo transcribe. Todos devuelven el mismo formato que
+whisper.transcribe, así que transcripcion_data no depende del backend:
+    {'text': ..., 'segments': [{'start': s, 'end': s, 'text': ...}, ...],
+     'language': 'es', 'duration': segundos}
+
+Backends disponibles:
+- whisper:         openai-whisper en fp32 (el comportamiento original)
+- whisper_int8:    openai-whisper con cuantización dinámica int8 de las capas
+                   lineales (torch.quantization.quantize_dynamic); solo CPU
+- faster_whisper:  CTranslate2 con pesos int8 (pip install faster-whisper);
+                   el más rápido en CPU y con menos memoria, mismo modelo
+- auto:            faster_whisper si está instalado, si no whisper
+
+El audio se decodifica a 16 kHz mono float32 (cargar_audio) antes de
+transcribir, lo que permite transcribir solo fragmentos del audio.
+
+nombre_backend() da el nombre de un backend (p. ej. "faster_whisper/medium/int8")
+sin cargar el modelo; es parte de la clave de la caché de transcripciones.
+"""
+
+from pathlib import Path
+from typing import Dict, Optional, Protocol
+
+try:
+    import torch
+    import whisper
+    WHISPER_DISPONIBLE = True
+except ImportError:
+    WHISPER_DISPONIBLE = False
+
+try:
+    from faster_whisper import WhisperModel
+    from faster_whisper.audio import decode_audio
+    FASTER_WHISPER_DISPONIBLE = True
+except ImportError:
+    FASTER_WHISPER_DISPONIBLE = False
+
+
+FRECUENCIA_MUESTREO = 16000  # Hz del audio que esperan todos los modelos Whisper
+TIPO_COMPUTO_INT8 = 'int8'  # compute_type de faster-whisper en CPU
+BACKENDS = ['auto', 'whisper', 'whisper_int8', 'faster_whisper']
+
+
+class BackendTranscripcion(Protocol):
+    """Interfaz que debe cumplir cualquier backend de transcripción"""
+
+    nombre: str  # Backend y modelo, p. ej. "faster_whisper/medium/int8"
+
+    def cargar_audio(self, audio_path: Path):
+        """Audio decodificado: arreglo float32 mono a FRECUENCIA_MUESTREO"""
+        ...
+
+    def transcribir(self, audio, idioma: str = 'es', verbose: bool = False) -> Dict:
+        """Transcribe el audio decodificado (formato de whisper.transcribe)"""
+        ...
+
+
+def resolver_tipo(tipo: str) -> str:
+    """Backend que corresponde a 'auto' según lo instalado"""
+    if tipo == 'auto':
+        return 'faster_whisper' if FASTER_WHISPER_DISPONIBLE else 'whisper'
+    return tipo
+
+
+def nombre_backend(tipo: str, modelo: str, tipo_computo: str = TIPO_COMPUTO_INT8) -> str:
+    """Nombre del backend y modelo, igual al atributo nombre del backend creado"""
+    tipo = resolver_tipo(tipo)
+    if tipo == 'faster_whisper':
+        return f"{tipo}/{modelo}/{tipo_computo}"
+    return f"{tipo}/{modelo}"
+
+
+class BackendWhisper:
+    """openai-whisper; con cuantizar=True, capas lineales en int8 (solo CPU)"""
+
+    def __init__(self, modelo: str, hilos: Optional[int] = None, cuantizar: bool = False):
+        if not WHISPER_DISPONIBLE:
+            raise ImportError("openai-whisper no está instalado (pip install openai-whisper)")
+        if hilos:
+            torch.set_num_threads(hilos)
+
+        self.nombre = nombre_backend('whisper_int8' if cuantizar else 'whisper', modelo)
+        if not cuantizar:
+            self.modelo = whisper.load_model(modelo)
+            return
+
+        self.modelo = whisper.load_model(modelo, device='cpu')
+        # whisper.model.Linear solo cambia forward para convertir el dtype de los pesos;
+        # quantize_dynamic reconoce únicamente nn.Linear exacto
+        for modulo in self.modelo.modules():
+            if isinstance(modulo, torch.nn.Linear):
+                modulo.__class__ = torch.nn.Linear
+        self.modelo = torch.quantization.quantize_dynamic(self.modelo, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def cargar_audio(self, audio_path: Path):
+        return whisper.load_audio(str(audio_path))
+
+    def transcribir(self, audio, idioma: str = 'es', verbose: bool = False) -> Dict:
+        result = self.modelo.transcribe(
+            audio,
+            language=idioma,
+            verbose=verbose,
+            fp16=False  # Desactivar fp16 para compatibilidad con CPU
+        )
+        return {
+            'text': result['text'],
+            'segments': [{'start': s['start'], 'end': s['end'], 'text': s['text']}
+                         for s in result.get('segments', [])],
+            'language': result.get('language', idioma),
+            'duration': len(audio) / FRECUENCIA_MUESTREO
+        }
+
+
+class BackendFasterWhisper:
+    """faster-whisper (CTranslate2) en CPU con pesos cuantizados"""
+
+    def __init__(self, modelo: str, hilos: Optional[int] = None, tipo_computo: str = TIPO_COMPUTO_INT8):
+        if not FASTER_WHISPER_DISPONIBLE:
+            raise ImportError("faster-whisper no está instalado (pip install faster-whisper)")
+
+        self.nombre = nombre_backend('faster_whisper', modelo, tipo_computo)
+        # cpu_threads=0 deja que CTranslate2 elija; en el pool cada proceso recibe su parte
+        self.modelo = WhisperModel(modelo, device='cpu', compute_type=tipo_computo,
+                                   cpu_threads=hilos or 0)
+
+    def cargar_audio(self, audio_path: Path):
+        return decode_audio(str(audio_path), sampling_rate=FRECUENCIA_MUESTREO)
+
+    def transcribir(self, audio, idioma: str = 'es', verbose: bool = False) -> Dict:
+        segmentos, info = self.modelo.transcribe(audio, language=idioma)
+        segmentos = [{'start': s.start, 'end': s.end, 'text': s.text} for s in segmentos]
+        if verbose:
+            for s in segmentos:
+                print(f"[{s['start']:.2f} --> {s['end']:.2f}] {s['text']}")
+        return {
+            'text': ''.join(s['text'] for s in segmentos),
+            'segments': segmentos,
+            'language': info.language or idioma,
+            'duration': info.duration
+        }
+
+
+def crear_backend_transcripcion(tipo: str, modelo: str, hilos: Optional[int] = None) -> BackendTranscripcion:
+    """Crea el backend indicado ('auto', 'whisper', 'whisper_int8' o 'faster_whisper')"""
+    tipo = resolver_tipo(tipo)
+
+    if tipo == 'whisper':
+        return BackendWhisper(modelo, hilos)
+    if tipo == 'whisper_int8':
+        return BackendWhisper(modelo, hilos, cuantizar=True)
+    if tipo == 'faster_whisper':
+        return BackendFasterWhisper(modelo, hilos)
+
+    raise ValueError(f"Backend de transcripción desconocido: {tipo}")
@@ -0,0 +1,148 @@
+"""
+Benchmark de memoria de la fusión y el envío de PDFs
+
+Genera PDFs sintéticos de varios tamaños (páginas con imágenes de ruido, que
+no se pueden comprimir) y mide, cada caso en un proceso nuevo, cuánto crece el
+pico de memoria residente durante:
+    fusion_completa     fusionar_pdfs reescribiendo con PdfWriter (método anterior)
+    fusion_incremental  fusionar_pdfs con actualización incremental
+    envio_lectura       f.read() del PDF + BackendFalso (método anterior)
+    envio_mmap          calificar_con_gemini (abrir_pdf) + BackendFalso
+
+Para el envío también se mide el pico del heap de Python (tracemalloc): las
+páginas de un mmap cuentan como memoria residente mientras se leen, pero son
+del archivo y el sistema puede liberarlas, a diferencia de una copia en el heap.
+
+Uso:
+    python benchmark_memoria.py               (tamaños de 10, 25, 50 y 100 MB)
+    python benchmark_memoria.py 20 200        (tamaños en MB)
+"""
+
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+from memoria_pdf import pico_memoria_mb
+
+
+TAMANOS_MB = [10, 25, 50, 100]
+MODOS = ['fusion_completa', 'fusion_incremental', 'envio_lectura', 'envio_mmap']
+
+CALIFICACION_EJEMPLO = {
+    'calificacion_total': 8.5,
+    'calificacion_maxima': 10.0,
+    'criterios': [{'nombre': 'Contenido', 'puntos_obtenidos': 8.5,
+                   'puntos_maximos': 10.0, 'comentario': 'Benchmark'}],
+    'retroalimentacion_general': 'Benchmark de memoria',
+    'fortalezas': ['-'],
+    'areas_mejora': ['-']
+}
+
+
+def generar_pdf_sintetico(ruta: Path, tamano_mb: int) -> None:
+    """PDF de aproximadamente tamano_mb con una imagen de ruido por página"""
+    imagen = Image.frombytes('RGB', (1600, 2000), os.urandom(1600 * 2000 * 3))
+    muestra = BytesIO()
+    imagen.save(muestra, format='JPEG', quality=90)
+    paginas = max(1, math.ceil(tamano_mb * 1024 * 1024 / len(muestra.getvalue())))
+    imagen.save(ruta, 'PDF', save_all=True, append_images=[imagen] * (paginas - 1),
+                quality=90, resolution=200)
+
+
+def medir(modo: str, ruta: Path) -> dict:
+    """Ejecuta un caso en este proceso y retorna el crecimiento del pico de memoria"""
+    warnings.simplefilter('ignore')
+    import calificar_gemini as cg
+    from backends_calificacion import BackendFalso
+
+    backend = BackendFalso(latencia=0.0)
+    portada = cg.generar_pagina_calificacion(CALIFICACION_EJEMPLO, 'Benchmark', 'Alumno')
+    salida = ruta.with_name(f"Cal_{ruta.name}")
+
+    base = pico_memoria_mb()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+
+    if modo.startswith('fusion'):
+        cg.FUSION_INCREMENTAL = modo == 'fusion_incremental'
+        cg.fusionar_pdfs(portada, ruta, salida)
+        salida.unlink(missing_ok=True)
+    elif modo == 'envio_lectura':
+        with open(ruta, 'rb') as f:
+            pdf_data = f.read()
+        backend.generar("Benchmark", pdf_data)
+    else:
+        cg.calificar_con_gemini(backend, ruta, "Benchmark")
+
+    segundos = time.perf_counter() - inicio
+    heap = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    pico = pico_memoria_mb()
+
+    return {
+        'pico_mb': round(pico - base, 1) if pico is not None and base is not None else None,
+        'heap_mb': round(heap / 1024 / 1024, 1),
+        'segundos': round(segundos, 2)
+    }
+
+
+def medir_en_proceso(modo: str, ruta: Path) -> dict:
+    """Mide un caso en un proceso nuevo para que los picos no se mezclen"""
+    resultado = subprocess.run(
+        [sys.executable, __file__, '--medir', modo, str(ruta)],
+        capture_output=True, text=True, cwd=Path(__file__).parent
+    )
+    for linea in reversed(resultado.stdout.splitlines()):
+        if linea.startswith('{'):
+            return json.loads(linea)
+    print(f"[!] Falló la medición {modo}: {resultado.stderr[-500:]}")
+    return {}
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--medir':
+        print(json.dumps(medir(sys.argv[2], Path(sys.argv[3]))))
+        return
+
+    tamanos = [int(t) for t in sys.argv[1:]] or TAMANOS_MB
+    if pico_memoria_mb() is None:
+        print("[!] No se puede medir la memoria residente en este sistema (instala psutil)")
+
+    print("="*60)
+    print("BENCHMARK DE MEMORIA: FUSIÓN Y ENVÍO DE PDFs")
+    print("="*60)
+    print("Crecimiento del pico de memoria residente (MB) sobre la base del proceso;")
+    print("entre paréntesis, pico del heap de Python (MB)\n")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        print(f"{'PDF':>8}" + "".join(f"{modo:>22}" for modo in MODOS))
+        for tamano in tamanos:
+            ruta = Path(directorio) / f"sintetico_{tamano}mb.pdf"
+            generar_pdf_sintetico(ruta, tamano)
+            real = ruta.stat().st_size / 1024 / 1024
+
+            celdas = []
+            for modo in MODOS:
+                r = medir_en_proceso(modo, ruta)
+                if r.get('pico_mb') is None:
+                    celdas.append("-")
+                else:
+                    celdas.append(f"{r['pico_mb']:.0f} ({r['heap_mb']:.0f}) {r['segundos']:.1f}s")
+            print(f"{real:>6.0f}MB" + "".join(f"{c:>22}" for c in celdas))
+            ruta.unlink()
+
+    print("="*60)
+
+
+if __name__ == "__main__":
+    main()
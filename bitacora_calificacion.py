@@ -0,0 +1,121 @@
+"""
+Bitácora de calificación (solo se agregan líneas, formato JSONL)
+
+Registra cada etapa que completa una entrega:
+    calificado   -> la respuesta de Gemini (y la clave de caché que la produjo)
+    renderizado  -> la página de calificación guardada en disco
+    fusionado    -> el Cal_*.pdf generado, con las rutas y el nombre del alumno
+    persistido   -> la calificación ya está en MySQL
+
+Si el proceso se interrumpe, la siguiente ejecución retoma cada entrega en la
+etapa exacta que falló: no vuelve a llamar a la API ni a generar la portada si
+ya estaban hechas. La bitácora vive en la raíz de la carpeta de calificación.
+
+Cuando varias máquinas se reparten el trabajo (--fragmento i/N, ver
+reparto_trabajo.py), cada fragmento escribe en su propio archivo
+(.bitacora_calificacion.<i>de<N>.jsonl) para no intercalar líneas en una carpeta
+de red; al cargar se leen todos los archivos de bitácora, en orden de fecha.
+
+Formato de cada línea:
+    {"entrega": "<grupo>/<tarea>/<archivo>", "etapa": "...", "fecha": "...", "datos": {...}}
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+
+ETAPAS = ['calificado', 'renderizado', 'fusionado', 'persistido']
+BITACORA_ARCHIVO = ".bitacora_calificacion.jsonl"
+PORTADAS_DIRNAME = ".portadas"
+
+
+def clave_entrega(pdf_info: Dict) -> str:
+    """Identificador de una entrega dentro de la carpeta de calificación"""
+    return f"{pdf_info['grupo']}/{pdf_info['tarea']}/{pdf_info['archivo']}"
+
+
+class BitacoraCalificacion:
+    """Bitácora JSONL de etapas por entrega"""
+
+    def __init__(self, root_dir: Path, sufijo: Optional[str] = None):
+        nombre = BITACORA_ARCHIVO if not sufijo else BITACORA_ARCHIVO.replace('.jsonl', f'.{sufijo}.jsonl')
+        self.ruta = Path(root_dir) / nombre
+        self.portadas_dir = Path(root_dir) / PORTADAS_DIRNAME
+        self._lock = threading.Lock()
+        self._estado: Dict[str, Dict[str, Dict]] = {}  # entrega -> {etapa: datos}
+        self._cargar()
+
+    def _cargar(self) -> None:
+        # La bitácora común primero: ante la misma fecha, sus líneas son las más antiguas
+        rutas = sorted(self.ruta.parent.glob(BITACORA_ARCHIVO.replace('.jsonl', '*.jsonl')),
+                       key=lambda r: (r.name != BITACORA_ARCHIVO, r.name))
+        registros = []
+        for ruta in rutas:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                for num, linea in enumerate(f, 1):
+                    linea = linea.strip()
+                    if not linea:
+                        continue
+                    try:
+                        registros.append(json.loads(linea))
+                    except json.JSONDecodeError:
+                        # Una línea a medias al final indica que el proceso se cortó al escribirla
+                        print(f"[!] Línea {num} de {ruta.name} ilegible, se ignora")
+
+        if len(rutas) > 1:
+            # sort es estable: dentro de un archivo se conserva el orden de escritura
+            registros.sort(key=lambda r: r.get('fecha', ''))
+
+        for registro in registros:
+            etapas = self._estado.setdefault(registro['entrega'], {})
+            if registro['etapa'] == ETAPAS[0]:
+                # Una nueva calificación reinicia el resto de etapas
+                etapas.clear()
+            etapas[registro['etapa']] = registro.get('datos') or {}
+
+    def registrar(self, pdf_info: Dict, etapa: str, datos: Optional[Dict] = None) -> None:
+        """Agrega una línea a la bitácora y la sincroniza a disco"""
+        if etapa not in ETAPAS:
+            raise ValueError(f"Etapa desconocida: {etapa}")
+
+        entrega = clave_entrega(pdf_info)
+        registro = {
+            'entrega': entrega,
+            'etapa': etapa,
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'datos': datos or {}
+        }
+        linea = json.dumps(registro, ensure_ascii=False) + "\n"
+
+        with self._lock:
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.ruta, 'a', encoding='utf-8') as f:
+                f.write(linea)
+                f.flush()
+                os.fsync(f.fileno())
+
+            etapas = self._estado.setdefault(entrega, {})
+            if etapa == ETAPAS[0]:
+                etapas.clear()
+            etapas[etapa] = datos or {}
+
+    def datos(self, pdf_info: Dict, etapa: str) -> Optional[Dict]:
+        """Datos registrados para la etapa, o None si no se ha completado"""
+        with self._lock:
+            return self._estado.get(clave_entrega(pdf_info), {}).get(etapa)
+
+    def ultima_etapa(self, pdf_info: Dict) -> Optional[str]:
+        """Última etapa completada por la entrega, o None si no aparece"""
+        with self._lock:
+            etapas = self._estado.get(clave_entrega(pdf_info), {})
+        completadas = [e for e in ETAPAS if e in etapas]
+        return completadas[-1] if completadas else None
+
+    def ruta_portada(self, pdf_info: Dict) -> Path:
+        """Ruta donde se guarda la página de calificación de la entrega"""
+        nombre = clave_entrega(pdf_info).replace('/', '__')
+        return self.portadas_dir / f"{Path(nombre).stem}.pdf"
@@ -0,0 +1,148 @@
+"""
+Caché en disco direccionada por contenido
+
+Guarda resultados JSON en archivos cuyo nombre es un hash SHA-256 de las
+entradas que los produjeron. Si las entradas no cambian, el resultado se
+recupera del disco sin volver a calcularlo (por ejemplo, sin volver a
+llamar a la API de Gemini).
+
+Cuando el tamaño total supera el límite configurado se eliminan primero
+las entradas usadas hace más tiempo (LRU según la fecha de modificación,
+que se actualiza en cada lectura).
+
+También puede guardar contenido binario (obtener_bytes / guardar_bytes), por
+ejemplo PDFs, usando otra extensión de archivo.
+
+Estructura en disco:
+    <directorio>/<ab>/<abcdef...>.json     (o la extensión indicada)
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+
+TAMANO_BLOQUE = 1024 * 1024  # 1 MB por lectura al calcular hashes
+
+
+def hash_archivo(ruta: Path) -> str:
+    """Calcula el SHA-256 de un archivo leyéndolo por bloques"""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def calcular_clave(*partes: Union[str, bytes, None]) -> str:
+    """
+    Combina varias partes (texto o bytes) en una sola clave SHA-256.
+    Cada parte se antecede con su longitud para que ('ab', 'c') y ('a', 'bc')
+    no produzcan la misma clave.
+    """
+    h = hashlib.sha256()
+    for parte in partes:
+        if parte is None:
+            datos = b''
+        elif isinstance(parte, bytes):
+            datos = parte
+        else:
+            datos = str(parte).encode('utf-8')
+        h.update(len(datos).to_bytes(8, 'big'))
+        h.update(datos)
+    return h.hexdigest()
+
+
+class CacheContenido:
+    """Caché en disco (JSON o binaria) con límite de tamaño y desalojo LRU"""
+
+    def __init__(self, directorio: Path, max_bytes: int = 200 * 1024 * 1024,
+                 extension: str = ".json"):
+        self.directorio = Path(directorio)
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self._lock = threading.Lock()
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._tamano_total = sum(
+            p.stat().st_size for p in self.directorio.glob(f"*/*{self.extension}")
+        )
+
+    def _ruta(self, clave: str) -> Path:
+        return self.directorio / clave[:2] / f"{clave}{self.extension}"
+
+    def obtener_bytes(self, clave: str) -> Optional[bytes]:
+        """Retorna el contenido guardado para la clave, o None si no existe"""
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, 'rb') as f:
+                datos = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"[!] Entrada de caché ilegible, se ignora: {ruta.name} ({e})")
+            return None
+
+        # Marcar como usada recientemente
+        try:
+            os.utime(ruta, None)
+        except OSError:
+            pass
+
+        return datos
+
+    def obtener(self, clave: str) -> Optional[Dict]:
+        """Retorna el valor JSON guardado para la clave, o None si no existe"""
+        datos = self.obtener_bytes(clave)
+        if datos is None:
+            return None
+        try:
+            return json.loads(datos.decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            print(f"[!] Entrada de caché dañada, se ignora: {clave[:16]} ({e})")
+            return None
+
+    def guardar(self, clave: str, valor: Dict) -> None:
+        """Guarda el valor JSON de forma atómica y aplica el límite de tamaño"""
+        self.guardar_bytes(clave, json.dumps(valor, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    def guardar_bytes(self, clave: str, datos: bytes) -> None:
+        """Guarda el contenido de forma atómica y aplica el límite de tamaño"""
+        ruta = self._ruta(clave)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+
+        temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+        with self._lock:
+            anterior = ruta.stat().st_size if ruta.exists() else 0
+            with open(temporal, 'wb') as f:
+                f.write(datos)
+            os.replace(temporal, ruta)
+            self._tamano_total += len(datos) - anterior
+
+            if self._tamano_total > self.max_bytes:
+                self._desalojar()
+
+    def _desalojar(self) -> None:
+        """Elimina las entradas menos usadas hasta quedar bajo el límite"""
+        entradas = []
+        for p in self.directorio.glob(f"*/*{self.extension}"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entradas.append((st.st_mtime, st.st_size, p))
+
+        entradas.sort()
+        self._tamano_total = sum(tam for _, tam, _ in entradas)
+
+        for _, tam, p in entradas:
+            if self._tamano_total <= self.max_bytes:
+                break
+            try:
+                p.unlink()
+                self._tamano_total -= tam
+            except OSError:
+                pass
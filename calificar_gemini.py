@@ -10,17 +10,61 @@ Este script:
 6. Fusiona con el PDF original
 7. Sube calificación a la base de datos
 
+El trabajo corre en un pipeline por etapas (pipeline_calificacion.py): hilos de
+E/S para Gemini (hasta MAX_CONCURRENCIA solicitudes simultáneas), procesos para
+generar y fusionar PDFs (PROCESOS_RENDER) y un único escritor de base de datos
+que guarda hasta TAMANO_LOTE_BD calificaciones por transacción
+(persistencia_calificaciones.py).
+
+Modo lote (opcional): los PDFs pequeños de una misma tarea se envían en grupos
+de hasta TAMANO_LOTE en una sola solicitud; si la respuesta del lote no se puede
+interpretar, cada PDF se califica por separado.
+
+Cada etapa (calificado, renderizado, fusionado, persistido) se registra en una
+bitácora JSONL en CALIFICAR_ROOT; si el proceso se interrumpe, la siguiente
+ejecución retoma cada PDF en la etapa que falló.
+
+Las solicitudes pasan por un limitador adaptativo (RPM/TPM) y un interruptor de
+circuito; los PDFs que fallan por 429/5xx se reprograman con espera exponencial
+en lugar de contarse como fallidos.
+
+Gemini responde con salida estructurada (response_schema con el formato de la
+calificación); las respuestas truncadas o con valores incoherentes (total distinto
+de la suma de criterios, puntos fuera de rango) se reparan localmente en lugar
+de repetir la solicitud (esquema_calificacion.py).
+
+Las respuestas de Gemini se guardan en una caché en disco (cache/calificaciones)
+indexada por el contenido del PDF, la rúbrica, la transcripción, la versión del
+prompt y el modelo; volver a procesar las mismas entradas no consume tokens.
+
+Las entregas idénticas de una misma tarea (el mismo PDF subido por varios
+integrantes de un equipo) se califican una sola vez y la calificación se
+reparte a cada alumno; cada reparto queda en .duplicados_calificacion.jsonl
+(duplicados_entregas.py). Antes de confirmar también se reportan los grupos de
+entregas parecidas entre sí o con las de semestres anteriores
+(similitud_entregas.py).
+
 Uso:
     python calificar_gemini.py
+    python calificar_gemini.py --tarea "1. Conectarse" --limite 50 --si
+    python calificar_gemini.py --fragmento 2/4 --si     (máquina 2 de 4)
+
+Sin argumentos procesa todo CALIFICAR_ROOT y pide confirmación. --grupo,
+--tarea, --limite, --si y --fragmento i/N permiten ejecutarlo desatendido y
+repartir los pendientes entre varias máquinas (reparto_trabajo.py).
 """
 
+import argparse
 import json
+import os
 import mysql.connector
-import google.generativeai as genai
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 # Librerías para PDFs
 from PyPDF2 import PdfReader, PdfWriter
@@ -32,9 +76,64 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from io import BytesIO
 
+from adelgazar_pdf import AdelgazadorPDF, BackendAdelgazado
+from cache_contenido import CacheContenido, calcular_clave, hash_archivo
+from backends_calificacion import BackendCalificacion, BackendGemini, crear_backend, presupuesto_envio
+from bitacora_calificacion import BitacoraCalificacion, clave_entrega
+from esquema_calificacion import (
+    ESQUEMA_CALIFICACION, ESQUEMA_EVIDENCIA, ESQUEMA_LOTE, ErrorCalificacionInvalida,
+    interpretar_json, reparar_calificacion
+)
+from duplicados_entregas import RegistroDuplicados, anexar_copias, marcar_duplicados, separar_copias
+from similitud_entregas import SIMILITUD_DIR, UMBRAL_SIMILITUD, IndiceSimilitud, imprimir_grupos, semestre_actual
+from manifiesto_archivos import ManifiestoArchivos
+from memoria_pdf import abrir_pdf, contar_paginas, fusionar_incremental, limitar_memoria_proceso
+from partes_pdf import PartesPDF, rangos_paginas
+from limitador_solicitudes import (
+    BackendLimitado, ErrorReintentable, InterruptorCircuito, LimitadorAdaptativo
+)
+from registro_rubricas import RegistroRubricas
+from reparto_trabajo import (
+    BloqueoFragmento, ErrorBloqueo, agregar_argumentos, confirmar, seleccionar_pendientes,
+    sufijo_fragmento
+)
+from persistencia_calificaciones import RepositorioCalificaciones
+from pipeline_calificacion import PipelineCalificacion
+from telemetria_calificacion import TelemetriaCalificacion, metricas_entrega
+
 
 # Configuración
 CALIFICAR_ROOT = Path(r"D:\tareas\Calificar")
+RUBRICAS_ARCHIVO = Path(__file__).parent / "rubricas.json"
+MAX_CONCURRENCIA = 4  # Solicitudes simultáneas a Gemini (1 = secuencial)
+PROCESOS_RENDER = min(4, os.cpu_count() or 1)  # Procesos para ReportLab/PyPDF2
+TAMANO_LOTE_BD = 200  # Calificaciones por transacción del escritor de BD
+TELEMETRIA_DIR = Path(__file__).parent / "telemetria"  # Registro JSONL y métricas Prometheus
+PRECIO_ENTRADA_MILLON = 0.075  # USD por millón de tokens de entrada (gemini-1.5-flash)
+PRECIO_SALIDA_MILLON = 0.30    # USD por millón de tokens de salida
+VERSION_PROMPT = "2"  # Incrementar al cambiar construir_prompt (invalida la caché)
+CACHE_DIR = Path(__file__).parent / "cache" / "calificaciones"
+CACHE_MAX_MB = 200
+MODO_LOTE = False  # Agrupar PDFs pequeños de la misma tarea en una solicitud
+TAMANO_LOTE = 5  # PDFs por solicitud en modo lote
+LOTE_MAX_PAGINAS = 4  # Un PDF es "pequeño" si no supera estas páginas...
+LOTE_MAX_BYTES = 2 * 1024 * 1024  # ...ni este tamaño
+LIMITE_RPM = 15  # Solicitudes por minuto permitidas por la cuenta de Gemini
+LIMITE_TPM = 1_000_000  # Tokens por minuto
+MAX_REINTENTOS = 5  # Reintentos por PDF ante errores 429/5xx
+ADELGAZAR_PDFS = True  # Enviar a la API una copia ligera de los PDFs escaneados
+ADELGAZAR_MAX_DPI = 150  # Resolución máxima de las imágenes en la copia
+ADELGAZAR_CALIDAD = 60  # Calidad JPEG de las imágenes recomprimidas
+ADELGAZAR_MIN_BYTES = 1024 * 1024  # PDFs más pequeños se envían tal cual
+CACHE_PDFS_DIR = Path(__file__).parent / "cache" / "pdfs_adelgazados"
+CACHE_PDFS_MAX_MB = 1000
+PARTES_MIN_PAGINAS = 40  # PDFs con más páginas se califican por partes...
+PARTES_MIN_BYTES = 30 * 1024 * 1024  # ...o con más de este tamaño
+PAGINAS_POR_PARTE = 15  # Páginas de cada parte
+HILOS_PARTES = 3  # Partes de un mismo PDF analizadas en paralelo
+FUSION_INCREMENTAL = True  # Anteponer la calificación sin reescribir el PDF original
+MEMORIA_RENDER_MB = 1024  # Memoria adicional máxima por proceso de render (Linux; 0 = sin límite)
+REVISAR_SIMILITUD = True  # Reportar entregas parecidas (similitud_entregas.py) antes de calificar
 
 
 def cargar_credenciales():
@@ -47,21 +146,6 @@ def cargar_credenciales():
         return json.load(f)
 
 
-def cargar_rubricas():
-    """Carga configuración de rúbricas desde rubricas.json"""
-    rub_file = Path(__file__).parent / "rubricas.json"
-    if not rub_file.exists():
-        raise FileNotFoundError(
-            "No se encontró rubricas.json. "
-            "Crea el archivo con las rúbricas de cada tarea."
-        )
-
-    with open(rub_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    return data.get('rubricas', {})
-
-
 def conectar_db(config):
     """Conecta a la base de datos MySQL"""
     try:
@@ -78,17 +162,19 @@ def conectar_db(config):
         raise
 
 
-def configurar_gemini(api_key: str):
+def configurar_gemini(api_key: str) -> BackendCalificacion:
     """Configura la API de Gemini"""
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    return model
+    return BackendGemini(api_key)
 
 
-def buscar_pdfs_sin_calificar(root_dir: Path) -> List[Dict]:
+def buscar_pdfs_sin_calificar(root_dir: Path,
+                              bitacora: Optional[BitacoraCalificacion] = None) -> List[Dict]:
     """
     Busca todos los PDFs que NO tengan prefijo Cal_
     y que NO tengan ya un PDF calificado correspondiente.
+
+    Con bitácora, también son pendientes los PDFs cuyo proceso quedó a medias
+    (por ejemplo, Cal_ generado pero calificación sin guardar en la BD).
     """
     pdfs_pendientes = []
 
@@ -98,30 +184,27 @@ def buscar_pdfs_sin_calificar(root_dir: Path) -> List[Dict]:
         print(f"[!] No existe el directorio: {root_dir}")
         return []
 
-    for grupo_dir in root_dir.iterdir():
-        if not grupo_dir.is_dir():
-            continue
+    # Solo se vuelven a listar las carpetas de tarea que cambiaron desde la última búsqueda
+    manifiesto = ManifiestoArchivos(root_dir)
+    revision = manifiesto.actualizar()
+    print(f"    Carpetas de tarea: {revision['carpetas']} ({revision['escaneadas']} con cambios)")
+
+    entregas = manifiesto.archivos(['entrega_pendiente', 'entrega_calificada'])
+    for grupo, tarea, archivo, pdf_file, registro in entregas:
+        pdf_info = {
+            'ruta': pdf_file,
+            'grupo': grupo,
+            'tarea': tarea,
+            'archivo': archivo
+        }
 
-        for tarea_dir in grupo_dir.iterdir():
-            if not tarea_dir.is_dir():
-                continue
+        # Verificar si ya existe el PDF calificado
+        if registro[2] == 'entrega_calificada':
+            etapa = bitacora.ultima_etapa(pdf_info) if bitacora is not None else None
+            if etapa in (None, 'persistido'):
+                continue  # Ya tiene calificación
 
-            # Buscar PDFs sin prefijo "Cal_"
-            for pdf_file in tarea_dir.glob("*.pdf"):
-                if pdf_file.name.startswith("Cal_"):
-                    continue  # Ya está calificado
-
-                # Verificar si ya existe el PDF calificado
-                cal_pdf = tarea_dir / f"Cal_{pdf_file.name}"
-                if cal_pdf.exists():
-                    continue  # Ya tiene calificación
-
-                pdfs_pendientes.append({
-                    'ruta': pdf_file,
-                    'grupo': grupo_dir.name,
-                    'tarea': tarea_dir.name,
-                    'archivo': pdf_file.name
-                })
+        pdfs_pendientes.append(pdf_info)
 
     print(f"[+] Se encontraron {len(pdfs_pendientes)} PDFs sin calificar")
     return pdfs_pendientes
@@ -151,57 +234,15 @@ def buscar_transcripcion(pdf_path: Path) -> Optional[Dict]:
     return None
 
 
-def cargar_rubrica(tarea_nombre: str, rubricas_config: Dict) -> Tuple[Optional[str], Optional[Dict]]:
-    """
-    Carga el texto de la rúbrica correspondiente a la tarea.
-    Retorna (texto_rubrica, config_rubrica)
-    """
-    # Buscar la rúbrica en la configuración
-    rubrica_info = rubricas_config.get(tarea_nombre)
-
-    if not rubrica_info:
-        print(f"[!] No se encontró configuración de rúbrica para: {tarea_nombre}")
-        return None, None
-
-    # Cargar el archivo de rúbrica
-    rubrica_path = Path(rubrica_info['archivo'])
-
-    if not rubrica_path.exists():
-        print(f"[!] No existe el archivo de rúbrica: {rubrica_path}")
-        return None, None
-
-    try:
-        with open(rubrica_path, 'r', encoding='utf-8') as f:
-            texto_rubrica = f.read()
-
-        return texto_rubrica, rubrica_info
-
-    except Exception as e:
-        print(f"[!] Error al leer rúbrica: {e}")
-        return None, None
-
-
-def construir_prompt(rubrica: str, transcripcion: Optional[Dict]) -> str:
+def construir_prefijo_prompt(rubrica: str) -> str:
     """
-    Construye el prompt para enviar a Gemini.
+    Construye la parte del prompt común a todas las entregas de una tarea:
+    rúbrica, instrucciones y formato de respuesta.
     """
     prompt = f"""Eres un asistente de calificación académica. Debes evaluar el siguiente trabajo estudiantil.
 
 RÚBRICA DE EVALUACIÓN:
 {rubrica}
-"""
-
-    if transcripcion:
-        prompt += f"""
-⚠️ OBSERVACIONES DEL PROFESOR (PRIORITARIAS):
-El profesor que revisó esta tarea grabó las siguientes observaciones de audio:
-"{transcripcion.get('transcripcion', '')}"
-
-IMPORTANTE: Estas observaciones del profesor son PRIORITARIAS y deben guiar tu evaluación.
-- Considera los comentarios del profesor como la opinión autorizada sobre este trabajo
-- Ajusta tu calificación según los puntos específicos mencionados por el profesor
-- Si el profesor señala errores o aciertos concretos, refléjalos en tu evaluación
-- Las observaciones del audio tienen mayor peso que tu análisis independiente del PDF
 """
 
     prompt += """
@@ -247,46 +288,418 @@ IMPORTANTE: Responde SOLO con el JSON, sin markdown, sin ```json, sin texto adic
     return prompt
 
 
-def calificar_con_gemini(model, pdf_path: Path, prompt: str) -> Optional[Dict]:
+def construir_delta_prompt(transcripcion: Optional[Dict], trabajo: str = "el PDF adjunto") -> str:
+    """
+    Construye la parte del prompt propia de cada alumno (observaciones del profesor).
+    trabajo describe qué se está evaluando (el PDF o la evidencia de sus partes).
+    """
+    if not transcripcion:
+        return f"""
+TRABAJO A EVALUAR: {trabajo}. No hay observaciones de audio del profesor.
+"""
+
+    return f"""
+⚠️ OBSERVACIONES DEL PROFESOR (PRIORITARIAS):
+El profesor que revisó esta tarea grabó las siguientes observaciones de audio:
+"{transcripcion.get('transcripcion', '')}"
+
+IMPORTANTE: Estas observaciones del profesor son PRIORITARIAS y deben guiar tu evaluación.
+- Considera los comentarios del profesor como la opinión autorizada sobre este trabajo
+- Ajusta tu calificación según los puntos específicos mencionados por el profesor
+- Si el profesor señala errores o aciertos concretos, refléjalos en tu evaluación
+- Las observaciones del audio tienen mayor peso que tu análisis independiente del PDF
+
+TRABAJO A EVALUAR: {trabajo}.
+"""
+
+
+def construir_prompt(rubrica: str, transcripcion: Optional[Dict]) -> str:
     """
-    Envía el PDF y el prompt a Gemini para obtener la calificación.
+    Construye el prompt completo para enviar a Gemini (prefijo de la tarea + parte del alumno).
+    """
+    return construir_prefijo_prompt(rubrica) + construir_delta_prompt(transcripcion)
+
+
+def construir_delta_prompt_lote(entregas: List[Tuple[str, Optional[Dict]]]) -> str:
+    """
+    Construye la parte del prompt para un lote de entregas de la misma tarea.
+    entregas es una lista de (nombre_archivo, transcripcion).
+    """
+    prompt = f"""
+MODO LOTE: se adjuntan {len(entregas)} trabajos de DISTINTOS alumnos. Cada PDF va precedido
+por una línea "ARCHIVO: <nombre>". Evalúa cada trabajo de forma INDEPENDIENTE.
+"""
+
+    for archivo, transcripcion in entregas:
+        if transcripcion:
+            prompt += f"""
+⚠️ OBSERVACIONES DEL PROFESOR (PRIORITARIAS) para "{archivo}":
+"{transcripcion.get('transcripcion', '')}"
+"""
+
+    if any(transcripcion for _, transcripcion in entregas):
+        prompt += """
+IMPORTANTE: Las observaciones del profesor son PRIORITARIAS y deben guiar la evaluación del
+trabajo al que corresponden; tienen mayor peso que tu análisis independiente del PDF.
+"""
+
+    prompt += """
+FORMATO DE RESPUESTA EN MODO LOTE:
+Responde ÚNICAMENTE con un arreglo JSON con un objeto por archivo. Cada objeto tiene el
+formato indicado arriba más el campo "archivo" con el nombre EXACTO del archivo:
+
+[
+  {"archivo": "<nombre del archivo>", "calificacion_total": <número>, ...},
+  ...
+]
+"""
+
+    return prompt
+
+
+def construir_prefijo_evidencia(rubrica: str) -> str:
+    """
+    Construye el prefijo común a las partes de los PDFs extensos de una tarea:
+    rúbrica e instrucciones para reunir evidencia sin calificar.
+    """
+    return f"""Eres un asistente de calificación académica. Vas a revisar UNA PARTE (un rango de páginas)
+de un trabajo estudiantil extenso. La calificación se asignará después con la evidencia de todas
+las partes; tu tarea es SOLO reunir evidencia.
+
+RÚBRICA DE EVALUACIÓN:
+{rubrica}
+
+INSTRUCCIONES:
+1. Analiza TODO el contenido de las páginas adjuntas, incluyendo texto, fórmulas, diagramas e imágenes
+2. Para cada criterio de la rúbrica, anota la evidencia concreta que encuentres (aciertos y errores)
+   indicando las páginas
+3. Si un criterio no aparece en estas páginas, omítelo
+4. NO asignes puntos ni calificación
+
+FORMATO DE RESPUESTA:
+Debes responder ÚNICAMENTE en formato JSON válido, sin texto adicional antes ni después.
+
+{{
+  "resumen": "<de qué trata esta parte del trabajo>",
+  "evidencia": [
+    {{
+      "criterio": "<nombre del criterio>",
+      "paginas": "<páginas donde se encontró>",
+      "cumplimiento": "<completo | parcial | ausente>",
+      "observacion": "<qué se encontró>"
+    }}
+  ],
+  "problemas": ["<errores u omisiones notables>"]
+}}
+
+IMPORTANTE: Responde SOLO con el JSON, sin markdown, sin ```json, sin texto adicional.
+"""
+
+
+def construir_delta_prompt_parte(numero: int, total_partes: int, inicio: int, fin: int,
+                                 total_paginas: int) -> str:
+    """Construye la parte del prompt que identifica un rango de páginas"""
+    return f"""
+PARTE {numero} de {total_partes}: el PDF adjunto contiene las páginas {inicio} a {fin}
+de un trabajo de {total_paginas} páginas.
+"""
+
+
+def construir_delta_prompt_agregacion(evidencias: List[Tuple[int, int, Dict]], total_paginas: int,
+                                      transcripcion: Optional[Dict]) -> str:
+    """
+    Construye la parte del prompt de la solicitud final de un PDF calificado por
+    partes: la evidencia de cada rango de páginas en lugar del PDF.
+    """
+    prompt = f"""
+TRABAJO EXTENSO: el trabajo tiene {total_paginas} páginas y se revisó por partes. En lugar del PDF
+se incluye la evidencia encontrada en cada rango de páginas. Evalúa el trabajo COMPLETO aplicando
+la rúbrica a la evidencia de todas las partes.
+"""
+
+    for inicio, fin, evidencia in evidencias:
+        prompt += f"""
+EVIDENCIA DE LAS PÁGINAS {inicio}-{fin}:
+{json.dumps(evidencia, ensure_ascii=False)}
+"""
+
+    return prompt + construir_delta_prompt(transcripcion, "la evidencia de todas las partes")
+
+
+def crear_registro_rubricas(backend: BackendCalificacion) -> RegistroRubricas:
+    """
+    Registro de rúbricas del proceso (rubricas.json junto a este script); sus
+    contextos llevan el prefijo de construir_prefijo_prompt ya registrado en el backend.
+    """
+    return RegistroRubricas(backend, construir_prefijo_prompt, RUBRICAS_ARCHIVO)
+
+
+def registrar_metricas_respuesta(metricas: Dict, response, transcurrido: float,
+                                 pdf_bytes: int) -> None:
+    """Tokens (usage metadata), latencia y tamaño de una solicitud a la API"""
+    latencia = response.latencia or transcurrido
+    metricas.update({
+        'tokens_prompt': response.tokens_prompt,
+        'tokens_respuesta': response.tokens_respuesta,
+        'tokens_cache': response.tokens_cache,
+        'latencia_api': round(latencia, 4),
+        'espera_limite': round(max(0.0, transcurrido - latencia), 4),
+        'pdf_bytes': pdf_bytes,
+        'bytes_enviados': response.bytes_enviados or pdf_bytes
+    })
+
+
+def validar_respuesta(calificacion_data, rubrica_info: Optional[Dict], nombre: str,
+                      metricas: Optional[Dict] = None, truncada: bool = False) -> Dict:
+    """
+    Repara una calificación recibida (ver esquema_calificacion.reparar_calificacion)
+    e informa cada corrección. Con metricas, anota ahí cuántas hubo.
+    Lanza ErrorCalificacionInvalida si no se puede reparar.
+    """
+    calificacion_data, reparaciones = reparar_calificacion(calificacion_data, rubrica_info,
+                                                           completa=not truncada)
+    if truncada:
+        reparaciones.insert(0, "respuesta truncada, se cerró el JSON")
+
+    if reparaciones:
+        print(f"[!] Respuesta reparada localmente ({nombre}):")
+        for reparacion in reparaciones:
+            print(f"    - {reparacion}")
+    if metricas is not None:
+        metricas['reparaciones'] = len(reparaciones)
+
+    return calificacion_data
+
+
+def calificar_con_gemini(backend: BackendCalificacion, pdf_path: Path, prompt: str,
+                         prefijo_id: Optional[str] = None,
+                         metricas: Optional[Dict] = None,
+                         rubrica_info: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Envía el PDF y el prompt al backend (Gemini o falso) para obtener la calificación.
+    Con prefijo_id, el prompt contiene solo la parte del alumno y la rúbrica se toma
+    del prefijo registrado en el backend.
+    Con metricas, agrega ahí tokens, latencia y tamaño del PDF.
+    rubrica_info (entrada de rubricas.json) permite reparar los puntos de cada criterio.
     """
     print(f"\n[→] Calificando con Gemini: {pdf_path.name}")
 
+    response_text = ''
     try:
-        # Cargar el PDF como archivo
-        with open(pdf_path, 'rb') as f:
-            pdf_data = f.read()
-
-        # Crear el objeto de archivo para Gemini
-        pdf_part = {
-            'mime_type': 'application/pdf',
-            'data': pdf_data
-        }
+        # El PDF se mapea en memoria en lugar de copiarse completo al heap
+        with abrir_pdf(pdf_path) as pdf_data:
+            # Enviar a Gemini
+            print(f"    Enviando a {backend.nombre_modelo}...")
+            inicio = time.perf_counter()
+            response = backend.generar(prompt, pdf_data, prefijo_id=prefijo_id,
+                                       esquema=ESQUEMA_CALIFICACION)
+            if metricas is not None:
+                registrar_metricas_respuesta(metricas, response, time.perf_counter() - inicio,
+                                             len(pdf_data))
+
+        # Interpretar el JSON (cerrando respuestas truncadas) y reparar valores incoherentes
+        response_text = response.text.strip()
+        calificacion_data, truncada = interpretar_json(response_text)
+        calificacion_data = validar_respuesta(calificacion_data, rubrica_info, pdf_path.name,
+                                              metricas, truncada)
 
-        # Enviar a Gemini
-        print("    Enviando a Gemini API...")
-        response = model.generate_content([prompt, pdf_part])
+        print(f"[✓] Calificación obtenida: {calificacion_data.get('calificacion_total', 'N/A')}/10.0")
 
-        # Extraer texto de la respuesta
-        response_text = response.text.strip()
+        return calificacion_data
 
-        # Intentar parsear JSON
-        # Limpiar posibles marcadores de código
-        response_text = response_text.replace('```json', '').replace('```', '').strip()
+    except (json.JSONDecodeError, ErrorCalificacionInvalida) as e:
+        print(f"[!] Respuesta de Gemini sin calificación recuperable: {e}")
+        print(f"    Respuesta recibida: {response_text[:500]}")
+        return None
+    except ErrorReintentable as e:
+        print(f"[!] Error temporal de Gemini ({pdf_path.name}), se reintentará: {e}")
+        raise
+    except Exception as e:
+        print(f"[!] Error al calificar con Gemini: {e}")
+        return None
 
-        calificacion_data = json.loads(response_text)
 
-        print(f"[✓] Calificación obtenida: {calificacion_data.get('calificacion_total', 'N/A')}/10.0")
+def combinar_metricas_partes(metricas: Dict, parciales: List[Dict], pdf_bytes: int,
+                             total_partes: int) -> None:
+    """
+    Métricas de un PDF calificado por partes: tokens y bytes sumados; latencia de
+    la parte más lenta más la de la agregación (las partes van en paralelo).
+    """
+    for clave in ('tokens_prompt', 'tokens_respuesta', 'tokens_cache', 'bytes_enviados', 'espera_limite'):
+        metricas[clave] = sum(m.get(clave, 0) for m in parciales)
+    partes = [m for m in parciales if not m.get('agregacion')]
+    agregacion = [m for m in parciales if m.get('agregacion')]
+    metricas['latencia_api'] = round(
+        max((m['latencia_api'] for m in partes), default=0.0)
+        + sum(m['latencia_api'] for m in agregacion), 4
+    )
+    metricas['espera_limite'] = round(metricas['espera_limite'], 4)
+    metricas['pdf_bytes'] = pdf_bytes
+    metricas['partes'] = total_partes
+
+
+def calificar_por_partes(backend: BackendCalificacion, pdf_path: Path, contexto: Dict,
+                         transcripcion: Optional[Dict],
+                         cache: Optional[CacheContenido] = None,
+                         metricas: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Califica un PDF extenso: lo divide en rangos de PAGINAS_POR_PARTE páginas,
+    reúne la evidencia de cada parte en paralelo (HILOS_PARTES solicitudes) y
+    hace una solicitud final que aplica la rúbrica a la evidencia combinada.
 
+    La evidencia de cada parte se guarda en caché, así que si una parte falla
+    con un error temporal el reintento solo repite las que faltan.
+    """
+    print(f"\n[→] Calificando por partes: {pdf_path.name}")
+
+    response_text = ''
+    partes_pdf = None
+    try:
+        partes_pdf = PartesPDF(pdf_path)
+        rangos = rangos_paginas(partes_pdf.total_paginas, PAGINAS_POR_PARTE)
+        print(f"    {partes_pdf.total_paginas} páginas en {len(rangos)} partes")
+
+        prefijo_evidencia = backend.registrar_prefijo(construir_prefijo_evidencia(contexto['rubrica_texto']))
+        hash_pdf = hash_archivo(pdf_path)
+        parciales: List[Dict] = []
+
+        def evidencia_parte(numero: int, inicio: int, fin: int) -> Dict:
+            clave = calcular_clave('evidencia', hash_pdf, f"{inicio}-{fin}", contexto['rubrica_texto'],
+                                   VERSION_PROMPT, backend.nombre_modelo)
+            if cache is not None:
+                previo = cache.obtener(clave)
+                if previo is not None:
+                    return previo
+
+            pdf_data = partes_pdf.extraer(inicio, fin)
+            prompt = construir_delta_prompt_parte(numero, len(rangos), inicio, fin,
+                                                  partes_pdf.total_paginas)
+            inicio_solicitud = time.perf_counter()
+            response = backend.generar(prompt, pdf_data, prefijo_id=prefijo_evidencia,
+                                       esquema=ESQUEMA_EVIDENCIA)
+            metricas_parte = {}
+            registrar_metricas_respuesta(metricas_parte, response,
+                                         time.perf_counter() - inicio_solicitud, len(pdf_data))
+            parciales.append(metricas_parte)
+
+            texto = response.text.strip()
+            try:
+                evidencia, _ = interpretar_json(texto)
+            except json.JSONDecodeError:
+                # La evidencia también sirve como texto libre; solo no se guarda en caché
+                print(f"[!] Evidencia de las páginas {inicio}-{fin} no es JSON; se usa como texto")
+                return {'notas': texto}
+
+            if not isinstance(evidencia, dict):
+                evidencia = {'evidencia': evidencia}
+            if cache is not None:
+                cache.guardar(clave, evidencia)
+            print(f"    [✓] Evidencia de las páginas {inicio}-{fin}")
+            return evidencia
+
+        with ThreadPoolExecutor(max_workers=min(HILOS_PARTES, len(rangos))) as executor:
+            futuros = [
+                executor.submit(evidencia_parte, numero, inicio, fin)
+                for numero, (inicio, fin) in enumerate(rangos, 1)
+            ]
+        # Al salir del with todas las partes terminaron; result() relanza el primer error
+        evidencias = [(inicio, fin, futuro.result()) for (inicio, fin), futuro in zip(rangos, futuros)]
+
+        # Solicitud final: rúbrica (prefijo de la tarea) + evidencia de todas las partes
+        prompt = construir_delta_prompt_agregacion(evidencias, partes_pdf.total_paginas, transcripcion)
+        print(f"    Agregando evidencia con {backend.nombre_modelo}...")
+        inicio_solicitud = time.perf_counter()
+        response = backend.generar(prompt, b'', prefijo_id=contexto['prefijo_id'],
+                                   esquema=ESQUEMA_CALIFICACION)
+        metricas_agregacion = {'agregacion': True}
+        registrar_metricas_respuesta(metricas_agregacion, response,
+                                     time.perf_counter() - inicio_solicitud, 0)
+        parciales.append(metricas_agregacion)
+        if metricas is not None:
+            combinar_metricas_partes(metricas, parciales, pdf_path.stat().st_size, len(rangos))
+
+        response_text = response.text.strip()
+        calificacion_data, truncada = interpretar_json(response_text)
+        calificacion_data = validar_respuesta(calificacion_data, contexto.get('rubrica_info'),
+                                              pdf_path.name, metricas, truncada)
+
+        print(f"[✓] Calificación obtenida: {calificacion_data.get('calificacion_total', 'N/A')}/10.0")
         return calificacion_data
 
+    except (json.JSONDecodeError, ErrorCalificacionInvalida) as e:
+        print(f"[!] Respuesta de Gemini sin calificación recuperable: {e}")
+        print(f"    Respuesta recibida: {response_text[:500]}")
+        return None
+    except ErrorReintentable as e:
+        print(f"[!] Error temporal de Gemini ({pdf_path.name}), se reintentará: {e}")
+        raise
+    except Exception as e:
+        print(f"[!] Error al calificar por partes: {e}")
+        return None
+    finally:
+        if partes_pdf is not None:
+            partes_pdf.cerrar()
+
+
+def calificar_lote_con_gemini(backend: BackendCalificacion, pdf_paths: List[Path], prompt: str,
+                              prefijo_id: Optional[str] = None,
+                              metricas: Optional[Dict] = None,
+                              rubrica_info: Optional[Dict] = None) -> Optional[Dict[str, Dict]]:
+    """
+    Envía varios PDFs en una sola solicitud. Retorna {nombre_archivo: calificacion_data}
+    con las calificaciones que se pudieron interpretar (y reparar), o None si la
+    respuesta no es un arreglo JSON recuperable. Con metricas, agrega ahí las de la
+    solicitud completa.
+    """
+    nombres = [p.name for p in pdf_paths]
+    print(f"\n[→] Calificando lote de {len(pdf_paths)} PDFs con Gemini")
+
+    response_text = ''
+    try:
+        pdfs = []
+        for pdf_path in pdf_paths:
+            with open(pdf_path, 'rb') as f:
+                pdfs.append((pdf_path.name, f.read()))
+
+        print(f"    Enviando a {backend.nombre_modelo}...")
+        inicio = time.perf_counter()
+        response = backend.generar_lote(prompt, pdfs, prefijo_id=prefijo_id, esquema=ESQUEMA_LOTE)
+        if metricas is not None:
+            registrar_metricas_respuesta(metricas, response, time.perf_counter() - inicio,
+                                         sum(len(d) for _, d in pdfs))
+
+        response_text = response.text.strip()
+        calificaciones, truncada = interpretar_json(response_text)
+        if not isinstance(calificaciones, list):
+            print("[!] La respuesta del lote no es un arreglo JSON")
+            return None
+        if truncada:
+            print("[!] Respuesta del lote truncada; se conservan las calificaciones completas")
+
+        resultado = {}
+        for calificacion_data in calificaciones:
+            if not isinstance(calificacion_data, dict):
+                continue
+            archivo = calificacion_data.pop('archivo', None)
+            if archivo not in nombres:
+                continue
+            try:
+                resultado[archivo] = validar_respuesta(calificacion_data, rubrica_info, archivo)
+            except ErrorCalificacionInvalida as e:
+                print(f"[!] Calificación del lote descartada ({archivo}): {e}")
+
+        print(f"[✓] Lote calificado: {len(resultado)}/{len(pdf_paths)} calificaciones")
+        return resultado
+
     except json.JSONDecodeError as e:
-        print(f"[!] Error al parsear respuesta JSON de Gemini: {e}")
+        print(f"[!] Error al parsear respuesta JSON del lote: {e}")
         print(f"    Respuesta recibida: {response_text[:500]}")
         return None
+    except ErrorReintentable as e:
+        print(f"[!] Error temporal de Gemini (lote), se reintentará: {e}")
+        raise
     except Exception as e:
-        print(f"[!] Error al calificar con Gemini: {e}")
+        print(f"[!] Error al calificar lote con Gemini: {e}")
         return None
 
 
@@ -464,22 +877,29 @@ def generar_pagina_calificacion(calificacion_data: Dict, tarea_nombre: str, alum
 def fusionar_pdfs(pagina_calificacion: BytesIO, pdf_original: Path, salida: Path) -> bool:
     """
     Fusiona la página de calificación con el PDF original del alumno.
+    Con FUSION_INCREMENTAL la página se antepone sin reescribir el original
+    (memoria constante); si el PDF no lo admite, se reescribe completo.
     """
     try:
+        if FUSION_INCREMENTAL and fusionar_incremental(pagina_calificacion.getvalue(), pdf_original, salida):
+            print(f"[✓] PDF calificado generado: {salida.name}")
+            return True
+
         writer = PdfWriter()
 
         # Agregar página de calificación
         cal_reader = PdfReader(pagina_calificacion)
         writer.add_page(cal_reader.pages[0])
 
-        # Agregar PDF original
-        original_reader = PdfReader(pdf_original)
-        for page in original_reader.pages:
-            writer.add_page(page)
+        # Agregar PDF original (leído del archivo bajo demanda)
+        with open(pdf_original, 'rb') as original:
+            original_reader = PdfReader(original)
+            for page in original_reader.pages:
+                writer.add_page(page)
 
-        # Guardar PDF fusionado
-        with open(salida, 'wb') as output_file:
-            writer.write(output_file)
+            # Guardar PDF fusionado
+            with open(salida, 'wb') as output_file:
+                writer.write(output_file)
 
         print(f"[✓] PDF calificado generado: {salida.name}")
         return True
@@ -512,113 +932,661 @@ def extraer_nombre_alumno(filename: str, tarea_nombre: str) -> str:
     return name_without_ext.replace("_", " ")
 
 
-def guardar_calificacion_db(conn, alumno_nombre: str, tarea_nombre: str, grupo_nombre: str,
-                            calificacion: float, rutas: Dict) -> bool:
+def clave_cache_calificacion(backend: BackendCalificacion, pdf_path: Path, rubrica_texto: str,
+                             transcripcion: Optional[Dict], sha256: Optional[str] = None) -> str:
     """
-    Guarda la calificación en la base de datos.
+    Calcula la clave de caché de una calificación a partir del contenido del PDF,
+    el texto de la rúbrica, la transcripción, la versión del prompt y el modelo.
+    sha256, si ya se conoce, evita volver a leer el PDF.
     """
+    texto_transcripcion = transcripcion.get('transcripcion', '') if transcripcion else ''
+
+    return calcular_clave(
+        sha256 or hash_archivo(pdf_path),
+        rubrica_texto,
+        texto_transcripcion,
+        VERSION_PROMPT,
+        backend.nombre_modelo
+    )
+
+
+def es_pdf_pequeno(pdf_path: Path) -> bool:
+    """Indica si el PDF cabe en un lote (según LOTE_MAX_BYTES y LOTE_MAX_PAGINAS)"""
     try:
-        cursor = conn.cursor()
+        if pdf_path.stat().st_size > LOTE_MAX_BYTES:
+            return False
+        return contar_paginas(pdf_path) <= LOTE_MAX_PAGINAS
+    except Exception:
+        return False
 
-        # Buscar alumno por nombre
-        cursor.execute(
-            "SELECT id FROM alumnos WHERE nombre = %s",
-            (alumno_nombre,)
-        )
-        result = cursor.fetchone()
 
-        if not result:
-            print(f"[!] No se encontró alumno en BD: {alumno_nombre}")
+def es_pdf_extenso(pdf_path: Path) -> bool:
+    """
+    Indica si el PDF se califica por partes: más de PARTES_MIN_PAGINAS páginas,
+    o más de PARTES_MIN_BYTES con al menos dos partes.
+    """
+    try:
+        paginas = contar_paginas(pdf_path)
+        if len(rangos_paginas(paginas, PAGINAS_POR_PARTE)) < 2:
             return False
+        return paginas > PARTES_MIN_PAGINAS or pdf_path.stat().st_size > PARTES_MIN_BYTES
+    except Exception:
+        return False
+
+
+def buscar_calificacion_previa(pdf_info: Dict, clave: str,
+                               cache: Optional[CacheContenido] = None,
+                               bitacora: Optional[BitacoraCalificacion] = None) -> Optional[Dict]:
+    """
+    Busca una calificación ya obtenida para las mismas entradas: primero en la
+    bitácora (si la clave coincide) y después en la caché.
+    """
+    if bitacora is not None:
+        previo = bitacora.datos(pdf_info, 'calificado')
+        if previo and previo.get('clave') == clave:
+            print(f"[✓] Calificación recuperada de la bitácora: {pdf_info['archivo']}")
+            metricas_entrega(pdf_info)['origen'] = 'bitacora'
+            return previo['calificacion_data']
+
+    if cache is not None:
+        calificacion_data = cache.obtener(clave)
+        if calificacion_data:
+            print(f"[✓] Calificación recuperada de caché: {pdf_info['archivo']}")
+            metricas_entrega(pdf_info)['origen'] = 'cache'
+            if bitacora is not None:
+                bitacora.registrar(pdf_info, 'calificado', {
+                    'clave': clave, 'calificacion_data': calificacion_data
+                })
+            return calificacion_data
+
+    return None
 
-        alumno_id = result[0]
 
-        # Buscar o crear tarea
-        cursor.execute(
-            "SELECT id FROM grupos WHERE nombre = %s",
-            (grupo_nombre,)
+def registrar_calificacion(pdf_info: Dict, clave: str, calificacion_data: Dict,
+                           cache: Optional[CacheContenido] = None,
+                           bitacora: Optional[BitacoraCalificacion] = None) -> None:
+    """Guarda una calificación nueva en la caché y en la bitácora"""
+    if cache is not None:
+        cache.guardar(clave, calificacion_data)
+    if bitacora is not None:
+        bitacora.registrar(pdf_info, 'calificado', {
+            'clave': clave, 'calificacion_data': calificacion_data
+        })
+
+
+def obtener_calificacion(backend: BackendCalificacion, pdf_info: Dict, contexto: Dict,
+                         transcripcion: Optional[Dict],
+                         cache: Optional[CacheContenido] = None,
+                         bitacora: Optional[BitacoraCalificacion] = None) -> Optional[Dict]:
+    """
+    Obtiene la calificación de un PDF: de la bitácora o la caché si ya existe y,
+    si no, de Gemini (por partes si el PDF es extenso).
+    """
+    clave = clave_cache_calificacion(backend, pdf_info['ruta'], contexto['rubrica_texto'], transcripcion)
+
+    calificacion_data = buscar_calificacion_previa(pdf_info, clave, cache, bitacora)
+    if calificacion_data:
+        return calificacion_data
+
+    # Calificar con Gemini
+    metricas = metricas_entrega(pdf_info)
+    metricas['origen'] = 'api'
+    if es_pdf_extenso(pdf_info['ruta']):
+        calificacion_data = calificar_por_partes(
+            backend, pdf_info['ruta'], contexto, transcripcion, cache, metricas
+        )
+    else:
+        # Solo se envía la parte del alumno; la rúbrica va en el prefijo de la tarea
+        prompt = construir_delta_prompt(transcripcion)
+        calificacion_data = calificar_con_gemini(
+            backend, pdf_info['ruta'], prompt, prefijo_id=contexto['prefijo_id'], metricas=metricas,
+            rubrica_info=contexto['rubrica_info']
         )
-        grupo_result = cursor.fetchone()
 
-        if not grupo_result:
-            print(f"[!] No se encontró grupo en BD: {grupo_nombre}")
-            return False
+    if calificacion_data:
+        registrar_calificacion(pdf_info, clave, calificacion_data, cache, bitacora)
 
-        grupo_id = grupo_result[0]
+    return calificacion_data
 
-        # Buscar o crear tarea
-        cursor.execute(
-            "SELECT id FROM tareas WHERE nombre = %s AND grupo_id = %s",
-            (tarea_nombre, grupo_id)
+
+def generar_pdf_calificado(pdf_info: Dict, calificacion_data: Dict,
+                           transcripcion: Optional[Dict],
+                           portada: Optional[Path] = None) -> Optional[Dict]:
+    """
+    Genera la página de calificación, la fusiona con el PDF original y arma
+    el resultado que se guarda en la base de datos.
+
+    Con portada, la página de calificación se guarda en esa ruta (o se reutiliza
+    si ya existe), para no volver a generarla si falla la fusión.
+    Se ejecuta en los procesos de la etapa de render del pipeline.
+    """
+    # Extraer nombre del alumno
+    alumno_nombre = extraer_nombre_alumno(pdf_info['archivo'], pdf_info['tarea'])
+
+    tiempos = {}
+    inicio = time.perf_counter()
+
+    if portada is not None and portada.exists():
+        print(f"[✓] Página de calificación ya generada: {pdf_info['archivo']}")
+        pagina_cal = BytesIO(portada.read_bytes())
+    else:
+        # Generar página de calificación
+        print(f"[+] Generando PDF de calificación: {pdf_info['archivo']}")
+        pagina_cal = generar_pagina_calificacion(
+            calificacion_data,
+            pdf_info['tarea'],
+            alumno_nombre
         )
-        tarea_result = cursor.fetchone()
 
-        if tarea_result:
-            tarea_id = tarea_result[0]
-        else:
-            # Crear tarea
-            cursor.execute(
-                "INSERT INTO tareas (grupo_id, nombre) VALUES (%s, %s)",
-                (grupo_id, tarea_nombre)
+        if portada is not None:
+            portada.parent.mkdir(parents=True, exist_ok=True)
+            temporal = portada.with_suffix('.tmp')
+            temporal.write_bytes(pagina_cal.getvalue())
+            temporal.replace(portada)
+
+    tiempos['tiempo_render'] = round(time.perf_counter() - inicio, 4)
+
+    # Fusionar con PDF original
+    inicio = time.perf_counter()
+    pdf_calificado = pdf_info['ruta'].parent / f"Cal_{pdf_info['archivo']}"
+    if not fusionar_pdfs(pagina_cal, pdf_info['ruta'], pdf_calificado):
+        return None
+    tiempos['tiempo_fusion'] = round(time.perf_counter() - inicio, 4)
+
+    audio = pdf_info['ruta'].parent / f"Cal_{pdf_info['ruta'].stem}.mp3"
+    rutas = {
+        'pdf_calificado': str(pdf_calificado),
+        'audio': str(audio) if audio.exists() else None,
+        'transcripcion': str(pdf_info['ruta'].parent / f"Cal_{pdf_info['ruta'].stem}_transcripcion.json")
+                        if transcripcion else None
+    }
+
+    return {
+        'calificacion_data': calificacion_data,
+        'alumno_nombre': alumno_nombre,
+        'rutas': rutas,
+        'tiempos': tiempos
+    }
+
+
+def preparar_salida(pdf_info: Dict, calificacion_data: Optional[Dict],
+                    transcripcion: Optional[Dict],
+                    bitacora: Optional[BitacoraCalificacion] = None) -> Tuple:
+    """
+    Decide qué etapa sigue para un PDF ya calificado, según la bitácora:
+    - ('fallido', None) si no hay calificación
+    - ('guardar', resultado) si el Cal_ ya está fusionado y solo falta la BD
+    - ('renderizar', argumentos de generar_pdf_calificado) en otro caso
+    """
+    if not calificacion_data:
+        print(f"[!] Fallo en la calificación: {pdf_info['archivo']}")
+        return (pdf_info, 'fallido', None)
+
+    portada = None
+    if bitacora is not None:
+        fusionado = bitacora.datos(pdf_info, 'fusionado')
+        pdf_calificado = pdf_info['ruta'].parent / f"Cal_{pdf_info['archivo']}"
+        if fusionado and pdf_calificado.exists():
+            print(f"[✓] PDF calificado ya generado, se retoma en la BD: {pdf_info['archivo']}")
+            return (pdf_info, 'guardar', {
+                'calificacion_data': calificacion_data,
+                'alumno_nombre': fusionado['alumno_nombre'],
+                'rutas': fusionado['rutas']
+            })
+
+        portada = bitacora.ruta_portada(pdf_info)
+        if bitacora.datos(pdf_info, 'renderizado') is None and portada.exists():
+            portada.unlink()  # Portada de una ejecución que no llegó a registrarla
+
+    return (pdf_info, 'renderizar', (pdf_info, calificacion_data, transcripcion, portada))
+
+
+def registrar_render(bitacora: BitacoraCalificacion, pdf_info: Dict, argumentos: Tuple,
+                     resultado: Optional[Dict]) -> Optional[Dict]:
+    """Registra en la bitácora las etapas renderizado y fusionado tras el render"""
+    portada = argumentos[3]
+
+    if portada is not None and portada.exists() and bitacora.datos(pdf_info, 'renderizado') is None:
+        bitacora.registrar(pdf_info, 'renderizado', {'portada': portada.name})
+
+    if resultado:
+        bitacora.registrar(pdf_info, 'fusionado', {
+            'alumno_nombre': resultado['alumno_nombre'],
+            'rutas': resultado['rutas']
+        })
+        if portada is not None:
+            portada.unlink(missing_ok=True)
+
+    return resultado
+
+
+def buscar_transcripcion_informando(pdf_info: Dict) -> Optional[Dict]:
+    """buscar_transcripcion con mensaje de progreso"""
+    transcripcion = buscar_transcripcion(pdf_info['ruta'])
+    if transcripcion:
+        print(f"[+] Transcripción de audio encontrada: {pdf_info['archivo']}")
+    else:
+        print(f"[+] Sin transcripción de audio: {pdf_info['archivo']}")
+    return transcripcion
+
+
+def calificar_entrega(backend: BackendCalificacion, pdf_info: Dict, contexto: Optional[Dict],
+                      cache: Optional[CacheContenido] = None,
+                      bitacora: Optional[BitacoraCalificacion] = None) -> Tuple:
+    """
+    Califica un PDF (transcripción, bitácora/caché, Gemini) y retorna la salida
+    para la siguiente etapa del pipeline (ver preparar_salida). No genera PDFs
+    ni toca la base de datos, por lo que puede ejecutarse en varios hilos a la vez.
+
+    contexto es el de la tarea del PDF (ver registro_rubricas.py).
+    """
+    if not contexto:
+        print(f"[!] Saltando por falta de rúbrica: {pdf_info['archivo']}")
+        return (pdf_info, 'fallido', None)
+
+    transcripcion = buscar_transcripcion_informando(pdf_info)
+
+    calificacion_data = obtener_calificacion(backend, pdf_info, contexto, transcripcion, cache, bitacora)
+
+    return preparar_salida(pdf_info, calificacion_data, transcripcion, bitacora)
+
+
+def _parte_entera(total: int, tamano: int, posicion: int) -> int:
+    """Parte de total para la posición dada; el residuo va a la primera, así las partes suman total"""
+    parte, residuo = divmod(total, tamano)
+    return parte + residuo if posicion == 0 else parte
+
+
+def repartir_metricas_lote(pdf_info: Dict, metricas_lote: Dict, tamano: int, posicion: int = 0) -> None:
+    """
+    Asigna a un PDF (posicion dentro de la solicitud) su parte de los tokens y
+    la latencia de una solicitud por lote
+    """
+    metricas = metricas_entrega(pdf_info)
+    metricas['origen'] = 'lote'
+    metricas['lote'] = tamano
+    for clave in ('tokens_prompt', 'tokens_respuesta', 'tokens_cache'):
+        if clave in metricas_lote:
+            metricas[clave] = _parte_entera(metricas_lote[clave], tamano, posicion)
+    for clave in ('latencia_api', 'espera_limite'):
+        if clave in metricas_lote:
+            metricas[clave] = round(metricas_lote[clave] / tamano, 4)
+    metricas['pdf_bytes'] = pdf_info['ruta'].stat().st_size
+    if 'bytes_enviados' in metricas_lote:
+        metricas['bytes_enviados'] = _parte_entera(metricas_lote['bytes_enviados'], tamano, posicion)
+
+
+def calificacion_de_salida(salida: Tuple) -> Optional[Dict]:
+    """Calificación contenida en una salida de preparar_salida (None si falló)"""
+    _, accion, datos = salida
+    if accion == 'renderizar':
+        return datos[1]
+    if accion == 'guardar':
+        return datos['calificacion_data']
+    return None
+
+
+def repartir_a_copias(backend: BackendCalificacion, copias: List[Dict], salidas: List[Tuple],
+                      contexto: Optional[Dict],
+                      cache: Optional[CacheContenido] = None,
+                      bitacora: Optional[BitacoraCalificacion] = None,
+                      duplicados: Optional[RegistroDuplicados] = None) -> List[Tuple]:
+    """
+    Asigna a cada copia exacta (ver duplicados_entregas.py) la calificación de
+    su original, ya resuelta en salidas, y registra el reparto. Si el original
+    falló, la copia también. Una copia con observaciones del profesor distintas
+    a las del original se califica aparte.
+    """
+    originales = {clave_entrega(s[0]): s for s in salidas}
+    resultado = []
+
+    for copia in copias:
+        salida_original = originales.get(copia['copia_de'])
+        if not contexto or salida_original is None:
+            resultado.append((copia, 'fallido', None))
+            continue
+
+        original = salida_original[0]
+        calificacion_original = calificacion_de_salida(salida_original)
+        transcripcion = buscar_transcripcion_informando(copia)
+        clave = clave_cache_calificacion(backend, copia['ruta'], contexto['rubrica_texto'],
+                                         transcripcion, copia['sha256'])
+        clave_original = clave_cache_calificacion(backend, original['ruta'], contexto['rubrica_texto'],
+                                                  buscar_transcripcion(original['ruta']), copia['sha256'])
+
+        calificacion_data = buscar_calificacion_previa(copia, clave, None, bitacora)
+        if not calificacion_data and calificacion_original:
+            if clave == clave_original:
+                print(f"[✓] Copia de {original['archivo']}, se reutiliza su calificación: {copia['archivo']}")
+                metricas_entrega(copia)['origen'] = 'duplicado'
+                calificacion_data = calificacion_original
+                registrar_calificacion(copia, clave, calificacion_data, None, bitacora)
+                if duplicados is not None:
+                    duplicados.registrar(copia, original, calificacion_data)
+            else:
+                print(f"[+] Mismo PDF que {original['archivo']} con otras observaciones, "
+                      f"se califica aparte: {copia['archivo']}")
+                calificacion_data = obtener_calificacion(
+                    backend, copia, contexto, transcripcion, cache, bitacora
+                )
+
+        resultado.append(preparar_salida(copia, calificacion_data, transcripcion, bitacora))
+
+    return resultado
+
+
+def calificar_unidad(backend: BackendCalificacion, lote: List[Dict], contexto: Optional[Dict],
+                     cache: Optional[CacheContenido] = None,
+                     bitacora: Optional[BitacoraCalificacion] = None,
+                     duplicados: Optional[RegistroDuplicados] = None) -> List[Tuple]:
+    """
+    Califica una unidad de trabajo: un PDF, o varios PDFs pequeños de la misma
+    tarea en una sola solicitud. Los que ya están en bitácora o caché no se
+    envían; los que el lote no pudo calificar se califican uno por uno.
+    Las copias exactas de la unidad (marcadas con 'copia_de') no se envían:
+    reciben la calificación de su original.
+    Retorna una salida por PDF (ver preparar_salida), en el mismo orden.
+    """
+    copias = [p for p in lote if p.get('copia_de')]
+    if copias:
+        salidas = calificar_unidad(backend, [p for p in lote if not p.get('copia_de')],
+                                   contexto, cache, bitacora)
+        return salidas + repartir_a_copias(backend, copias, salidas, contexto,
+                                           cache, bitacora, duplicados)
+
+    if len(lote) == 1:
+        return [calificar_entrega(backend, lote[0], contexto, cache, bitacora)]
+
+    if not contexto:
+        for pdf_info in lote:
+            print(f"[!] Saltando por falta de rúbrica: {pdf_info['archivo']}")
+        return [(pdf_info, 'fallido', None) for pdf_info in lote]
+
+    transcripciones = [buscar_transcripcion_informando(p) for p in lote]
+    claves = [
+        clave_cache_calificacion(backend, pdf_info['ruta'], contexto['rubrica_texto'], transcripcion)
+        for pdf_info, transcripcion in zip(lote, transcripciones)
+    ]
+
+    # Consultar bitácora y caché
+    calificaciones: List[Optional[Dict]] = [
+        buscar_calificacion_previa(pdf_info, clave, cache, bitacora)
+        for pdf_info, clave in zip(lote, claves)
+    ]
+
+    # Enviar en una sola solicitud los que faltan
+    faltantes = [i for i, c in enumerate(calificaciones) if not c]
+    if len(faltantes) > 1:
+        prompt = construir_delta_prompt_lote(
+            [(lote[i]['archivo'], transcripciones[i]) for i in faltantes]
+        )
+        metricas_lote = {}
+        respuesta = calificar_lote_con_gemini(
+            backend, [lote[i]['ruta'] for i in faltantes], prompt,
+            prefijo_id=contexto['prefijo_id'], metricas=metricas_lote,
+            rubrica_info=contexto['rubrica_info']
+        ) or {}
+
+        for posicion, i in enumerate(faltantes):
+            repartir_metricas_lote(lote[i], metricas_lote, len(faltantes), posicion)
+            calificaciones[i] = respuesta.get(lote[i]['archivo'])
+            if calificaciones[i]:
+                registrar_calificacion(lote[i], claves[i], calificaciones[i], cache, bitacora)
+
+    # Respaldo: calificar individualmente lo que el lote no resolvió
+    salidas = []
+    for i, pdf_info in enumerate(lote):
+        if not calificaciones[i]:
+            if len(faltantes) > 1:
+                print(f"[!] Sin calificación en el lote, se califica individualmente: {pdf_info['archivo']}")
+            calificaciones[i] = obtener_calificacion(
+                backend, pdf_info, contexto, transcripciones[i], cache, bitacora
             )
-            conn.commit()
-            tarea_id = cursor.lastrowid
-
-        # Insertar o actualizar calificación
-        cursor.execute("""
-            INSERT INTO calificaciones
-            (alumno_id, tarea_id, calificacion, ruta_pdf_calificado, ruta_audio, ruta_transcripcion)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-            calificacion = VALUES(calificacion),
-            ruta_pdf_calificado = VALUES(ruta_pdf_calificado),
-            ruta_audio = VALUES(ruta_audio),
-            ruta_transcripcion = VALUES(ruta_transcripcion),
-            fecha_calificacion = CURRENT_TIMESTAMP
-        """, (
-            alumno_id,
-            tarea_id,
-            calificacion,
-            rutas.get('pdf_calificado'),
-            rutas.get('audio'),
-            rutas.get('transcripcion')
-        ))
-
-        conn.commit()
-        cursor.close()
-
-        print(f"[✓] Calificación guardada en la base de datos")
-        return True
 
-    except mysql.connector.Error as e:
-        print(f"[!] Error al guardar en BD: {e}")
-        conn.rollback()
-        return False
+        salidas.append(preparar_salida(pdf_info, calificaciones[i], transcripciones[i], bitacora))
+
+    return salidas
+
+
+def agrupar_en_lotes(pdfs_pendientes: List[Dict], modo_lote: bool = MODO_LOTE,
+                     tamano_lote: int = TAMANO_LOTE) -> List[List[Dict]]:
+    """
+    Divide la lista en unidades de trabajo. En modo lote, los PDFs pequeños de
+    una misma tarea se agrupan de tamano_lote en tamano_lote; el resto queda solo.
+    """
+    if not modo_lote or tamano_lote <= 1:
+        return [[pdf_info] for pdf_info in pdfs_pendientes]
+
+    unidades = []
+    abiertos: Dict[str, List[Dict]] = {}
+
+    for pdf_info in pdfs_pendientes:
+        if not es_pdf_pequeno(pdf_info['ruta']):
+            unidades.append([pdf_info])
+            continue
+
+        lote = abiertos.get(pdf_info['tarea'])
+        if lote is None:
+            lote = []
+            abiertos[pdf_info['tarea']] = lote
+            unidades.append(lote)
+
+        lote.append(pdf_info)
+        if len(lote) >= tamano_lote:
+            del abiertos[pdf_info['tarea']]
+
+    return unidades
+
+
+def guardar_lote_db(repositorio: RepositorioCalificaciones, lote: List[Tuple[Dict, Optional[Dict]]],
+                    bitacora: BitacoraCalificacion, stats: Dict,
+                    telemetria: Optional[TelemetriaCalificacion] = None) -> None:
+    """
+    Etapa de base de datos del pipeline: guarda un lote de resultados en una
+    sola transacción. Solo se llama desde el hilo escritor, así que la conexión
+    no se comparte.
+    """
+    for pdf_info, resultado in lote:
+        stats['procesados'] += 1
+        print(f"\n[{stats['procesados']}/{stats['total']}] {pdf_info['archivo']}")
+
+    listos = [(pdf_info, resultado) for pdf_info, resultado in lote if resultado]
+    stats['fallidos'] += len(lote) - len(listos)
+
+    inicio = time.perf_counter()
+    guardados = repositorio.guardar_lote([
+        {
+            'alumno_nombre': resultado['alumno_nombre'],
+            'tarea': pdf_info['tarea'],
+            'grupo': pdf_info['grupo'],
+            'calificacion': resultado['calificacion_data'].get('calificacion_total', 0),
+            'rutas': resultado['rutas']
+        }
+        for pdf_info, resultado in listos
+    ]) if listos else []
+    tiempo_bd = round(time.perf_counter() - inicio, 4)
+
+    exitosos = set()
+    for (pdf_info, _), guardado in zip(listos, guardados):
+        if guardado:
+            bitacora.registrar(pdf_info, 'persistido')
+            exitosos.add(id(pdf_info))
+            stats['exitosos'] += 1
+        else:
+            stats['fallidos'] += 1
+
+    if telemetria is not None:
+        for pdf_info, resultado in lote:
+            telemetria.registrar(pdf_info, {
+                **metricas_entrega(pdf_info),
+                **((resultado or {}).get('tiempos') or {}),
+                'tiempo_bd': tiempo_bd if resultado else None,
+                'estado': 'exitoso' if id(pdf_info) in exitosos else 'fallido'
+            })
+        telemetria.escribir_prometheus()
+
+
+def configurar_backend(credentials: Dict) -> BackendCalificacion:
+    """
+    Backend de credentials.json (Gemini o falso) con limitador e interruptor.
+    Con adelgazar_pdfs, los PDFs se adelgazan antes de esperar turno en el limitador;
+    el adelgazado y el envío comparten el mismo presupuesto de memoria.
+    """
+    presupuesto = presupuesto_envio(credentials)
+    backend = BackendLimitado(
+        crear_backend(credentials, presupuesto),
+        LimitadorAdaptativo(
+            credentials.get('limite_rpm', LIMITE_RPM),
+            credentials.get('limite_tpm', LIMITE_TPM)
+        ),
+        InterruptorCircuito()
+    )
+    if not credentials.get('adelgazar_pdfs', ADELGAZAR_PDFS):
+        return backend
+
+    adelgazador = AdelgazadorPDF(
+        CacheContenido(CACHE_PDFS_DIR, CACHE_PDFS_MAX_MB * 1024 * 1024, extension='.pdf'),
+        max_dpi=int(credentials.get('adelgazar_max_dpi', ADELGAZAR_MAX_DPI)),
+        calidad=int(credentials.get('adelgazar_calidad', ADELGAZAR_CALIDAD)),
+        min_bytes=ADELGAZAR_MIN_BYTES,
+        presupuesto=presupuesto
+    )
+    return BackendAdelgazado(backend, adelgazador)
+
+
+def revisar_similitud(pdfs_pendientes: List[Dict], credentials: Dict) -> int:
+    """
+    Indexa los PDFs pendientes en el índice de similitud y muestra los grupos
+    de entregas parecidas en los que participa alguno de ellos.
+    Retorna el número de PDFs pendientes señalados.
+    """
+    semestre = str(credentials.get('semestre') or semestre_actual())
+    umbral = float(credentials.get('umbral_similitud', UMBRAL_SIMILITUD))
+
+    indice = IndiceSimilitud(SIMILITUD_DIR)
+    indice.actualizar(pdfs_pendientes, semestre)
+
+    pendientes = {IndiceSimilitud.identificador(semestre, p) for p in pdfs_pendientes}
+    senalados = set()
+    for tarea in dict.fromkeys(p['tarea'] for p in pdfs_pendientes):
+        grupos = [g for g in indice.grupos(tarea, umbral) if pendientes.intersection(g['miembros'])]
+        if grupos:
+            imprimir_grupos(tarea, grupos)
+            for grupo in grupos:
+                senalados.update(pendientes.intersection(grupo['miembros']))
+
+    if senalados:
+        print(f"\n[!] {len(senalados)} PDFs pendientes se parecen a otras entregas "
+              f"(similitud ≥ {umbral:.0%}); revísalos antes de confiar en su calificación")
+    return len(senalados)
+
+
+def crear_telemetria(credentials: Dict) -> TelemetriaCalificacion:
+    """Telemetría de la ejecución con los directorios y precios de credentials.json"""
+    return TelemetriaCalificacion(
+        Path(credentials.get('directorio_telemetria', TELEMETRIA_DIR)),
+        archivo_prometheus=credentials.get('archivo_prometheus'),
+        precio_entrada_millon=float(credentials.get('precio_entrada_millon', PRECIO_ENTRADA_MILLON)),
+        precio_salida_millon=float(credentials.get('precio_salida_millon', PRECIO_SALIDA_MILLON))
+    )
 
 
-def main():
+def crear_pipeline(credentials: Dict, backend: BackendCalificacion, obtener_contexto,
+                   cache: Optional[CacheContenido], bitacora: BitacoraCalificacion,
+                   repositorio: RepositorioCalificaciones, stats: Dict,
+                   telemetria: Optional[TelemetriaCalificacion] = None,
+                   al_guardar=None, intervalo_reporte: float = 15.0,
+                   duplicados: Optional[RegistroDuplicados] = None) -> PipelineCalificacion:
+    """
+    Arma el pipeline API → render → BD con la configuración de credentials.json.
+    obtener_contexto(tarea) retorna el contexto de la tarea (RegistroRubricas.contexto);
+    al_guardar(lote), si se indica, se llama después de guardar cada lote, aunque
+    el guardado falle (vigilar_tareas.py libera ahí las entregas en curso);
+    duplicados registra las calificaciones repartidas a copias exactas.
+    """
+    def calificar(unidad):
+        contexto = obtener_contexto(unidad[0]['tarea'])
+        return calificar_unidad(backend, unidad, contexto, cache, bitacora, duplicados)
+
+    def guardar(lote):
+        try:
+            guardar_lote_db(repositorio, lote, bitacora, stats, telemetria)
+        finally:
+            if al_guardar is not None:
+                al_guardar(lote)
+
+    def al_renderizar(pdf_info, argumentos, resultado):
+        return registrar_render(bitacora, pdf_info, argumentos, resultado)
+
+    return PipelineCalificacion(
+        calificar=calificar,
+        renderizar=generar_pdf_calificado,
+        guardar_lote=guardar,
+        al_renderizar=al_renderizar,
+        hilos_api=max(1, int(credentials.get('max_concurrencia', MAX_CONCURRENCIA))),
+        procesos_render=max(1, int(credentials.get('procesos_render', PROCESOS_RENDER))),
+        tamano_lote_bd=max(1, int(credentials.get('tamano_lote_bd', TAMANO_LOTE_BD))),
+        max_reintentos=MAX_REINTENTOS,
+        inicializar_proceso=partial(limitar_memoria_proceso,
+                                    int(credentials.get('memoria_render_mb', MEMORIA_RENDER_MB))),
+        intervalo_reporte=intervalo_reporte
+    )
+
+
+def leer_argumentos(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Argumentos de línea de comandos (ver reparto_trabajo.py)"""
+    parser = argparse.ArgumentParser(description="Calificación automática con Gemini (Fase 3)")
+    agregar_argumentos(parser, CALIFICAR_ROOT, "PDFs")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
     """Función principal"""
+    args = leer_argumentos(argv)
+    root = args.raiz
+    sufijo = sufijo_fragmento(args.fragmento)
+
     print("="*60)
     print("CALIFICACIÓN AUTOMÁTICA CON GEMINI")
     print("Sistema de Calificación Automática - Fase 3")
     print("="*60)
 
+    bloqueo = BloqueoFragmento(root, 'calificar', args.fragmento)
     try:
         # Cargar configuración
         print("\n[+] Cargando configuración...")
         credentials = cargar_credenciales()
-        rubricas_config = cargar_rubricas()
 
-        # Configurar Gemini
+        # Configurar backend de calificación (Gemini o falso)
         print("[+] Configurando Gemini API...")
-        model = configurar_gemini(credentials['gemini_api_key'])
+        backend = configurar_backend(credentials)
+        print(f"    Backend: {backend.nombre_modelo}")
+
+        # rubricas.json se lee y valida una vez; cada rúbrica se compila al usarse
+        rubricas = crear_registro_rubricas(backend)
+
+        # Ninguna otra ejecución (en esta u otra máquina) toma los mismos PDFs
+        bloqueo.tomar()
 
         # Conectar a la base de datos
         print("[+] Conectando a la base de datos...")
         conn = conectar_db(credentials['db_config'])
 
-        # Buscar PDFs sin calificar
-        pdfs_pendientes = buscar_pdfs_sin_calificar(CALIFICAR_ROOT)
+        # Buscar PDFs sin calificar (incluye los que quedaron a medias según la bitácora)
+        bitacora = BitacoraCalificacion(root, sufijo)
+        pdfs_pendientes = buscar_pdfs_sin_calificar(root, bitacora)
+
+        # Agrupar por tarea (todas las entregas de una tarea comparten el prefijo del prompt)
+        pdfs_pendientes.sort(key=lambda p: (p['tarea'], p['grupo'], p['archivo']))
+
+        # Entregas idénticas (mismo archivo subido por varios integrantes) se califican una vez;
+        # se marcan antes de repartir para que cada copia caiga en el fragmento de su original
+        num_copias = marcar_duplicados(pdfs_pendientes)
+        seleccion = seleccionar_pendientes(pdfs_pendientes, args)
+        if len(seleccion) != len(pdfs_pendientes):
+            # Una copia cuyo original quedó fuera (--limite) se califica por sí misma
+            pdfs_pendientes = seleccion
+            num_copias = marcar_duplicados(pdfs_pendientes)
 
         if not pdfs_pendientes:
             print("\n[+] No hay PDFs pendientes de calificar")
@@ -626,6 +1594,10 @@ def main():
             conn.close()
             return 0
 
+        # Entregas parecidas (versiones editadas del mismo reporte, otros semestres)
+        if bool(credentials.get('revisar_similitud', REVISAR_SIMILITUD)):
+            revisar_similitud(pdfs_pendientes, credentials)
+
         # Mostrar lista
         print("\n📋 PDFs a calificar:")
         for i, pdf_info in enumerate(pdfs_pendientes[:10], 1):
@@ -637,88 +1609,54 @@ def main():
 
         # Confirmar
         print(f"\n[!] Se calificarán {len(pdfs_pendientes)} PDFs")
+        if num_copias:
+            print(f"    {num_copias} son copias exactas de otra entrega y reutilizarán su calificación")
         print("    Esto consumirá créditos de la API de Gemini")
 
-        confirmar = input("\n¿Continuar con la calificación? (s/n): ").strip().lower()
-        if confirmar not in ['s', 'si', 'sí', 'y', 'yes']:
+        if not confirmar(args, "¿Continuar con la calificación?"):
             print("\n[!] Proceso cancelado")
             conn.close()
             return 1
 
-        # Procesar cada PDF
+        # Procesar PDFs en el pipeline por etapas
+        max_concurrencia = max(1, int(credentials.get('max_concurrencia', MAX_CONCURRENCIA)))
+        modo_lote = bool(credentials.get('modo_lote', MODO_LOTE))
+        tamano_lote = int(credentials.get('tamano_lote', TAMANO_LOTE))
+        procesos_render = max(1, int(credentials.get('procesos_render', PROCESOS_RENDER)))
+        cache = CacheContenido(CACHE_DIR, CACHE_MAX_MB * 1024 * 1024)
+
         print("\n" + "="*60)
         print("INICIANDO CALIFICACIONES")
+        print(f"Solicitudes simultáneas a Gemini: {max_concurrencia}")
+        print(f"Procesos para generar PDFs: {procesos_render}")
         print("="*60)
 
-        stats = {'exitosos': 0, 'fallidos': 0}
-
-        for i, pdf_info in enumerate(pdfs_pendientes, 1):
-            print(f"\n{'='*60}")
-            print(f"[{i}/{len(pdfs_pendientes)}] {pdf_info['archivo']}")
-            print(f"{'='*60}")
-
-            # Cargar rúbrica
-            rubrica_texto, rubrica_info = cargar_rubrica(pdf_info['tarea'], rubricas_config)
-            if not rubrica_texto:
-                print(f"[!] Saltando por falta de rúbrica")
-                stats['fallidos'] += 1
-                continue
-
-            # Buscar transcripción
-            transcripcion = buscar_transcripcion(pdf_info['ruta'])
-            if transcripcion:
-                print(f"[+] Transcripción de audio encontrada")
-            else:
-                print(f"[+] Sin transcripción de audio")
+        total = len(pdfs_pendientes)
+        stats = {'exitosos': 0, 'fallidos': 0, 'procesados': 0, 'total': total}
 
-            # Construir prompt
-            prompt = construir_prompt(rubrica_texto, transcripcion)
+        # Rúbrica y prefijo del prompt se compilan una vez por tarea, antes de empezar
+        for tarea in dict.fromkeys(p['tarea'] for p in pdfs_pendientes):
+            rubricas.contexto(tarea)
 
-            # Calificar con Gemini
-            calificacion_data = calificar_con_gemini(model, pdf_info['ruta'], prompt)
+        # Ids de alumnos, grupos y tareas se resuelven una vez; las tareas nuevas se crean en bloque
+        repositorio = RepositorioCalificaciones(conn)
+        repositorio.precargar()
+        repositorio.asegurar_tareas({(p['grupo'], p['tarea']) for p in pdfs_pendientes})
 
-            if not calificacion_data:
-                print(f"[!] Fallo en la calificación")
-                stats['fallidos'] += 1
-                continue
+        originales = list(pdfs_pendientes)
+        copias = separar_copias(originales)
+        unidades = agrupar_en_lotes(originales, modo_lote, tamano_lote)
+        if len(unidades) < len(originales):
+            print(f"[+] Modo lote: {len(originales)} PDFs en {len(unidades)} solicitudes")
+        anexar_copias(unidades, copias)
 
-            # Extraer nombre del alumno
-            alumno_nombre = extraer_nombre_alumno(pdf_info['archivo'], pdf_info['tarea'])
+        telemetria = crear_telemetria(credentials)
+        pipeline = crear_pipeline(credentials, backend, rubricas.contexto, cache, bitacora,
+                                  repositorio, stats, telemetria,
+                                  duplicados=RegistroDuplicados(root, sufijo))
+        pipeline.ejecutar(unidades)
 
-            # Generar página de calificación
-            print(f"[+] Generando PDF de calificación...")
-            pagina_cal = generar_pagina_calificacion(
-                calificacion_data,
-                pdf_info['tarea'],
-                alumno_nombre
-            )
-
-            # Fusionar con PDF original
-            pdf_calificado = pdf_info['ruta'].parent / f"Cal_{pdf_info['archivo']}"
-            if not fusionar_pdfs(pagina_cal, pdf_info['ruta'], pdf_calificado):
-                stats['fallidos'] += 1
-                continue
-
-            # Guardar en base de datos
-            rutas = {
-                'pdf_calificado': str(pdf_calificado),
-                'audio': str(pdf_info['ruta'].parent / f"Cal_{pdf_info['ruta'].stem}.mp3")
-                        if (pdf_info['ruta'].parent / f"Cal_{pdf_info['ruta'].stem}.mp3").exists() else None,
-                'transcripcion': str(pdf_info['ruta'].parent / f"Cal_{pdf_info['ruta'].stem}_transcripcion.json")
-                                if transcripcion else None
-            }
-
-            if guardar_calificacion_db(
-                conn,
-                alumno_nombre,
-                pdf_info['tarea'],
-                pdf_info['grupo'],
-                calificacion_data.get('calificacion_total', 0),
-                rutas
-            ):
-                stats['exitosos'] += 1
-            else:
-                stats['fallidos'] += 1
+        backend.liberar_prefijos()
 
         # Resumen
         print("\n" + "="*60)
@@ -729,14 +1667,21 @@ def main():
         print(f"Fallidos: {stats['fallidos']}")
         print("="*60)
 
+        telemetria.imprimir_resumen()
+
         conn.close()
         print("\n✓ Proceso completado")
 
+    except ErrorBloqueo as e:
+        print(f"\n[!] {e}")
+        return 1
     except Exception as e:
         print(f"\n[!] Error: {e}")
         import traceback
         traceback.print_exc()
         return 1
+    finally:
+        bloqueo.liberar()
 
     return 0
 
@@ -0,0 +1,158 @@
+"""
+Detección de voz antes de transcribir
+
+Las grabaciones de retroalimentación (tareas.record_audio) tienen silencios
+largos mientras el profesor lee el PDF entre un comentario y otro, y Whisper
+gasta el mismo cómputo en decodificar ese silencio que en la voz. Antes de
+transcribir se buscan las regiones con voz y solo esas se envían al modelo:
+
+1. El audio (16 kHz, float32) se divide en tramas de DURACION_TRAMA. Una trama
+   tiene voz si su energía supera el ruido de fondo de la grabación (percentil
+   PERCENTIL_RUIDO) en MARGEN_DB, o si queda a menos de RANGO_VOZ_DB de la voz
+   más fuerte (para grabaciones casi sin pausas, donde el percentil ya es voz);
+   con webrtcvad instalado se usa su detector.
+2. Las pausas menores a SILENCIO_MIN se unen a la región, las regiones
+   menores a VOZ_MIN se descartan y cada región se amplía RELLENO por lado para
+   no cortar el inicio ni el final de las palabras.
+3. Las regiones se empaquetan en una sola pista de voz, separadas por
+   SEPARACION de silencio; el modelo la decodifica en sus ventanas de 30 s, así
+   que varios comentarios cortos comparten una ventana en lugar de pagar una
+   cada uno.
+4. Los tiempos de los segmentos de la pista se traducen a tiempos de la
+   grabación original con el mapa de regiones.
+
+Si el silencio que se quitaría es menor a AHORRO_MIN de la grabación, o si no
+se detecta voz en absoluto (grabación muy baja, detector demasiado estricto), se
+transcribe el audio completo: nunca se descarta una grabación sin pasarla por
+el modelo.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import webrtcvad
+    WEBRTCVAD_DISPONIBLE = True
+except ImportError:
+    WEBRTCVAD_DISPONIBLE = False
+
+
+FRECUENCIA = 16000  # Hz del audio decodificado (backends_transcripcion.FRECUENCIA_MUESTREO)
+DURACION_TRAMA = 0.03  # Segundos por trama (webrtcvad acepta 10, 20 o 30 ms)
+PERCENTIL_RUIDO = 10  # Percentil de energía que se toma como ruido de fondo
+MARGEN_DB = 12.0  # dB sobre el ruido de fondo para considerar voz
+PERCENTIL_PICO = 95  # Percentil de energía que se toma como voz fuerte
+RANGO_VOZ_DB = 25.0  # dB bajo la voz fuerte que todavía cuentan como voz
+PISO_DB = -55.0  # dBFS por debajo de los cuales nunca hay voz
+AGRESIVIDAD_WEBRTC = 2  # 0 (menos) a 3 (más estricto)
+SILENCIO_MIN = 0.8  # Pausas más cortas (segundos) quedan dentro de la región
+VOZ_MIN = 0.3  # Regiones más cortas se descartan (golpes, clics)
+RELLENO = 0.25  # Segundos que se agregan antes y después de cada región
+SEPARACION = 0.5  # Silencio entre regiones en la pista de voz
+AHORRO_MIN = 0.15  # Fracción mínima de silencio para recortar
+
+
+Region = Tuple[int, int]  # (inicio, fin) en muestras del audio original
+
+
+def _tramas_con_voz(audio: np.ndarray, frecuencia: int) -> np.ndarray:
+    """Arreglo booleano: qué tramas tienen voz"""
+    muestras = int(frecuencia * DURACION_TRAMA)
+    num_tramas = len(audio) // muestras
+    tramas = audio[:num_tramas * muestras].reshape(num_tramas, muestras)
+
+    if WEBRTCVAD_DISPONIBLE:
+        vad = webrtcvad.Vad(AGRESIVIDAD_WEBRTC)
+        pcm = (np.clip(tramas, -1.0, 1.0) * 32767).astype('<i2')
+        return np.array([vad.is_speech(t.tobytes(), frecuencia) for t in pcm], dtype=bool)
+
+    energia = 10 * np.log10(np.mean(tramas.astype(np.float64) ** 2, axis=1) + 1e-12)
+    umbral = min(np.percentile(energia, PERCENTIL_RUIDO) + MARGEN_DB,
+                 np.percentile(energia, PERCENTIL_PICO) - RANGO_VOZ_DB)
+    umbral = max(umbral, PISO_DB)
+    return energia > umbral
+
+
+def detectar_voz(audio: np.ndarray, frecuencia: int = FRECUENCIA) -> List[Region]:
+    """Regiones con voz del audio, ya unidas, filtradas y con relleno"""
+    muestras_trama = int(frecuencia * DURACION_TRAMA)
+    if len(audio) < muestras_trama:
+        return []
+
+    voz = _tramas_con_voz(audio, frecuencia)
+    # Inicios y finales de cada racha de tramas con voz
+    bordes = np.diff(np.concatenate(([0], voz.astype(np.int8), [0])))
+    inicios = np.flatnonzero(bordes == 1)
+    finales = np.flatnonzero(bordes == -1)
+
+    regiones: List[Region] = []
+    for inicio, fin in zip(inicios * muestras_trama, finales * muestras_trama):
+        if regiones and inicio - regiones[-1][1] < SILENCIO_MIN * frecuencia:
+            regiones[-1] = (regiones[-1][0], fin)
+        else:
+            regiones.append((inicio, fin))
+
+    relleno = int(RELLENO * frecuencia)
+    resultado: List[Region] = []
+    for inicio, fin in regiones:
+        if fin - inicio < VOZ_MIN * frecuencia:
+            continue
+        inicio, fin = max(0, inicio - relleno), min(len(audio), fin + relleno)
+        if resultado and inicio <= resultado[-1][1]:
+            resultado[-1] = (resultado[-1][0], fin)
+        else:
+            resultado.append((int(inicio), int(fin)))
+    return resultado
+
+
+def empaquetar_voz(audio: np.ndarray, regiones: List[Region],
+                   frecuencia: int = FRECUENCIA) -> Tuple[np.ndarray, List[Tuple[float, float, float]]]:
+    """
+    Pista con solo las regiones de voz, separadas por SEPARACION de silencio.
+    Retorna (pista, mapa) con una entrada (inicio en la pista, inicio original,
+    duración) en segundos por región.
+    """
+    silencio = np.zeros(int(SEPARACION * frecuencia), dtype=audio.dtype)
+    partes = []
+    mapa = []
+    posicion = 0
+    for inicio, fin in regiones:
+        if partes:
+            partes.append(silencio)
+            posicion += len(silencio)
+        partes.append(audio[inicio:fin])
+        mapa.append((posicion / frecuencia, inicio / frecuencia, (fin - inicio) / frecuencia))
+        posicion += fin - inicio
+    return np.concatenate(partes), mapa
+
+
+def tiempo_original(t: float, mapa: List[Tuple[float, float, float]]) -> float:
+    """Traduce un tiempo de la pista de voz al de la grabación original"""
+    for inicio_pista, inicio_original, duracion in reversed(mapa):
+        if t >= inicio_pista:
+            return round(inicio_original + min(t - inicio_pista, duracion), 2)
+    return round(mapa[0][1], 2) if mapa else t
+
+
+def recortar_silencios(audio: np.ndarray, frecuencia: int = FRECUENCIA) -> Optional[Dict]:
+    """
+    Pista de voz del audio, o None si no conviene recortar (poco silencio o
+    ninguna región con voz detectada).
+    Retorna {'pista': ..., 'mapa': [...], 'duracion_voz': segundos}.
+    """
+    regiones = detectar_voz(audio, frecuencia)
+    con_voz = sum(fin - inicio for inicio, fin in regiones)
+    if not regiones or 1 - con_voz / len(audio) < AHORRO_MIN:
+        return None
+
+    pista, mapa = empaquetar_voz(audio, regiones, frecuencia)
+    return {'pista': pista, 'mapa': mapa, 'duracion_voz': round(con_voz / frecuencia, 2)}
+
+
+def reubicar_segmentos(segmentos: List[Dict], mapa: List[Tuple[float, float, float]]) -> List[Dict]:
+    """Segmentos de la transcripción de la pista con tiempos de la grabación original"""
+    return [
+        {**s, 'start': tiempo_original(s['start'], mapa), 'end': tiempo_original(s['end'], mapa)}
+        for s in segmentos
+    ]
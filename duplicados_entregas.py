@@ -0,0 +1,126 @@
+"""
+Entregas duplicadas (mismo contenido, byte por byte)
+
+En las tareas en equipo varios integrantes suben el mismo PDF y en modo
+individual cada uno queda como una entrega distinta. Antes de calificar, las
+entregas pendientes de cada tarea se agrupan por el SHA-256 del archivo: solo
+la primera de cada grupo (el original) se envía a Gemini y su calificación se
+reparte a las demás (las copias), cada una con su propia portada, su Cal_*.pdf
+y su fila en calificaciones.
+
+Solo se calcula el hash de los archivos cuyo tamaño coincide con el de otra
+entrega de la misma tarea; el resto no puede tener duplicados.
+
+Cada reparto se anota en un registro JSONL en la raíz de la carpeta de
+calificación para poder auditarlo:
+    {"fecha": "...", "copia": "<grupo>/<tarea>/<archivo>",
+     "original": "<grupo>/<tarea>/<archivo>", "sha256": "...",
+     "calificacion_total": 8.5, "calificacion_maxima": 10.0}
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from bitacora_calificacion import clave_entrega
+from cache_contenido import hash_archivo
+
+
+REGISTRO_ARCHIVO = ".duplicados_calificacion.jsonl"
+
+
+def marcar_duplicados(pdfs_pendientes: List[Dict]) -> int:
+    """
+    Marca las copias exactas dentro de cada tarea: cada copia recibe
+    'copia_de' (clave_entrega del original) y 'sha256'. El original es la
+    primera entrega del grupo en el orden de la lista.
+    Retorna el número de copias marcadas.
+    """
+    por_tamano: Dict[tuple, List[Dict]] = {}
+    for pdf_info in pdfs_pendientes:
+        pdf_info.pop('copia_de', None)
+        pdf_info.pop('sha256', None)
+        try:
+            tamano = pdf_info['ruta'].stat().st_size
+        except OSError:
+            continue
+        por_tamano.setdefault((pdf_info['tarea'], tamano), []).append(pdf_info)
+
+    copias = 0
+    for candidatos in por_tamano.values():
+        if len(candidatos) < 2:
+            continue
+
+        originales: Dict[str, Dict] = {}
+        for pdf_info in candidatos:
+            try:
+                sha256 = hash_archivo(pdf_info['ruta'])
+            except OSError:
+                continue
+
+            original = originales.setdefault(sha256, pdf_info)
+            if original is not pdf_info:
+                pdf_info['copia_de'] = clave_entrega(original)
+                pdf_info['sha256'] = sha256
+                copias += 1
+
+    return copias
+
+
+def separar_copias(pdfs_pendientes: List[Dict]) -> Dict[str, List[Dict]]:
+    """
+    Quita de la lista las copias marcadas por marcar_duplicados y las retorna
+    agrupadas por la clave de su original.
+    """
+    copias: Dict[str, List[Dict]] = {}
+    originales = []
+    for pdf_info in pdfs_pendientes:
+        if pdf_info.get('copia_de'):
+            copias.setdefault(pdf_info['copia_de'], []).append(pdf_info)
+        else:
+            originales.append(pdf_info)
+
+    pdfs_pendientes[:] = originales
+    return copias
+
+
+def anexar_copias(unidades: List[List[Dict]], copias: Dict[str, List[Dict]]) -> None:
+    """
+    Agrega al final de cada unidad de trabajo las copias de sus entregas, para
+    que se resuelvan (o fallen) junto con su original.
+    """
+    for unidad in unidades:
+        for pdf_info in list(unidad):
+            unidad.extend(copias.get(clave_entrega(pdf_info), []))
+
+
+class RegistroDuplicados:
+    """Registro JSONL (solo se agregan líneas) de calificaciones repartidas a copias"""
+
+    def __init__(self, root_dir: Path, sufijo: Optional[str] = None):
+        # Con --fragmento, cada fragmento escribe su propio registro (ver reparto_trabajo.py)
+        nombre = REGISTRO_ARCHIVO if not sufijo else REGISTRO_ARCHIVO.replace('.jsonl', f'.{sufijo}.jsonl')
+        self.ruta = Path(root_dir) / nombre
+        self._lock = threading.Lock()
+
+    def registrar(self, copia: Dict, original: Dict, calificacion_data: Dict) -> None:
+        """Anota que la calificación de original se asignó a copia"""
+        registro = {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'copia': clave_entrega(copia),
+            'original': clave_entrega(original),
+            'sha256': copia.get('sha256'),
+            'calificacion_total': calificacion_data.get('calificacion_total'),
+            'calificacion_maxima': calificacion_data.get('calificacion_maxima')
+        }
+        linea = json.dumps(registro, ensure_ascii=False) + "\n"
+
+        with self._lock:
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.ruta, 'a', encoding='utf-8') as f:
+                f.write(linea)
+                f.flush()
+                os.fsync(f.fileno())
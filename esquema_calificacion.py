@@ -0,0 +1,308 @@
+"""
+Esquema de la calificación y reparación local de respuestas
+
+Gemini recibe el esquema de la calificación (el formato JSON de
+construir_prefijo_prompt) como response_schema, de modo que la respuesta ya
+llega como JSON con los campos y tipos esperados. Aun así una respuesta puede
+venir cortada (límite de tokens de salida) o con valores incoherentes, y antes
+cada JSON inválido era un fallo que obligaba a pagar otra solicitud.
+
+interpretar_json() recupera el JSON de una respuesta:
+- quita los marcadores ```json que algunos modelos agregan
+- si la respuesta está truncada, la corta en el último elemento completo y
+  cierra las cadenas, arreglos y objetos abiertos
+
+reparar_calificacion() corrige lo que se puede corregir sin volver a preguntar:
+- puntos como texto ("8,5", "8.5/10") se convierten a número
+- puntos máximos de cada criterio tomados de rubricas.json cuando el nombre coincide
+  (o uno contiene al otro)
+- puntos obtenidos fuera de [0, máximo] se recortan al rango
+- calificacion_total distinta de la suma de los criterios (en escala de 10) se
+  recalcula, si la respuesta trae todos los criterios de la rúbrica
+- fortalezas / areas_mejora como texto suelto o con elementos vacíos se normalizan
+Solo se descarta la respuesta (ErrorCalificacionInvalida) si no trae la
+calificación total ni todos los criterios para calcularla.
+"""
+
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+CALIFICACION_MAXIMA = 10.0  # Escala de calificacion_total (ver construir_prefijo_prompt)
+TOLERANCIA_TOTAL = 0.05  # Diferencia aceptada entre el total y la suma de los criterios
+
+ESQUEMA_CRITERIO = {
+    'type': 'OBJECT',
+    'properties': {
+        'nombre': {'type': 'STRING'},
+        'puntos_obtenidos': {'type': 'NUMBER'},
+        'puntos_maximos': {'type': 'NUMBER'},
+        'comentario': {'type': 'STRING'}
+    },
+    'required': ['nombre', 'puntos_obtenidos', 'puntos_maximos', 'comentario']
+}
+
+ESQUEMA_CALIFICACION = {
+    'type': 'OBJECT',
+    'properties': {
+        'calificacion_total': {'type': 'NUMBER'},
+        'calificacion_maxima': {'type': 'NUMBER'},
+        'criterios': {'type': 'ARRAY', 'items': ESQUEMA_CRITERIO},
+        'retroalimentacion_general': {'type': 'STRING'},
+        'fortalezas': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+        'areas_mejora': {'type': 'ARRAY', 'items': {'type': 'STRING'}}
+    },
+    'required': ['calificacion_total', 'calificacion_maxima', 'criterios',
+                 'retroalimentacion_general', 'fortalezas', 'areas_mejora']
+}
+
+# Modo lote: un objeto por archivo, con el nombre del archivo
+ESQUEMA_LOTE = {
+    'type': 'ARRAY',
+    'items': {
+        'type': 'OBJECT',
+        'properties': {'archivo': {'type': 'STRING'}, **ESQUEMA_CALIFICACION['properties']},
+        'required': ['archivo'] + ESQUEMA_CALIFICACION['required']
+    }
+}
+
+# Evidencia de una parte de un PDF extenso (ver construir_prefijo_evidencia)
+ESQUEMA_EVIDENCIA = {
+    'type': 'OBJECT',
+    'properties': {
+        'resumen': {'type': 'STRING'},
+        'evidencia': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'criterio': {'type': 'STRING'},
+                    'paginas': {'type': 'STRING'},
+                    'cumplimiento': {'type': 'STRING'},
+                    'observacion': {'type': 'STRING'}
+                },
+                'required': ['criterio', 'cumplimiento', 'observacion']
+            }
+        },
+        'problemas': {'type': 'ARRAY', 'items': {'type': 'STRING'}}
+    },
+    'required': ['resumen', 'evidencia']
+}
+
+
+class ErrorCalificacionInvalida(ValueError):
+    """La respuesta no contiene una calificación que se pueda reparar"""
+
+
+def _cerrar_json_truncado(texto: str) -> Optional[str]:
+    """
+    Corta un JSON truncado en el último elemento completo y cierra lo que
+    quedó abierto. Retorna None si no hay nada recuperable.
+    """
+    pila: List[str] = []
+    corte: Optional[Tuple[int, List[str]]] = None
+    en_cadena = False
+    escape = False
+
+    for i, c in enumerate(texto):
+        if en_cadena:
+            if escape:
+                escape = False
+            elif c == '\\':
+                escape = True
+            elif c == '"':
+                en_cadena = False
+            continue
+
+        if c == '"':
+            en_cadena = True
+        elif c in '{[':
+            pila.append('}' if c == '{' else ']')
+            corte = (i + 1, list(pila))
+        elif c in '}]':
+            if not pila:
+                break
+            pila.pop()
+            corte = (i + 1, list(pila))
+            if not pila:
+                return texto[:i + 1]  # El JSON estaba completo
+        elif c == ',' and pila:
+            # Lo anterior a la coma es un elemento completo
+            corte = (i, list(pila))
+
+    if corte is None:
+        return None
+
+    posicion, abiertos = corte
+    return texto[:posicion].rstrip().rstrip(',') + ''.join(reversed(abiertos))
+
+
+def interpretar_json(texto: str):
+    """
+    JSON de la respuesta de un modelo. Retorna (datos, reparado), donde reparado
+    indica que la respuesta estaba truncada y se cerró localmente.
+    Lanza json.JSONDecodeError si no se puede recuperar.
+    """
+    texto = texto.strip().replace('```json', '').replace('```', '').strip()
+    try:
+        return json.loads(texto), False
+    except json.JSONDecodeError as error:
+        inicio = min((i for i in (texto.find('{'), texto.find('[')) if i >= 0), default=-1)
+        if inicio < 0:
+            raise
+
+        cerrado = _cerrar_json_truncado(texto[inicio:])
+        if cerrado is None:
+            raise
+        try:
+            return json.loads(cerrado), cerrado != texto
+        except json.JSONDecodeError:
+            raise error
+
+
+def _numero(valor) -> Optional[float]:
+    """Convierte a número valores como 8, "8.5", "8,5" o "8.5/10"; None si no se puede"""
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if isinstance(valor, str):
+        encontrado = re.search(r'-?\d+(?:[.,]\d+)?', valor)
+        if encontrado:
+            return float(encontrado.group().replace(',', '.'))
+    return None
+
+
+def _lista_textos(valor) -> List[str]:
+    """Normaliza a lista de textos no vacíos"""
+    if isinstance(valor, str):
+        valor = [valor]
+    if not isinstance(valor, list):
+        return []
+    return [str(v).strip() for v in valor if isinstance(v, (str, int, float)) and str(v).strip()]
+
+
+def _puntos_en_rubrica(nombre: str, puntos_rubrica: Dict[str, float]) -> Optional[float]:
+    """
+    Puntos del criterio de la rúbrica con ese nombre. El modelo suele copiar el
+    nombre largo del archivo de rúbrica ("Configuración correcta del servidor
+    SSH"), así que también vale que un nombre contenga al otro. Entre varios
+    criterios así se elige el de mayor coincidencia (el nombre contenido más
+    largo); si hay empate con puntos distintos se retorna None, para no aplicar
+    el máximo de otro criterio ("SSH" frente a "Configuración SSH").
+    """
+    nombre = nombre.lower()
+    if nombre in puntos_rubrica:
+        return puntos_rubrica[nombre]
+
+    coincidencias = [
+        (min(len(clave), len(nombre)), puntos)
+        for clave, puntos in puntos_rubrica.items()
+        if clave and nombre and (clave in nombre or nombre in clave)
+    ]
+    if not coincidencias:
+        return None
+    mejor = max(longitud for longitud, _ in coincidencias)
+    puntos = {p for longitud, p in coincidencias if longitud == mejor}
+    return puntos.pop() if len(puntos) == 1 else None
+
+
+def reparar_calificacion(datos, rubrica_info: Optional[Dict] = None,
+                         completa: bool = True) -> Tuple[Dict, List[str]]:
+    """
+    Valida una calificación y corrige los problemas recuperables.
+    rubrica_info es la entrada de rubricas.json de la tarea (puntos por criterio);
+    completa=False indica que la respuesta venía truncada.
+    Retorna (calificacion, reparaciones) con una descripción por corrección.
+    """
+    reparaciones: List[str] = []
+
+    if isinstance(datos, list) and len(datos) == 1 and isinstance(datos[0], dict):
+        datos = datos[0]
+        reparaciones.append("objeto dentro de un arreglo")
+    if not isinstance(datos, dict):
+        raise ErrorCalificacionInvalida("la respuesta no es un objeto JSON")
+
+    puntos_rubrica = {
+        str(c.get('nombre', '')).strip().lower(): float(c['puntos'])
+        for c in (rubrica_info or {}).get('criterios', [])
+        if _numero(c.get('puntos')) is not None
+    }
+
+    criterios = []
+    originales = datos.get('criterios')
+    if originales is not None and not isinstance(originales, list):
+        originales = [originales] if isinstance(originales, dict) else []
+        reparaciones.append("criterios no es un arreglo")
+
+    for numero, criterio in enumerate(originales or [], 1):
+        if not isinstance(criterio, dict):
+            reparaciones.append(f"criterio {numero} descartado (no es un objeto)")
+            continue
+
+        nombre = str(criterio.get('nombre') or f"Criterio {numero}").strip()
+        maximo = _numero(criterio.get('puntos_maximos'))
+        obtenidos = _numero(criterio.get('puntos_obtenidos'))
+
+        esperado = _puntos_en_rubrica(nombre, puntos_rubrica)
+        if esperado is not None and maximo != esperado:
+            reparaciones.append(f"{nombre}: puntos máximos {maximo} → {esperado} (rúbrica)")
+            maximo = esperado
+        if maximo is None or maximo <= 0:
+            reparaciones.append(f"criterio '{nombre}' sin puntos máximos, descartado")
+            continue
+
+        if obtenidos is None:
+            reparaciones.append(f"criterio '{nombre}' sin puntos obtenidos, descartado")
+            continue
+        if not 0.0 <= obtenidos <= maximo:
+            recortado = min(max(obtenidos, 0.0), maximo)
+            reparaciones.append(f"{nombre}: {obtenidos} fuera de [0, {maximo}] → {recortado}")
+            obtenidos = recortado
+
+        criterios.append({
+            'nombre': nombre,
+            'puntos_obtenidos': round(obtenidos, 2),
+            'puntos_maximos': maximo,
+            'comentario': str(criterio.get('comentario') or '').strip()
+        })
+
+    # El total se recalcula solo si están todos los criterios: tantos como en la
+    # rúbrica o, sin rúbrica, los de una respuesta que no venía truncada
+    if puntos_rubrica:
+        completos = len(criterios) >= len(puntos_rubrica)
+    else:
+        completos = completa and bool(criterios)
+
+    total = _numero(datos.get('calificacion_total'))
+    if completos:
+        suma = sum(c['puntos_obtenidos'] for c in criterios)
+        suma_maxima = sum(c['puntos_maximos'] for c in criterios)
+        calculado = round(CALIFICACION_MAXIMA * suma / suma_maxima, 1)
+        if total is None or abs(total - calculado) > TOLERANCIA_TOTAL:
+            reparaciones.append(f"calificacion_total {total} → {calculado} (suma de criterios)")
+            total = calculado
+    elif total is None:
+        raise ErrorCalificacionInvalida("sin calificacion_total ni todos los criterios")
+    elif not 0.0 <= total <= CALIFICACION_MAXIMA:
+        recortado = min(max(total, 0.0), CALIFICACION_MAXIMA)
+        reparaciones.append(f"calificacion_total {total} fuera de rango → {recortado}")
+        total = recortado
+
+    if _numero(datos.get('calificacion_maxima')) != CALIFICACION_MAXIMA:
+        reparaciones.append(f"calificacion_maxima {datos.get('calificacion_maxima')} → {CALIFICACION_MAXIMA}")
+
+    calificacion = {
+        'calificacion_total': total,
+        'calificacion_maxima': CALIFICACION_MAXIMA,
+        'criterios': criterios,
+        'retroalimentacion_general': str(datos.get('retroalimentacion_general') or '').strip(),
+        'fortalezas': _lista_textos(datos.get('fortalezas')),
+        'areas_mejora': _lista_textos(datos.get('areas_mejora'))
+    }
+    for campo in ('fortalezas', 'areas_mejora'):
+        if calificacion[campo] != datos.get(campo):
+            reparaciones.append(f"{campo} normalizado")
+
+    return calificacion, reparaciones
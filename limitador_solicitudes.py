@@ -0,0 +1,233 @@
+"""
+Limitador adaptativo de solicitudes a Gemini
+
+- LimitadorAdaptativo: cubetas de fichas para solicitudes por minuto (RPM) y
+  tokens por minuto (TPM). Cada 429 reduce el RPM estimado (x0.7) y cada
+  respuesta correcta lo vuelve a subir poco a poco hasta el máximo configurado,
+  así el ritmo converge a la cuota real de la cuenta.
+- InterruptorCircuito: si se acumulan errores 5xx / de red seguidos, pausa a
+  todos los hilos durante un tiempo (que se duplica si la caída continúa).
+- BackendLimitado: envuelve cualquier backend de backends_calificacion y aplica
+  lo anterior; los errores temporales se convierten en ErrorReintentable para
+  que calificar_gemini.py reprograme el PDF con espera exponencial.
+"""
+
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from backends_calificacion import BackendCalificacion, RespuestaBackend
+
+
+class ErrorReintentable(Exception):
+    """Error temporal de la API (429, 5xx, red); la solicitud puede repetirse"""
+
+    def __init__(self, mensaje: str, es_limite: bool = False):
+        super().__init__(mensaje)
+        self.es_limite = es_limite
+
+
+def clasificar_error(e: Exception) -> Optional[str]:
+    """
+    Retorna 'limite' para errores 429, 'servidor' para 5xx / tiempo agotado /
+    conexión, o None si el error no es temporal.
+    """
+    codigo = getattr(e, 'code', None)
+    if callable(codigo):  # Errores gRPC exponen code() como método
+        try:
+            codigo = codigo()
+        except Exception:
+            codigo = None
+    codigo = getattr(codigo, 'value', codigo)
+    if isinstance(codigo, tuple):
+        codigo = codigo[0]
+
+    nombre = e.__class__.__name__
+
+    if codigo == 429 or nombre in ('ResourceExhausted', 'TooManyRequests') or '429' in str(e)[:50]:
+        return 'limite'
+
+    if (isinstance(codigo, int) and 500 <= codigo < 600) or nombre in (
+            'InternalServerError', 'ServiceUnavailable', 'DeadlineExceeded',
+            'GatewayTimeout', 'BadGateway', 'ServerError', 'RetryError'):
+        return 'servidor'
+
+    if isinstance(e, (ConnectionError, TimeoutError)):
+        return 'servidor'
+
+    return None
+
+
+def calcular_espera(intento: int, base: float = 2.0, maximo: float = 120.0) -> float:
+    """Espera exponencial con jitter completo: uniforme en [0, min(maximo, base * 2^intento)]"""
+    return random.uniform(0, min(maximo, base * (2 ** intento)))
+
+
+class LimitadorAdaptativo:
+    """Cubetas de fichas para RPM y TPM con ajuste según los 429 observados"""
+
+    def __init__(self, rpm: float, tpm: float, rpm_minimo: float = 1.0):
+        self.rpm_maximo = float(rpm)
+        self.rpm_minimo = rpm_minimo
+        self.rpm = float(rpm)
+        self.tpm = float(tpm)
+
+        self._lock = threading.Lock()
+        self._fichas_solicitudes = 1.0  # Arranque suave: una solicitud inmediata
+        self._fichas_tokens = float(tpm)
+        self._ultima_recarga = time.monotonic()
+
+    def _recargar(self) -> None:
+        ahora = time.monotonic()
+        transcurrido = ahora - self._ultima_recarga
+        self._ultima_recarga = ahora
+
+        self._fichas_solicitudes = min(
+            max(1.0, self.rpm / 60.0 * 5),  # Ráfaga máxima: 5 segundos de cuota
+            self._fichas_solicitudes + transcurrido * self.rpm / 60.0
+        )
+        self._fichas_tokens = min(
+            self.tpm,
+            self._fichas_tokens + transcurrido * self.tpm / 60.0
+        )
+
+    def adquirir(self, tokens_estimados: int = 0) -> None:
+        """Bloquea hasta que haya cuota para una solicitud de tokens_estimados tokens"""
+        tokens = min(float(tokens_estimados), self.tpm)
+
+        while True:
+            with self._lock:
+                self._recargar()
+                if self._fichas_solicitudes >= 1.0 and self._fichas_tokens >= tokens:
+                    self._fichas_solicitudes -= 1.0
+                    self._fichas_tokens -= tokens
+                    return
+
+                falta_solicitudes = max(0.0, 1.0 - self._fichas_solicitudes) * 60.0 / self.rpm
+                falta_tokens = max(0.0, tokens - self._fichas_tokens) * 60.0 / self.tpm
+                espera = max(falta_solicitudes, falta_tokens, 0.05)
+
+            time.sleep(espera)
+
+    def registrar_uso(self, tokens_estimados: int, tokens_reales: int) -> None:
+        """Corrige la cubeta de tokens con el consumo real informado por la API"""
+        with self._lock:
+            self._fichas_tokens -= (tokens_reales - tokens_estimados)
+
+    def registrar_exito(self) -> None:
+        """Aumento aditivo del RPM estimado"""
+        with self._lock:
+            self.rpm = min(self.rpm_maximo, self.rpm + 0.1)
+
+    def registrar_limite(self) -> None:
+        """Disminución multiplicativa del RPM estimado tras un 429"""
+        with self._lock:
+            self.rpm = max(self.rpm_minimo, self.rpm * 0.7)
+            self._fichas_solicitudes = 0.0
+        print(f"[!] Límite de la API alcanzado (429); nuevo ritmo: {self.rpm:.1f} solicitudes/min")
+
+
+class InterruptorCircuito:
+    """Pausa todas las solicitudes tras varios errores de servidor seguidos"""
+
+    def __init__(self, umbral: int = 5, pausa: float = 30.0, pausa_maxima: float = 600.0):
+        self.umbral = umbral
+        self.pausa_inicial = pausa
+        self.pausa = pausa
+        self.pausa_maxima = pausa_maxima
+
+        self._lock = threading.Lock()
+        self._fallos_seguidos = 0
+        self._abierto_hasta = 0.0
+
+    def esperar_si_abierto(self) -> None:
+        """Bloquea mientras el circuito esté abierto"""
+        while True:
+            with self._lock:
+                restante = self._abierto_hasta - time.monotonic()
+            if restante <= 0:
+                return
+            time.sleep(min(restante, 5.0))
+
+    def registrar_exito(self) -> None:
+        with self._lock:
+            self._fallos_seguidos = 0
+            self.pausa = self.pausa_inicial
+
+    def registrar_fallo(self) -> None:
+        with self._lock:
+            self._fallos_seguidos += 1
+            if self._fallos_seguidos < self.umbral:
+                return
+
+            self._abierto_hasta = time.monotonic() + self.pausa
+            print(f"[!] {self._fallos_seguidos} errores seguidos de la API; "
+                  f"pausando todas las solicitudes {self.pausa:.0f}s")
+            self._fallos_seguidos = 0
+            self.pausa = min(self.pausa_maxima, self.pausa * 2)
+
+
+def estimar_tokens(prompt: str, pdfs_bytes: int) -> int:
+    """Estimación previa de tokens de entrada (~4 caracteres por token, ~1 token por KB de PDF)"""
+    return len(prompt) // 4 + pdfs_bytes // 1024
+
+
+class BackendLimitado:
+    """Backend que aplica limitador e interruptor antes de delegar en otro backend"""
+
+    def __init__(self, backend: BackendCalificacion, limitador: LimitadorAdaptativo,
+                 interruptor: InterruptorCircuito):
+        self.backend = backend
+        self.limitador = limitador
+        self.interruptor = interruptor
+        self.nombre_modelo = backend.nombre_modelo
+
+    def registrar_prefijo(self, prefijo: str) -> str:
+        return self.backend.registrar_prefijo(prefijo)
+
+    def liberar_prefijos(self) -> None:
+        self.backend.liberar_prefijos()
+
+    def generar(self, prompt: str, pdf_data: bytes,
+                prefijo_id: Optional[str] = None,
+                esquema: Optional[Dict] = None) -> RespuestaBackend:
+        return self._llamar(
+            lambda: self.backend.generar(prompt, pdf_data, prefijo_id=prefijo_id, esquema=esquema),
+            estimar_tokens(prompt, len(pdf_data))
+        )
+
+    def generar_lote(self, prompt: str, pdfs: List[Tuple[str, bytes]],
+                     prefijo_id: Optional[str] = None,
+                     esquema: Optional[Dict] = None) -> RespuestaBackend:
+        return self._llamar(
+            lambda: self.backend.generar_lote(prompt, pdfs, prefijo_id=prefijo_id, esquema=esquema),
+            estimar_tokens(prompt, sum(len(d) for _, d in pdfs))
+        )
+
+    def _llamar(self, llamada, tokens_estimados: int) -> RespuestaBackend:
+        self.interruptor.esperar_si_abierto()
+        self.limitador.adquirir(tokens_estimados)
+
+        inicio = time.perf_counter()
+        try:
+            respuesta = llamada()
+        except Exception as e:
+            tipo = clasificar_error(e)
+            if tipo == 'limite':
+                self.limitador.registrar_limite()
+                raise ErrorReintentable(str(e), es_limite=True) from e
+            if tipo == 'servidor':
+                self.interruptor.registrar_fallo()
+                raise ErrorReintentable(str(e)) from e
+            raise
+
+        respuesta.latencia = time.perf_counter() - inicio
+        self.limitador.registrar_exito()
+        self.interruptor.registrar_exito()
+        if respuesta.tokens_prompt or respuesta.tokens_respuesta:
+            self.limitador.registrar_uso(
+                tokens_estimados, respuesta.tokens_prompt + respuesta.tokens_respuesta
+            )
+
+        return respuesta
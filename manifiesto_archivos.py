@@ -0,0 +1,223 @@
+"""
+Manifiesto incremental de la carpeta de calificación
+
+buscar_pdfs_sin_calificar y buscar_audios_sin_transcribir recorrían todas las
+carpetas de grupos y tareas, hacían un glob por extensión y un exists() por
+candidato en cada ejecución. En la carpeta sincronizada con OneDrive eso es lento
+y crece con todo el historial del curso.
+
+El manifiesto guarda, por carpeta de tarea, cada archivo con (tamaño, mtime,
+estado) y el mtime de la carpeta. Al actualizarlo solo se vuelve a listar una
+carpeta si su mtime cambió (crear, borrar o renombrar un archivo cambia el mtime
+de la carpeta que lo contiene); el resto se toma del manifiesto. Consultar el
+trabajo pendiente es entonces un recorrido en memoria.
+
+Sobrescribir un archivo existente (un PDF que se vuelve a subir, una
+transcripción reescrita) no cambia el mtime de la carpeta. Para los estados
+basta, porque dependen solo de los nombres; quien necesita ver esos cambios
+(el sondeo de vigilar_tareas.py) usa actualizar(revisar_archivos=True), que
+además consulta tamaño y mtime de cada archivo ya registrado y vuelve a listar
+la carpeta si alguno cambió.
+
+Estados de archivo:
+    entrega_pendiente   PDF del alumno sin Cal_<nombre>.pdf
+    entrega_calificada  PDF del alumno con su Cal_<nombre>.pdf
+    audio_pendiente     Cal_<nombre>.<audio> sin transcripción JSON
+    audio_transcrito    Cal_<nombre>.<audio> con <nombre>.json o <nombre>_transcripcion.json
+    otro                cualquier otro archivo
+
+El manifiesto vive en la raíz de la carpeta de calificación y lo comparten
+calificar_gemini.py y transcribir_audios.py.
+
+Formato:
+    {"version": 1,
+     "grupos": {"<grupo>": mtime_ns},
+     "tareas": {"<grupo>/<tarea>": {"mtime": mtime_ns,
+                                    "archivos": {"<nombre>": [tamaño, mtime_ns, estado]}}}}
+"""
+
+import json
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+MANIFIESTO_ARCHIVO = ".manifiesto_archivos.json"
+VERSION_MANIFIESTO = 1
+
+# Una carpeta modificada hace menos de esto puede volver a cambiar sin que su
+# mtime avance (resolución del sistema de archivos); no se confía en su mtime.
+MARGEN_MTIME_SEGUNDOS = 2.0
+
+
+def clasificar_archivo(nombre: str, nombres: set) -> str:
+    """Estado de un archivo según los demás archivos de su carpeta"""
+    ruta = Path(nombre)
+    sufijo = ruta.suffix.lower()
+
+    if sufijo == '.pdf':
+        if nombre.startswith("Cal_"):
+            return 'otro'
+        return 'entrega_calificada' if f"Cal_{nombre}" in nombres else 'entrega_pendiente'
+
+    if nombre.startswith("Cal_") and sufijo not in ('.json', '.tmp', ''):
+        transcrito = (f"{ruta.stem}.json" in nombres
+                      or f"{ruta.stem}_transcripcion.json" in nombres)
+        return 'audio_transcrito' if transcrito else 'audio_pendiente'
+
+    return 'otro'
+
+
+def _listar(directorio: Path) -> List[os.DirEntry]:
+    try:
+        with os.scandir(directorio) as entradas:
+            return list(entradas)
+    except OSError:
+        return []
+
+
+class ManifiestoArchivos:
+    """Listado persistente de grupos/tareas/archivos con actualización incremental"""
+
+    def __init__(self, root_dir: Path, ruta: Optional[Path] = None):
+        self.root_dir = Path(root_dir)
+        self.ruta = ruta or self.root_dir / MANIFIESTO_ARCHIVO
+        self.grupos: Dict[str, Optional[int]] = {}
+        self.tareas: Dict[str, Dict] = {}
+        self._cargar()
+
+    def _cargar(self) -> None:
+        if not self.ruta.exists():
+            return
+
+        try:
+            with open(self.ruta, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            print("[!] Manifiesto de archivos ilegible, se reconstruirá")
+            return
+
+        if datos.get('version') != VERSION_MANIFIESTO:
+            return
+
+        self.grupos = datos.get('grupos', {})
+        self.tareas = datos.get('tareas', {})
+
+    def guardar(self) -> None:
+        """Escribe el manifiesto de forma atómica"""
+        datos = {'version': VERSION_MANIFIESTO, 'grupos': self.grupos, 'tareas': self.tareas}
+        # Nombre temporal único también entre máquinas que comparten la carpeta
+        temporal = self.ruta.with_name(f"{self.ruta.name}.{socket.gethostname()}.{os.getpid()}.tmp")
+        try:
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(datos, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(temporal, self.ruta)
+        except OSError as e:
+            print(f"[!] No se pudo guardar el manifiesto de archivos: {e}")
+            temporal.unlink(missing_ok=True)
+
+    @staticmethod
+    def _mtime_confiable(mtime_ns: int) -> Optional[int]:
+        """mtime a guardar, o None si la carpeta cambió hace muy poco"""
+        if time.time() - mtime_ns / 1e9 < MARGEN_MTIME_SEGUNDOS:
+            return None
+        return mtime_ns
+
+    def _escanear_tarea(self, clave: str, directorio: Path, mtime_ns: int) -> None:
+        entradas = [e for e in _listar(directorio) if e.is_file()]
+        nombres = {e.name for e in entradas}
+
+        archivos = {}
+        for entrada in entradas:
+            try:
+                info = entrada.stat()
+            except OSError:
+                continue
+            archivos[entrada.name] = [
+                info.st_size, info.st_mtime_ns, clasificar_archivo(entrada.name, nombres)
+            ]
+
+        self.tareas[clave] = {'mtime': self._mtime_confiable(mtime_ns), 'archivos': archivos}
+
+    @staticmethod
+    def _archivos_cambiaron(directorio: Path, archivos: Dict[str, List]) -> bool:
+        """True si algún archivo registrado cambió de tamaño o mtime, o ya no existe"""
+        for nombre, (tamano, mtime_ns, _) in archivos.items():
+            try:
+                info = (directorio / nombre).stat()
+            except OSError:
+                return True
+            if info.st_size != tamano or info.st_mtime_ns != mtime_ns:
+                return True
+        return False
+
+    def actualizar(self, completo: bool = False, revisar_archivos: bool = False) -> Dict[str, int]:
+        """
+        Sincroniza el manifiesto con el disco y lo guarda si hubo cambios.
+
+        Solo se listan las carpetas de tarea cuyo mtime cambió (o todas, con
+        completo=True). Con revisar_archivos también las que tienen un archivo
+        sobrescrito (un stat por archivo registrado). Retorna cuántas carpetas
+        se revisaron y cuántas se listaron.
+        """
+        stats = {'carpetas': 0, 'escaneadas': 0}
+        if not self.root_dir.exists():
+            return stats
+
+        grupos_vistos = set()
+        tareas_vistas = set()
+        cambios = False
+
+        for grupo in _listar(self.root_dir):
+            if grupo.name.startswith('.') or not grupo.is_dir():
+                continue
+            grupos_vistos.add(grupo.name)
+
+            # Carpetas de tarea del grupo: del manifiesto si el grupo no cambió
+            mtime_grupo = grupo.stat().st_mtime_ns
+            prefijo = f"{grupo.name}/"
+            if not completo and self.grupos.get(grupo.name) == mtime_grupo:
+                nombres_tareas = [c[len(prefijo):] for c in self.tareas if c.startswith(prefijo)]
+            else:
+                nombres_tareas = [t.name for t in _listar(Path(grupo.path)) if t.is_dir()]
+                self.grupos[grupo.name] = self._mtime_confiable(mtime_grupo)
+                cambios = True
+
+            for nombre_tarea in nombres_tareas:
+                clave = prefijo + nombre_tarea
+                directorio = Path(grupo.path) / nombre_tarea
+                try:
+                    mtime_tarea = directorio.stat().st_mtime_ns
+                except OSError:
+                    continue  # La carpeta desapareció
+                tareas_vistas.add(clave)
+                stats['carpetas'] += 1
+
+                anterior = self.tareas.get(clave)
+                if completo or anterior is None or anterior['mtime'] != mtime_tarea or \
+                        (revisar_archivos and self._archivos_cambiaron(directorio, anterior['archivos'])):
+                    self._escanear_tarea(clave, directorio, mtime_tarea)
+                    stats['escaneadas'] += 1
+                    cambios = True
+
+        # Olvidar carpetas que ya no existen
+        if len(grupos_vistos) != len(self.grupos) or len(tareas_vistas) != len(self.tareas):
+            self.grupos = {g: m for g, m in self.grupos.items() if g in grupos_vistos}
+            self.tareas = {c: t for c, t in self.tareas.items() if c in tareas_vistas}
+            cambios = True
+
+        if cambios:
+            self.guardar()
+        return stats
+
+    def archivos(self, estados: Iterable[str]) -> Iterator[Tuple[str, str, str, Path, List]]:
+        """Archivos con alguno de los estados: (grupo, tarea, nombre, ruta, [tamaño, mtime, estado])"""
+        estados = set(estados)
+        for clave, tarea in self.tareas.items():
+            grupo, nombre_tarea = clave.split('/', 1)
+            for nombre, registro in tarea['archivos'].items():
+                if registro[2] in estados:
+                    yield grupo, nombre_tarea, nombre, self.root_dir / grupo / nombre_tarea / nombre, registro
+
@@ -0,0 +1,372 @@
+"""
+Manejo de PDFs con memoria acotada
+
+Con varios hilos de API y procesos de render trabajando a la vez, cada PDF
+grande llegaba a estar varias veces completo en memoria: f.read() para
+enviarlo, las copias del SDK al codificarlo, y en la fusión un PdfReader con
+el archivo entero más un PdfWriter con todas las páginas clonadas.
+
+- abrir_pdf: mapea el PDF en memoria (mmap) en lugar de copiarlo al heap; las
+  páginas del archivo las comparte el sistema operativo y puede liberarlas
+- contar_paginas: cuenta páginas leyendo del archivo bajo demanda
+- PresupuestoMemoria: limita los bytes de PDF "en vuelo" entre todos los hilos
+  de la API; un hilo espera si su PDF no cabe en lo que queda del presupuesto
+- limitar_memoria_proceso: tope de memoria para los procesos de render (Linux);
+  un PDF anómalo provoca MemoryError en ese proceso en lugar de agotar la RAM
+- fusionar_incremental: antepone la página de calificación sin reescribir el
+  original, con una actualización incremental del PDF (ver abajo)
+- pico_memoria_mb: pico de memoria residente del proceso (para benchmark_memoria.py)
+
+Actualización incremental:
+El PDF original se copia tal cual, por bloques, y al final se agregan solo
+los objetos nuevos (la página de calificación y sus recursos), una nueva
+versión del árbol de páginas con la portada al inicio y una nueva tabla de
+referencias que apunta a la anterior (/Prev). La memoria usada no depende
+del tamaño del original, y marcadores, anotaciones y firmas se conservan.
+Si el original está cifrado o su estructura no se puede interpretar, se
+retorna False para que el llamador use la fusión completa con PyPDF2.
+"""
+
+import mmap
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import (
+    ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+)
+
+try:
+    import resource
+    RESOURCE_DISPONIBLE = True
+except ImportError:  # Windows
+    RESOURCE_DISPONIBLE = False
+
+try:
+    import psutil
+    PSUTIL_DISPONIBLE = True
+except ImportError:
+    PSUTIL_DISPONIBLE = False
+
+
+TAMANO_BLOQUE_COPIA = 1024 * 1024
+BYTES_COLA_PDF = 2048  # Final del archivo donde se busca startxref
+
+
+@contextmanager
+def abrir_pdf(pdf_path: Path) -> Iterator[Union[mmap.mmap, bytes]]:
+    """Contenido del PDF mapeado en memoria (solo lectura) mientras dura el with"""
+    with open(pdf_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''  # mmap no admite archivos vacíos
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+            yield datos
+
+
+def contar_paginas(pdf_path: Path) -> int:
+    """Número de páginas, sin cargar el archivo completo en memoria"""
+    with open(pdf_path, 'rb') as f:
+        return len(PdfReader(f, strict=False).pages)
+
+
+class PresupuestoMemoria:
+    """Semáforo por bytes: limita la memoria reservada entre varios hilos"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._disponible = max_bytes
+        self._condicion = threading.Condition()
+
+    @contextmanager
+    def reservar(self, n_bytes: int):
+        """
+        Espera hasta que haya n_bytes disponibles y los reserva durante el with.
+        Una reserva mayor que el presupuesto total espera a tenerlo completo.
+        """
+        n_bytes = min(max(0, int(n_bytes)), self.max_bytes)
+        with self._condicion:
+            while self._disponible < n_bytes:
+                self._condicion.wait()
+            self._disponible -= n_bytes
+        try:
+            yield
+        finally:
+            with self._condicion:
+                self._disponible += n_bytes
+                self._condicion.notify_all()
+
+
+def _memoria_virtual_actual() -> Optional[int]:
+    """Tamaño virtual del proceso en bytes (Linux), o None si no se puede leer"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def limitar_memoria_proceso(max_mb: int) -> None:
+    """
+    Limita la memoria que el proceso puede reservar a partir de ahora a max_mb
+    adicionales (RLIMIT_AS). Se usa como inicializador de los procesos de render.
+    Solo aplica en Linux; con max_mb=0 no hace nada.
+    """
+    if not max_mb or not RESOURCE_DISPONIBLE:
+        return
+    actual = _memoria_virtual_actual()
+    if actual is None:
+        return
+    limite = actual + max_mb * 1024 * 1024
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limite, limite))
+    except (ValueError, OSError) as e:
+        print(f"[!] No se pudo limitar la memoria del proceso: {e}")
+
+
+def pico_memoria_mb() -> Optional[float]:
+    """Pico de memoria residente del proceso en MB, o None si no se puede medir"""
+    try:
+        with open('/proc/self/status') as f:
+            for linea in f:
+                if linea.startswith('VmHWM:'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    if PSUTIL_DISPONIBLE:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 1024 / 1024
+    if RESOURCE_DISPONIBLE:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB en Linux
+    return None
+
+
+def _ultima_tabla_referencias(f) -> Optional[Tuple[int, bool]]:
+    """(posición de la última tabla de referencias, es_flujo) según startxref"""
+    tamano = os.fstat(f.fileno()).st_size
+    f.seek(max(0, tamano - BYTES_COLA_PDF))
+    coincidencias = re.findall(rb'startxref\s+(\d+)', f.read())
+    if not coincidencias:
+        return None
+    posicion = int(coincidencias[-1])
+
+    f.seek(posicion)
+    inicio = f.read(32)
+    if inicio.startswith(b'xref'):
+        return posicion, False
+    if re.match(rb'\d+\s+\d+\s+obj', inicio):
+        return posicion, True
+    return None
+
+
+def _primera_pagina(reader: PdfReader) -> Optional[IndirectObject]:
+    """Referencia a la primera página (hoja) de un PDF"""
+    nodo = reader.trailer['/Root'].get_object().raw_get('/Pages')
+    while isinstance(nodo, IndirectObject):
+        objeto = nodo.get_object()
+        if objeto.get('/Type') == '/Page':
+            return nodo
+        hijos = objeto.get('/Kids')
+        if not hijos:
+            return None
+        nodo = hijos[0]
+    return None
+
+
+def _objetos_alcanzables(raiz: IndirectObject) -> List[IndirectObject]:
+    """Objetos indirectos alcanzables desde raiz, sin seguir /Parent"""
+    vistos: Dict[Tuple[int, int], IndirectObject] = {}
+    pendientes = [raiz]
+    while pendientes:
+        referencia = pendientes.pop()
+        clave = (referencia.idnum, referencia.generation)
+        if clave in vistos:
+            continue
+        vistos[clave] = referencia
+
+        pila = [referencia.get_object()]
+        while pila:
+            objeto = pila.pop()
+            if isinstance(objeto, IndirectObject):
+                pendientes.append(objeto)
+            elif isinstance(objeto, DictionaryObject):
+                pila.extend(v for k, v in objeto.items() if k != '/Parent')
+            elif isinstance(objeto, ArrayObject):
+                pila.extend(objeto)
+    return list(vistos.values())
+
+
+def _renumerar(objeto, numeros: Dict[Tuple[int, int], int]):
+    """Reemplaza (en su lugar) las referencias a objetos de la portada por su nuevo número"""
+    if isinstance(objeto, IndirectObject):
+        return IndirectObject(numeros[(objeto.idnum, objeto.generation)], 0, None)
+    if isinstance(objeto, DictionaryObject):
+        for clave in list(objeto.keys()):
+            if clave != '/Parent':
+                dict.__setitem__(objeto, clave, _renumerar(dict.__getitem__(objeto, clave), numeros))
+    elif isinstance(objeto, ArrayObject):
+        for i, valor in enumerate(objeto):
+            objeto[i] = _renumerar(valor, numeros)
+    return objeto
+
+
+def _escribir_objeto(destino, numero: int, generacion: int, objeto) -> None:
+    destino.write(f"{numero} {generacion} obj\n".encode('ascii'))
+    objeto.write_to_stream(destino, None)
+    destino.write(b"\nendobj\n")
+
+
+def _escribir_tabla(destino, entradas: List[Tuple[int, int, int]], trailer: DictionaryObject,
+                    como_flujo: bool, siguiente_numero: int) -> None:
+    """
+    Escribe la sección de referencias de la actualización: entradas es una lista
+    ordenada de (número, generación, posición). Usa el mismo formato (tabla o
+    flujo de referencias) que la última sección del original.
+    """
+    if not como_flujo:
+        posicion_tabla = destino.tell()
+        destino.write(b"xref\n")
+        i = 0
+        while i < len(entradas):
+            j = i
+            while j + 1 < len(entradas) and entradas[j + 1][0] == entradas[j][0] + 1:
+                j += 1
+            destino.write(f"{entradas[i][0]} {j - i + 1}\n".encode('ascii'))
+            for _, generacion, posicion in entradas[i:j + 1]:
+                destino.write(f"{posicion:010d} {generacion:05d} n \n".encode('ascii'))
+            i = j + 1
+        destino.write(b"trailer\n")
+        trailer.write_to_stream(destino, None)
+        destino.write(b"\n")
+    else:
+        # El propio flujo de referencias es un objeto nuevo y va en su tabla
+        posicion_tabla = destino.tell()
+        entradas = entradas + [(siguiente_numero, 0, posicion_tabla)]
+        trailer[NameObject('/Size')] = NumberObject(siguiente_numero + 1)
+        indice = []
+        for numero, _, _ in entradas:
+            if indice and indice[-2] + indice[-1] == numero:
+                indice[-1] += 1
+            else:
+                indice += [numero, 1]
+        datos = b''.join(
+            b'\x01' + posicion.to_bytes(4, 'big') + generacion.to_bytes(2, 'big')
+            for _, generacion, posicion in entradas
+        )
+        trailer.update({
+            NameObject('/Type'): NameObject('/XRef'),
+            NameObject('/W'): ArrayObject([NumberObject(1), NumberObject(4), NumberObject(2)]),
+            NameObject('/Index'): ArrayObject([NumberObject(n) for n in indice]),
+            NameObject('/Length'): NumberObject(len(datos)),
+        })
+        destino.write(f"{siguiente_numero} 0 obj\n".encode('ascii'))
+        trailer.write_to_stream(destino, None)
+        destino.write(b"\nstream\n" + datos + b"\nendstream\nendobj\n")
+
+    destino.write(f"startxref\n{posicion_tabla}\n%%EOF\n".encode('ascii'))
+
+
+def fusionar_incremental(portada: bytes, pdf_original: Path, salida: Path) -> bool:
+    """
+    Escribe en salida el PDF original con la página de portada al inicio,
+    mediante una actualización incremental. Retorna False (sin crear salida)
+    si el original no admite este método.
+    """
+    temporal = salida.with_name(f"{salida.name}.{os.getpid()}.tmp")
+    try:
+        with open(pdf_original, 'rb') as origen:
+            ultima = _ultima_tabla_referencias(origen)
+            if ultima is None:
+                return False
+            posicion_previa, como_flujo = ultima
+
+            origen.seek(0)
+            reader = PdfReader(origen, strict=False)
+            if reader.is_encrypted:
+                return False
+
+            raiz = reader.trailer['/Root'].get_object()
+            referencia_paginas = raiz.raw_get('/Pages')
+            if not isinstance(referencia_paginas, IndirectObject):
+                return False
+            paginas = referencia_paginas.get_object()
+            total_paginas = int(paginas.get('/Count', 0))
+            # Primer número de objeto libre (con flujos de referencias, PyPDF2 no expone /Size)
+            usados = [n for tabla in reader.xref.values() for n in tabla] + list(reader.xref_objStm)
+            siguiente_numero = max([int(reader.trailer.get('/Size', 0))] + [n + 1 for n in usados])
+
+            # Objetos de la portada, renumerados a continuación de los del original
+            lector_portada = PdfReader(BytesIO(portada))
+            pagina_portada = _primera_pagina(lector_portada)
+            if pagina_portada is None:
+                return False
+            alcanzables = _objetos_alcanzables(pagina_portada)
+            numeros = {
+                (ref.idnum, ref.generation): siguiente_numero + i
+                for i, ref in enumerate(alcanzables)
+            }
+            nuevos = [(numeros[(ref.idnum, ref.generation)], _renumerar(ref.get_object(), numeros))
+                      for ref in alcanzables]
+
+            objeto_portada = nuevos[0][1]
+            objeto_portada[NameObject('/Parent')] = IndirectObject(
+                referencia_paginas.idnum, referencia_paginas.generation, None
+            )
+            # Atributos heredables del árbol original que no deben aplicarse a la portada
+            if '/Rotate' in paginas:
+                objeto_portada[NameObject('/Rotate')] = NumberObject(0)
+            if '/CropBox' in paginas and '/MediaBox' in objeto_portada:
+                objeto_portada[NameObject('/CropBox')] = objeto_portada.raw_get('/MediaBox')
+
+            nuevas_paginas = DictionaryObject()
+            for clave in paginas.keys():
+                dict.__setitem__(nuevas_paginas, clave, paginas.raw_get(clave))
+            nuevas_paginas[NameObject('/Kids')] = ArrayObject(
+                [IndirectObject(nuevos[0][0], 0, None)] + list(paginas['/Kids'])
+            )
+            nuevas_paginas[NameObject('/Count')] = NumberObject(total_paginas + 1)
+
+            trailer = DictionaryObject()
+            for clave in ('/Root', '/Info', '/ID'):
+                if clave in reader.trailer:
+                    dict.__setitem__(trailer, NameObject(clave), reader.trailer.raw_get(clave))
+            trailer[NameObject('/Size')] = NumberObject(siguiente_numero + len(nuevos))
+            trailer[NameObject('/Prev')] = NumberObject(posicion_previa)
+
+            with open(temporal, 'wb') as destino:
+                origen.seek(0)
+                shutil.copyfileobj(origen, destino, TAMANO_BLOQUE_COPIA)
+                destino.write(b"\n")
+
+                entradas = []
+                posicion = destino.tell()
+                _escribir_objeto(destino, referencia_paginas.idnum, referencia_paginas.generation,
+                                 nuevas_paginas)
+                entradas.append((referencia_paginas.idnum, referencia_paginas.generation, posicion))
+                for numero, objeto in nuevos:
+                    posicion = destino.tell()
+                    _escribir_objeto(destino, numero, 0, objeto)
+                    entradas.append((numero, 0, posicion))
+
+                _escribir_tabla(destino, sorted(entradas), trailer, como_flujo,
+                                siguiente_numero + len(nuevos))
+
+        # Verificar que el resultado se lee con la portada incluida
+        with open(temporal, 'rb') as f:
+            if len(PdfReader(f, strict=False).pages) != total_paginas + 1:
+                return False
+
+        os.replace(temporal, salida)
+        return True
+
+    except Exception:
+        return False
+    finally:
+        if temporal.exists():
+            temporal.unlink()
@@ -0,0 +1,65 @@
+"""
+División de PDFs extensos en rangos de páginas
+
+Los reportes de laboratorio de cientos de páginas tardan mucho en una sola
+llamada a generate_content y pueden rebasar el tamaño práctico de una
+solicitud. calificar_gemini.py los califica por partes: cada rango de páginas
+se envía como un PDF independiente para reunir evidencia y al final una
+solicitud aplica la rúbrica a la evidencia combinada.
+
+PartesPDF abre el PDF una sola vez y lee del archivo bajo demanda cada rango,
+de modo que en memoria solo están las partes que se están enviando.
+"""
+
+import threading
+from io import BytesIO
+from pathlib import Path
+from typing import List, Tuple
+
+from PyPDF2 import PdfReader, PdfWriter
+
+
+def rangos_paginas(total_paginas: int, paginas_por_parte: int) -> List[Tuple[int, int]]:
+    """
+    Rangos (inicio, fin) de páginas, numerados desde 1 e inclusivos.
+    Si la última parte quedaría con menos de la mitad de páginas, se une a la anterior.
+    """
+    rangos = []
+    inicio = 1
+    while inicio <= total_paginas:
+        fin = min(total_paginas, inicio + paginas_por_parte - 1)
+        rangos.append((inicio, fin))
+        inicio = fin + 1
+
+    if len(rangos) > 1 and rangos[-1][1] - rangos[-1][0] + 1 < paginas_por_parte / 2:
+        ultimo = rangos.pop()
+        rangos[-1] = (rangos[-1][0], ultimo[1])
+
+    return rangos
+
+
+class PartesPDF:
+    """Extrae rangos de páginas de un PDF como PDFs independientes"""
+
+    def __init__(self, pdf_path: Path):
+        self._archivo = open(pdf_path, 'rb')
+        try:
+            self.reader = PdfReader(self._archivo, strict=False)
+            self.total_paginas = len(self.reader.pages)
+        except Exception:
+            self._archivo.close()
+            raise
+        self._lock = threading.Lock()  # PdfReader no es seguro entre hilos
+
+    def cerrar(self) -> None:
+        self._archivo.close()
+
+    def extraer(self, inicio: int, fin: int) -> bytes:
+        """PDF con las páginas inicio..fin (desde 1, inclusivo)"""
+        salida = BytesIO()
+        with self._lock:
+            writer = PdfWriter()
+            for indice in range(inicio - 1, fin):
+                writer.add_page(self.reader.pages[indice])
+            writer.write(salida)
+        return salida.getvalue()
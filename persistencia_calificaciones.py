@@ -0,0 +1,228 @@
+"""
+Persistencia por lotes de calificaciones en MySQL
+
+guardar_calificacion_db hacía 4-6 viajes a la base de datos por alumno (tres
+SELECT para resolver alumno, grupo y tarea, a veces un INSERT, y el upsert con
+su propio commit). RepositorioCalificaciones:
+
+- precarga una sola vez los mapas nombre -> id de alumnos, grupos y tareas
+- crea en bloque las tareas que falten (INSERT IGNORE con executemany)
+- guarda cada lote con un único executemany de upsert dentro de una sola
+  transacción; si algo falla se hace rollback del lote completo y se reintenta
+  cada calificación en su propia transacción, para que una fila inválida (dato
+  demasiado largo, llave foránea) no haga perder las demás calificaciones, que
+  ya se pagaron en la API
+
+Así, cargar las calificaciones de cientos de alumnos es una transacción, no cientos.
+
+Los nombres se comparan normalizados (sin mayúsculas, acentos ni espacios al
+final), igual que la intercalación utf8mb4_unicode_ci que usaban los SELECT.
+"""
+
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import mysql.connector
+
+
+SQL_UPSERT_CALIFICACION = """
+    INSERT INTO calificaciones
+    (alumno_id, tarea_id, calificacion, ruta_pdf_calificado, ruta_audio, ruta_transcripcion)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+    calificacion = VALUES(calificacion),
+    ruta_pdf_calificado = VALUES(ruta_pdf_calificado),
+    ruta_audio = VALUES(ruta_audio),
+    ruta_transcripcion = VALUES(ruta_transcripcion),
+    fecha_calificacion = CURRENT_TIMESTAMP
+"""
+
+
+def normalizar_nombre(nombre: str) -> str:
+    """Forma comparable de un nombre, equivalente a utf8mb4_unicode_ci"""
+    descompuesto = unicodedata.normalize('NFKD', nombre.rstrip())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+class RepositorioCalificaciones:
+    """Resuelve ids en memoria y guarda calificaciones por lotes"""
+
+    def __init__(self, conn, reconectar: bool = False):
+        self.conn = conn
+        self.reconectar = reconectar  # Para procesos largos: la conexión puede expirar
+        # Las claves son nombres normalizados (ver normalizar_nombre)
+        self.alumnos: Dict[str, int] = {}
+        self.grupos: Dict[str, int] = {}
+        self.tareas: Dict[Tuple[int, str], int] = {}  # (grupo_id, nombre) -> id
+
+    def precargar(self) -> None:
+        """Carga los mapas nombre -> id de alumnos, grupos y tareas"""
+        cursor = self.conn.cursor()
+
+        # Con nombres repetidos se conserva el primer alumno, igual que el SELECT original
+        cursor.execute("SELECT id, nombre FROM alumnos ORDER BY id")
+        self.alumnos = {}
+        for alumno_id, nombre in cursor.fetchall():
+            self.alumnos.setdefault(normalizar_nombre(nombre), alumno_id)
+
+        cursor.execute("SELECT id, nombre FROM grupos")
+        self.grupos = {normalizar_nombre(nombre): grupo_id for grupo_id, nombre in cursor.fetchall()}
+
+        cursor.execute("SELECT id, grupo_id, nombre FROM tareas")
+        self.tareas = {
+            (grupo_id, normalizar_nombre(nombre)): tarea_id
+            for tarea_id, grupo_id, nombre in cursor.fetchall()
+        }
+
+        cursor.close()
+        print(f"[+] Datos precargados: {len(self.alumnos)} alumnos, "
+              f"{len(self.grupos)} grupos, {len(self.tareas)} tareas")
+
+    def _id_tarea(self, grupo_id: int, tarea: str) -> Optional[int]:
+        return self.tareas.get((grupo_id, normalizar_nombre(tarea)))
+
+    def _crear_tareas(self, cursor, faltantes: List[Tuple[int, str]]) -> None:
+        """Inserta las tareas (grupo_id, nombre) faltantes y lee sus ids (sin commit)"""
+        cursor.executemany(
+            "INSERT IGNORE INTO tareas (grupo_id, nombre) VALUES (%s, %s)",
+            faltantes
+        )
+
+        grupo_ids = sorted({grupo_id for grupo_id, _ in faltantes})
+        marcadores = ", ".join(["%s"] * len(grupo_ids))
+        cursor.execute(
+            f"SELECT id, grupo_id, nombre FROM tareas WHERE grupo_id IN ({marcadores})",
+            grupo_ids
+        )
+        for tarea_id, grupo_id, nombre in cursor.fetchall():
+            self.tareas[(grupo_id, normalizar_nombre(nombre))] = tarea_id
+
+    def asegurar_tareas(self, pares: Iterable[Tuple[str, str]]) -> None:
+        """
+        Crea en bloque las tareas (grupo, tarea) que no existan.
+        Los grupos desconocidos se ignoran; se informan al guardar.
+        """
+        faltantes = {}
+        for grupo, tarea in pares:
+            grupo_id = self.grupos.get(normalizar_nombre(grupo))
+            if grupo_id is not None and self._id_tarea(grupo_id, tarea) is None:
+                faltantes.setdefault((grupo_id, normalizar_nombre(tarea)), (grupo_id, tarea))
+        if not faltantes:
+            return
+        faltantes = list(faltantes.values())
+
+        cursor = self.conn.cursor()
+        try:
+            self._crear_tareas(cursor, faltantes)
+            self.conn.commit()
+            print(f"[+] {len(faltantes)} tareas nuevas creadas en la base de datos")
+        except mysql.connector.Error as e:
+            print(f"[!] Error al crear tareas en BD: {e}")
+            self.conn.rollback()
+        finally:
+            cursor.close()
+
+    def guardar_lote(self, registros: List[Dict]) -> List[bool]:
+        """
+        Guarda un lote de calificaciones en una sola transacción.
+
+        Cada registro tiene las claves alumno_nombre, tarea, grupo, calificacion
+        y rutas. Retorna, en el mismo orden, si cada registro quedó guardado.
+        """
+        guardados = [False] * len(registros)
+        pendientes: List[Tuple[int, Dict, int, int]] = []  # (índice, registro, alumno_id, grupo_id)
+
+        for i, registro in enumerate(registros):
+            alumno_id = self.alumnos.get(normalizar_nombre(registro['alumno_nombre']))
+            if alumno_id is None:
+                print(f"[!] No se encontró alumno en BD: {registro['alumno_nombre']}")
+                continue
+
+            grupo_id = self.grupos.get(normalizar_nombre(registro['grupo']))
+            if grupo_id is None:
+                print(f"[!] No se encontró grupo en BD: {registro['grupo']}")
+                continue
+
+            pendientes.append((i, registro, alumno_id, grupo_id))
+
+        if not pendientes:
+            return guardados
+
+        if self.reconectar:
+            try:
+                self.conn.ping(reconnect=True, attempts=3, delay=2)
+            except mysql.connector.Error as e:
+                print(f"[!] Sin conexión a la base de datos: {e}")
+                return guardados
+
+        transacciones = "1 transacción"
+        try:
+            indices = self._guardar_transaccion(pendientes)
+        except mysql.connector.Error as e:
+            print(f"[!] Error al guardar lote en BD ({len(pendientes)} calificaciones): {e}")
+            if len(pendientes) == 1 or not self.conn.is_connected():
+                return guardados
+            print("    Se reintenta una calificación a la vez")
+            transacciones = "una transacción por calificación"
+            indices = []
+            for pendiente in pendientes:
+                try:
+                    indices += self._guardar_transaccion([pendiente])
+                except mysql.connector.Error as e:
+                    registro = pendiente[1]
+                    print(f"[!] Error al guardar calificación en BD "
+                          f"({registro['alumno_nombre']} / {registro['tarea']}): {e}")
+
+        for i in indices:
+            guardados[i] = True
+
+        print(f"[✓] {len(indices)} calificaciones guardadas en la base de datos ({transacciones})")
+        return guardados
+
+    def _guardar_transaccion(self, pendientes: List[Tuple[int, Dict, int, int]]) -> List[int]:
+        """
+        Crea las tareas faltantes y guarda los pendientes en una transacción.
+        Retorna los índices guardados; ante un error de MySQL hace rollback y lo propaga.
+        """
+        filas: List[Tuple] = []
+        indices: List[int] = []
+        tareas_previas = dict(self.tareas)
+        cursor = self.conn.cursor()
+        try:
+            faltantes = {}
+            for _, registro, _, grupo_id in pendientes:
+                if self._id_tarea(grupo_id, registro['tarea']) is None:
+                    faltantes.setdefault((grupo_id, normalizar_nombre(registro['tarea'])),
+                                         (grupo_id, registro['tarea']))
+            if faltantes:
+                self._crear_tareas(cursor, list(faltantes.values()))
+
+            for i, registro, alumno_id, grupo_id in pendientes:
+                tarea_id = self._id_tarea(grupo_id, registro['tarea'])
+                if tarea_id is None:
+                    print(f"[!] No se pudo crear la tarea en BD: {registro['tarea']}")
+                    continue
+
+                rutas = registro['rutas']
+                filas.append((
+                    alumno_id,
+                    tarea_id,
+                    registro['calificacion'],
+                    rutas.get('pdf_calificado'),
+                    rutas.get('audio'),
+                    rutas.get('transcripcion')
+                ))
+                indices.append(i)
+
+            if filas:
+                cursor.executemany(SQL_UPSERT_CALIFICACION, filas)
+            self.conn.commit()
+
+        except mysql.connector.Error:
+            self.conn.rollback()
+            self.tareas = tareas_previas  # Las tareas creadas en la transacción también se deshicieron
+            raise
+        finally:
+            cursor.close()
+
+        return indices
@@ -0,0 +1,299 @@
+"""
+Pipeline por etapas de calificar_gemini.py
+
+    unidades ─► [cola api] ─► hilos de E/S: Gemini ──────────► [cola render] ─┐
+                    ▲                                                          │
+                    └── reintentos (espera exponencial)                        │
+    ┌──────────────────────────────────────────────────────────────────────────┘
+    └─► procesos: ReportLab + PyPDF2 ─► [cola bd] ─► escritor único de BD (por lotes)
+
+Cada etapa tiene su propia cola acotada, así una etapa lenta frena a la anterior
+en lugar de acumular trabajo en memoria. Mientras las solicitudes a Gemini están
+en vuelo, los procesos generan y fusionan PDFs y el escritor guarda en MySQL.
+
+El pipeline no sabe nada de Gemini ni de MySQL; recibe tres funciones:
+    calificar(unidad) -> [(pdf_info, accion, datos), ...]   (en hilos)
+        accion 'renderizar': datos son los argumentos de renderizar
+        accion 'guardar':    datos es el resultado listo para la BD
+        accion 'fallido':    datos se ignora
+    renderizar(*datos) -> resultado o None                  (en procesos)
+    guardar_lote([(pdf_info, resultado o None), ...])       (en un solo hilo)
+
+y opcionalmente al_renderizar(pdf_info, datos, resultado) -> resultado, que se
+ejecuta en el proceso principal tras cada render (por ejemplo, para la bitácora).
+
+Uso por lotes:       pipeline.ejecutar(unidades)
+Uso continuo:        pipeline.iniciar(); pipeline.encolar(unidad) ...; pipeline.cerrar()
+"""
+
+import heapq
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from limitador_solicitudes import ErrorReintentable, calcular_espera
+
+
+FIN = object()  # Marca de fin para los hilos de cada etapa
+
+
+class PipelineCalificacion:
+    """Pipeline API → render → BD con colas acotadas y cola de reintentos"""
+
+    def __init__(self, calificar: Callable, renderizar: Callable, guardar_lote: Callable,
+                 hilos_api: int = 4, procesos_render: int = 2,
+                 tamano_cola: int = 16, tamano_lote_bd: int = 20,
+                 max_reintentos: int = 5, al_renderizar: Optional[Callable] = None,
+                 inicializar_proceso: Optional[Callable] = None,
+                 intervalo_reporte: float = 15.0):
+        self.calificar = calificar
+        self.renderizar = renderizar
+        self.guardar_lote = guardar_lote
+        self.al_renderizar = al_renderizar
+        self.inicializar_proceso = inicializar_proceso
+        self.hilos_api = max(1, hilos_api)
+        self.procesos_render = max(1, procesos_render)
+        self.tamano_lote_bd = max(1, tamano_lote_bd)
+        self.max_reintentos = max_reintentos
+        self.intervalo_reporte = intervalo_reporte
+
+        self.cola_api: queue.Queue = queue.Queue(maxsize=tamano_cola)
+        self.cola_render: queue.Queue = queue.Queue(maxsize=tamano_cola)
+        self.cola_bd: queue.Queue = queue.Queue(maxsize=tamano_cola * 2)
+
+        self._reintentos: List = []  # heap de (momento, orden, unidad, intento)
+        self._cond_reintentos = threading.Condition()
+        self._lock = threading.Lock()
+        self._unidades_restantes = 0
+        self._cerrado = False
+        self._render_activos = self.procesos_render
+        self._en_vuelo = {'api': 0, 'render': 0, 'bd': 0}
+        self._terminado = threading.Event()
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._hilos: List[threading.Thread] = []
+        self._reportero_hilo: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------ estado
+
+    def profundidades(self) -> Dict[str, int]:
+        """Elementos en espera y en proceso de cada etapa"""
+        with self._cond_reintentos:
+            reintentos = len(self._reintentos)
+        with self._lock:
+            en_vuelo = dict(self._en_vuelo)
+        return {
+            'api': self.cola_api.qsize(),
+            'api_en_vuelo': en_vuelo['api'],
+            'reintentos': reintentos,
+            'render': self.cola_render.qsize(),
+            'render_en_vuelo': en_vuelo['render'],
+            'bd': self.cola_bd.qsize(),
+        }
+
+    def _reportar(self) -> None:
+        p = self.profundidades()
+        print(f"[≡] Colas — api: {p['api']} (+{p['api_en_vuelo']} en vuelo, "
+              f"{p['reintentos']} por reintentar) | render: {p['render']} "
+              f"(+{p['render_en_vuelo']} en proceso) | bd: {p['bd']}")
+
+    def _cambiar_en_vuelo(self, etapa: str, delta: int) -> None:
+        with self._lock:
+            self._en_vuelo[etapa] += delta
+
+    # ------------------------------------------------------------- etapa API
+
+    def _unidad_terminada(self) -> None:
+        with self._lock:
+            self._unidades_restantes -= 1
+            ultima = self._cerrado and self._unidades_restantes == 0
+
+        if ultima:
+            self._cerrar_etapas()
+
+    def _cerrar_etapas(self) -> None:
+        """Todo lo calificado ya está en la cola de render: cerrar las etapas"""
+        with self._cond_reintentos:
+            self._cond_reintentos.notify_all()
+        for _ in range(self.hilos_api):
+            self.cola_api.put(FIN)
+        for _ in range(self.procesos_render):
+            self.cola_render.put(FIN)
+
+    def _trabajador_api(self) -> None:
+        while True:
+            elemento = self.cola_api.get()
+            if elemento is FIN:
+                return
+
+            unidad, intento = elemento
+            self._cambiar_en_vuelo('api', 1)
+            try:
+                salidas = self.calificar(unidad)
+            except ErrorReintentable as e:
+                if intento < self.max_reintentos:
+                    demora = calcular_espera(intento)
+                    print(f"[↻] Reintento {intento + 1}/{self.max_reintentos} en {demora:.1f}s: "
+                          f"{', '.join(p['archivo'] for p in unidad)}")
+                    with self._cond_reintentos:
+                        heapq.heappush(self._reintentos,
+                                       (time.monotonic() + demora, id(unidad), unidad, intento + 1))
+                        self._cond_reintentos.notify()
+                    continue
+
+                print(f"[!] Se agotaron los reintentos: {e}")
+                salidas = [(pdf_info, 'fallido', None) for pdf_info in unidad]
+            except Exception as e:
+                print(f"[!] Error inesperado al calificar: {e}")
+                salidas = [(pdf_info, 'fallido', None) for pdf_info in unidad]
+            finally:
+                self._cambiar_en_vuelo('api', -1)
+
+            for salida in salidas:
+                self.cola_render.put(salida)
+            self._unidad_terminada()
+
+    def _planificador_reintentos(self) -> None:
+        """Devuelve a la cola de la API las unidades cuya espera ya terminó"""
+        while True:
+            with self._cond_reintentos:
+                while True:
+                    with self._lock:
+                        if self._cerrado and self._unidades_restantes == 0:
+                            return
+                    if self._reintentos and self._reintentos[0][0] <= time.monotonic():
+                        _, _, unidad, intento = heapq.heappop(self._reintentos)
+                        break
+                    espera = self._reintentos[0][0] - time.monotonic() if self._reintentos else 1.0
+                    self._cond_reintentos.wait(timeout=max(0.01, min(espera, 1.0)))
+
+            self.cola_api.put((unidad, intento))
+
+    # ---------------------------------------------------------- etapa render
+
+    def _trabajador_render(self, pool: ProcessPoolExecutor) -> None:
+        while True:
+            elemento = self.cola_render.get()
+            if elemento is FIN:
+                with self._lock:
+                    self._render_activos -= 1
+                    ultimo = self._render_activos == 0
+                if ultimo:
+                    self.cola_bd.put(FIN)
+                return
+
+            pdf_info, accion, datos = elemento
+            if accion == 'guardar':
+                self.cola_bd.put((pdf_info, datos))
+                continue
+            if accion != 'renderizar':
+                self.cola_bd.put((pdf_info, None))
+                continue
+
+            self._cambiar_en_vuelo('render', 1)
+            try:
+                resultado = pool.submit(self.renderizar, *datos).result()
+            except Exception as e:
+                print(f"[!] Error al generar el PDF calificado de {pdf_info['archivo']}: {e}")
+                resultado = None
+            finally:
+                self._cambiar_en_vuelo('render', -1)
+
+            if self.al_renderizar is not None:
+                resultado = self.al_renderizar(pdf_info, datos, resultado)
+
+            self.cola_bd.put((pdf_info, resultado))
+
+    # -------------------------------------------------------------- etapa BD
+
+    def _escritor_bd(self) -> None:
+        terminado = False
+        while not terminado:
+            elemento = self.cola_bd.get()
+            if elemento is FIN:
+                return
+
+            lote = [elemento]
+            # Juntar lo que llegue en el siguiente medio segundo, hasta tamano_lote_bd
+            limite = time.monotonic() + 0.5
+            while len(lote) < self.tamano_lote_bd:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    elemento = self.cola_bd.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if elemento is FIN:
+                    terminado = True
+                    break
+                lote.append(elemento)
+
+            self._cambiar_en_vuelo('bd', len(lote))
+            try:
+                self.guardar_lote(lote)
+            except Exception as e:
+                print(f"[!] Error en el escritor de la base de datos: {e}")
+            finally:
+                self._cambiar_en_vuelo('bd', -len(lote))
+
+    def _reportero(self) -> None:
+        while not self._terminado.wait(self.intervalo_reporte):
+            self._reportar()
+
+    # --------------------------------------------------------------- ejecutar
+
+    def iniciar(self) -> None:
+        """Arranca los hilos y procesos de todas las etapas"""
+        self._pool = ProcessPoolExecutor(max_workers=self.procesos_render,
+                                         initializer=self.inicializar_proceso)
+
+        self._hilos = [threading.Thread(target=self._trabajador_api, name=f"api-{i}", daemon=True)
+                       for i in range(self.hilos_api)]
+        self._hilos += [threading.Thread(target=self._trabajador_render, args=(self._pool,),
+                                         name=f"render-{i}", daemon=True)
+                        for i in range(self.procesos_render)]
+        self._hilos.append(threading.Thread(target=self._planificador_reintentos,
+                                            name="reintentos", daemon=True))
+        self._hilos.append(threading.Thread(target=self._escritor_bd, name="bd", daemon=True))
+        self._reportero_hilo = threading.Thread(target=self._reportero, name="reporte", daemon=True)
+
+        for hilo in self._hilos:
+            hilo.start()
+        self._reportero_hilo.start()
+
+    def encolar(self, unidad: List[Dict]) -> None:
+        """Agrega una unidad a la primera etapa (se bloquea si la cola está llena)"""
+        with self._lock:
+            if self._cerrado:
+                raise RuntimeError("El pipeline ya está cerrado")
+            self._unidades_restantes += 1
+        self.cola_api.put((unidad, 0))
+
+    def cerrar(self) -> None:
+        """No acepta más unidades; retorna cuando la última llegó a la BD"""
+        with self._lock:
+            self._cerrado = True
+            vacio = self._unidades_restantes == 0
+        if vacio:
+            self._cerrar_etapas()
+
+        for hilo in self._hilos:
+            hilo.join()
+        self._pool.shutdown()
+
+        self._terminado.set()
+        self._reportero_hilo.join()
+        self._reportar()
+
+    def ejecutar(self, unidades: List[List[Dict]]) -> None:
+        """Procesa todas las unidades; retorna cuando la última llegó a la BD"""
+        if not unidades:
+            return
+
+        self.iniciar()
+        for unidad in unidades:
+            self.encolar(unidad)
+        self.cerrar()
@@ -0,0 +1,165 @@
+"""
+Registro de rúbricas por proceso
+
+rubricas.json y los archivos .txt de cada rúbrica se leen una sola vez por
+proceso; para cada tarea se compila su prefijo de prompt (rúbrica,
+instrucciones y formato) y se registra en el backend una sola vez. El
+resultado es el "contexto" de la tarea que usa el pipeline:
+    {'rubrica_texto': ..., 'rubrica_info': {...}, 'prefijo_id': ...}
+
+Invalidación: cada INTERVALO_REVISION segundos, como máximo, se compara la
+fecha de modificación de rubricas.json y de los archivos de rúbrica ya
+cargados. Si rubricas.json cambió se vuelve a leer; si cambió el archivo de una
+rúbrica, esa tarea se vuelve a compilar en su siguiente uso. Así un proceso de
+larga duración (vigilar_tareas.py) toma las rúbricas editadas sin reiniciarse.
+Como la clave de la caché de calificaciones incluye el texto de la rúbrica, una
+rúbrica editada no reutiliza calificaciones anteriores.
+
+Al cargar rubricas.json se valida cada tarea: que indique su archivo y que los
+puntos de sus criterios sumen puntos_maximos. Los problemas se informan pero la
+tarea se sigue usando.
+"""
+
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from backends_calificacion import BackendCalificacion
+
+
+INTERVALO_REVISION = 5.0  # Segundos entre revisiones de fechas de modificación
+TOLERANCIA_PUNTOS = 0.01  # Diferencia aceptada entre la suma de criterios y puntos_maximos
+
+
+def _mtime(ruta: Path) -> Optional[int]:
+    try:
+        return ruta.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def validar_rubrica(tarea: str, info: Dict) -> List[str]:
+    """Problemas de la configuración de una tarea en rubricas.json"""
+    problemas = []
+    if not info.get('archivo'):
+        problemas.append("no indica 'archivo'")
+
+    criterios = info.get('criterios') or []
+    sin_puntos = [c.get('nombre', '?') for c in criterios if not isinstance(c.get('puntos'), (int, float))]
+    if sin_puntos:
+        problemas.append(f"criterios sin puntos: {', '.join(sin_puntos)}")
+    elif criterios and isinstance(info.get('puntos_maximos'), (int, float)):
+        suma = sum(c['puntos'] for c in criterios)
+        if abs(suma - info['puntos_maximos']) > TOLERANCIA_PUNTOS:
+            problemas.append(f"los criterios suman {suma:g} y puntos_maximos es {info['puntos_maximos']:g}")
+
+    return problemas
+
+
+class RegistroRubricas:
+    """Contextos de tarea (rúbrica + prefijo registrado) compartidos por todo el proceso"""
+
+    def __init__(self, backend: BackendCalificacion, compilar_prefijo: Callable[[str], str],
+                 ruta_config: Path, intervalo_revision: float = INTERVALO_REVISION):
+        self.backend = backend
+        self.compilar_prefijo = compilar_prefijo
+        self.ruta_config = Path(ruta_config)
+        self.intervalo_revision = intervalo_revision
+
+        self._lock = threading.Lock()
+        self._config: Dict[str, Dict] = {}
+        self._mtime_config: Optional[int] = None
+        self._contextos: Dict[str, Optional[Dict]] = {}  # tarea -> contexto (None: sin rúbrica)
+        self._mtimes: Dict[str, Optional[int]] = {}  # tarea -> mtime del archivo de rúbrica
+        self._revisado = 0.0
+
+        if not self.ruta_config.exists():
+            raise FileNotFoundError(
+                f"No se encontró {self.ruta_config.name}. "
+                "Crea el archivo con las rúbricas de cada tarea."
+            )
+        with self._lock:
+            self._cargar_config()
+
+    def _cargar_config(self) -> None:
+        """Lee rubricas.json, valida cada tarea y descarta los contextos compilados"""
+        mtime = _mtime(self.ruta_config)
+        try:
+            with open(self.ruta_config, 'r', encoding='utf-8') as f:
+                config = json.load(f).get('rubricas', {})
+        except (OSError, json.JSONDecodeError) as e:
+            if not self._config:
+                raise
+            print(f"[!] No se pudo recargar {self.ruta_config.name}, se conservan las rúbricas anteriores: {e}")
+            self._mtime_config = mtime
+            return
+
+        if self._mtime_config is not None:
+            print(f"[+] {self.ruta_config.name} cambió, se recargan las rúbricas")
+        for tarea, info in config.items():
+            for problema in validar_rubrica(tarea, info):
+                print(f"[!] Rúbrica de '{tarea}': {problema}")
+
+        self._config = config
+        self._mtime_config = mtime
+        self._contextos.clear()
+        self._mtimes.clear()
+
+    def _ruta_rubrica(self, info: Dict) -> Path:
+        """Archivo de la rúbrica; las rutas relativas parten de la carpeta de rubricas.json"""
+        ruta = Path(info['archivo'])
+        return ruta if ruta.is_absolute() else self.ruta_config.parent / ruta
+
+    def _revisar(self) -> None:
+        """Invalida lo que cambió en disco desde la última revisión"""
+        if _mtime(self.ruta_config) != self._mtime_config:
+            self._cargar_config()
+            return
+
+        for tarea in list(self._contextos):
+            info = self._config.get(tarea)
+            if info and info.get('archivo') and _mtime(self._ruta_rubrica(info)) != self._mtimes.get(tarea):
+                print(f"[+] La rúbrica de '{tarea}' cambió, se vuelve a compilar")
+                del self._contextos[tarea]
+
+    def _compilar(self, tarea: str) -> Optional[Dict]:
+        """Lee la rúbrica de la tarea y registra su prefijo en el backend"""
+        info = self._config.get(tarea)
+        if not info:
+            print(f"[!] No se encontró configuración de rúbrica para: {tarea}")
+            return None
+        if not info.get('archivo'):
+            return None
+
+        ruta = self._ruta_rubrica(info)
+        self._mtimes[tarea] = _mtime(ruta)
+        if self._mtimes[tarea] is None:
+            print(f"[!] No existe el archivo de rúbrica: {ruta}")
+            return None
+
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                texto = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"[!] Error al leer rúbrica: {e}")
+            return None
+
+        return {
+            'rubrica_texto': texto,
+            'rubrica_info': info,
+            'prefijo_id': self.backend.registrar_prefijo(self.compilar_prefijo(texto))
+        }
+
+    def contexto(self, tarea: str) -> Optional[Dict]:
+        """Contexto de la tarea, o None si no tiene rúbrica utilizable"""
+        with self._lock:
+            ahora = time.monotonic()
+            if ahora - self._revisado >= self.intervalo_revision:
+                self._revisar()
+                self._revisado = ahora
+
+            if tarea not in self._contextos:
+                self._contextos[tarea] = self._compilar(tarea)
+            return self._contextos[tarea]
@@ -0,0 +1,255 @@
+"""
+Ejecución sin interacción y reparto del trabajo entre varias máquinas
+
+calificar_gemini.py y transcribir_audios.py aceptan los mismos argumentos:
+    --raiz RUTA          carpeta de calificación (por defecto CALIFICAR_ROOT)
+    --grupo NOMBRE       solo este grupo (se puede repetir)
+    --tarea NOMBRE       solo esta tarea (se puede repetir)
+    --limite N           procesar como máximo N pendientes
+    --si                 no pedir confirmación (ejecución desatendida, cron)
+    --fragmento i/N      procesar solo el fragmento i de N (1 ≤ i ≤ N)
+Los nombres en inglés (--group, --task, --limit, --yes, --shard) son alias.
+
+Fragmentos: cada pendiente pertenece al fragmento que indica el SHA-256 de su
+clave (grupo/tarea/archivo) módulo N. El reparto es determinista y no depende
+del orden ni de qué otros archivos haya, así que N máquinas que montan la misma
+carpeta (NFS, SMB) se reparten el trabajo sin coordinarse: la máquina k ejecuta
+--fragmento k/N. Las copias exactas de una entrega se asignan con la clave de su
+original, para que se resuelvan en el mismo fragmento.
+
+Bloqueos: antes de procesar, cada ejecución crea
+<raiz>/.bloqueos/<programa>_<i>de<N>.lock con O_EXCL (funciona en carpetas de
+red). La ejecución se rechaza si el mismo fragmento ya está tomado o si hay un
+bloqueo vivo con otro N (fragmentos de repartos distintos se traslapan). Sin
+--fragmento la ejecución equivale a 1/1 y excluye a cualquier otra. Un bloqueo
+de un proceso que ya no existe en esta máquina se retira solo; el de un proceso
+de otra máquina debe borrarse a mano si esa máquina se apagó a medio trabajo.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bitacora_calificacion import clave_entrega
+
+try:
+    import psutil
+    PSUTIL_DISPONIBLE = True
+except ImportError:
+    PSUTIL_DISPONIBLE = False
+
+
+BLOQUEOS_DIRNAME = ".bloqueos"
+FRAGMENTO_UNICO = (1, 1)
+
+
+class ErrorBloqueo(RuntimeError):
+    """Otra ejecución tiene tomado el fragmento o uno que se traslapa con él"""
+
+
+def parsear_fragmento(texto: str) -> Tuple[int, int]:
+    """Convierte 'i/N' en (i, N); argparse muestra el error si no es válido"""
+    try:
+        indice, total = (int(parte) for parte in texto.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{texto}' no tiene el formato i/N (por ejemplo 2/4)")
+    if total < 1 or not 1 <= indice <= total:
+        raise argparse.ArgumentTypeError(f"'{texto}': se requiere 1 ≤ i ≤ N")
+    return indice, total
+
+
+def agregar_argumentos(parser: argparse.ArgumentParser, raiz: Path, elementos: str) -> None:
+    """Argumentos comunes de selección y reparto del trabajo"""
+    parser.add_argument('--raiz', type=Path, default=raiz,
+                        help=f"Carpeta de calificación (por defecto {raiz})")
+    parser.add_argument('--grupo', '--group', action='append', metavar='GRUPO',
+                        help="Procesar solo este grupo (se puede repetir)")
+    parser.add_argument('--tarea', '--task', action='append', metavar='TAREA',
+                        help="Procesar solo esta tarea (se puede repetir)")
+    parser.add_argument('--limite', '--limit', type=int, metavar='N',
+                        help=f"Procesar como máximo N {elementos}")
+    parser.add_argument('--si', '--yes', '-y', action='store_true',
+                        help="No pedir confirmación")
+    parser.add_argument('--fragmento', '--shard', type=parsear_fragmento, default=FRAGMENTO_UNICO,
+                        metavar='i/N', help=f"Procesar solo el fragmento i de N de los {elementos} pendientes")
+
+
+def numero_fragmento(clave: str, total: int) -> int:
+    """Fragmento (1..total) de una clave; el mismo en cualquier máquina y ejecución"""
+    digest = hashlib.sha256(clave.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % total + 1
+
+
+def clave_reparto(pendiente: Dict) -> str:
+    """Clave con la que se asigna el fragmento: la del original, si es una copia exacta"""
+    return pendiente.get('copia_de') or clave_entrega(pendiente)
+
+
+def filtrar_por_nombre(pendientes: List[Dict], grupos: Optional[List[str]] = None,
+                       tareas: Optional[List[str]] = None) -> List[Dict]:
+    """Pendientes de los grupos y tareas indicados (None: sin filtro)"""
+    if grupos:
+        pendientes = [p for p in pendientes if p['grupo'] in grupos]
+    if tareas:
+        pendientes = [p for p in pendientes if p['tarea'] in tareas]
+    return pendientes
+
+
+def filtrar_fragmento(pendientes: List[Dict], fragmento: Tuple[int, int],
+                      clave: Callable[[Dict], str] = clave_reparto) -> List[Dict]:
+    """Pendientes que pertenecen al fragmento (i, N)"""
+    indice, total = fragmento
+    if total == 1:
+        return pendientes
+    return [p for p in pendientes if numero_fragmento(clave(p), total) == indice]
+
+
+def sufijo_fragmento(fragmento: Tuple[int, int]) -> Optional[str]:
+    """Sufijo de los registros propios del fragmento; None en una ejecución sin reparto"""
+    indice, total = fragmento
+    return None if total == 1 else f"{indice}de{total}"
+
+
+def _proceso_vivo(pid: int) -> bool:
+    if PSUTIL_DISPONIBLE:
+        return psutil.pid_exists(pid)
+    if os.name != 'posix':
+        return True  # Sin forma segura de comprobarlo: se asume vivo
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class BloqueoFragmento:
+    """Bloqueo de un fragmento en la carpeta compartida (usar con with)"""
+
+    def __init__(self, root_dir: Path, programa: str, fragmento: Tuple[int, int] = FRAGMENTO_UNICO):
+        self.directorio = Path(root_dir) / BLOQUEOS_DIRNAME
+        self.programa = programa
+        self.fragmento = fragmento
+        indice, total = fragmento
+        self.ruta = self.directorio / f"{programa}_{indice}de{total}.lock"
+        self.host = socket.gethostname()
+        self._tomado = False
+
+    def _leer(self, ruta: Path) -> Optional[Dict]:
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError):
+            return {}  # A medio escribir o ilegible: se considera vivo
+
+    def _vigente(self, ruta: Path) -> Optional[Dict]:
+        """Contenido del bloqueo si sigue vivo; retira los abandonados en esta máquina"""
+        datos = self._leer(ruta)
+        if datos is None:
+            return None
+        if datos.get('host') == self.host and isinstance(datos.get('pid'), int) \
+                and not _proceso_vivo(datos['pid']):
+            print(f"[+] Se retira el bloqueo abandonado {ruta.name} (pid {datos['pid']})")
+            ruta.unlink(missing_ok=True)
+            return None
+        return datos
+
+    def _conflictos(self) -> List[Tuple[Path, Dict]]:
+        """Bloqueos vivos de este programa que se traslapan con el fragmento"""
+        conflictos = []
+        for ruta in sorted(self.directorio.glob(f"{self.programa}_*.lock")):
+            if ruta == self.ruta and self._tomado:
+                continue
+            datos = self._vigente(ruta)
+            if datos is None:
+                continue
+            fragmento = tuple(datos.get('fragmento') or ())
+            if ruta == self.ruta or len(fragmento) != 2 or fragmento[1] != self.fragmento[1]:
+                conflictos.append((ruta, datos))
+        return conflictos
+
+    @staticmethod
+    def _describir(ruta: Path, datos: Dict) -> str:
+        return (f"{ruta} (host {datos.get('host', '?')}, pid {datos.get('pid', '?')}, "
+                f"desde {datos.get('fecha', '?')})")
+
+    def tomar(self) -> None:
+        """Crea el archivo de bloqueo; lanza ErrorBloqueo si hay un conflicto"""
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        conflictos = self._conflictos()
+        if not conflictos:
+            datos = {
+                'host': self.host,
+                'pid': os.getpid(),
+                'fecha': datetime.now().isoformat(timespec='seconds'),
+                'fragmento': list(self.fragmento)
+            }
+            try:
+                descriptor = os.open(self.ruta, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                conflictos = [(self.ruta, self._leer(self.ruta) or {})]
+            else:
+                with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+                    json.dump(datos, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._tomado = True
+                # Otra máquina pudo tomar un fragmento de otro reparto al mismo tiempo
+                conflictos = self._conflictos()
+                if conflictos:
+                    self.liberar()
+
+        if conflictos:
+            detalle = "\n    ".join(self._describir(r, d) for r, d in conflictos)
+            raise ErrorBloqueo(
+                f"El fragmento {self.fragmento[0]}/{self.fragmento[1]} de {self.programa} "
+                f"está ocupado o se traslapa con otra ejecución:\n    {detalle}\n"
+                "    Si esa ejecución ya terminó, borra el archivo de bloqueo."
+            )
+
+    def liberar(self) -> None:
+        if self._tomado:
+            self.ruta.unlink(missing_ok=True)
+            self._tomado = False
+
+    def __enter__(self) -> 'BloqueoFragmento':
+        self.tomar()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.liberar()
+
+
+def seleccionar_pendientes(pendientes: List[Dict], args: argparse.Namespace,
+                           clave: Callable[[Dict], str] = clave_reparto) -> List[Dict]:
+    """
+    Aplica --grupo, --tarea, --fragmento y --limite (en ese orden) e informa
+    cuántos pendientes quedan.
+    """
+    total = len(pendientes)
+    pendientes = filtrar_por_nombre(pendientes, args.grupo, args.tarea)
+    pendientes = filtrar_fragmento(pendientes, args.fragmento, clave)
+    if args.limite is not None:
+        pendientes = pendientes[:max(0, args.limite)]
+
+    if len(pendientes) != total:
+        indice, num = args.fragmento
+        detalle = f" (fragmento {indice}/{num})" if num > 1 else ""
+        print(f"[+] Seleccionados {len(pendientes)} de {total} pendientes{detalle}")
+    return pendientes
+
+
+def confirmar(args: argparse.Namespace, pregunta: str) -> bool:
+    """Pide confirmación salvo con --si"""
+    if args.si:
+        return True
+    respuesta = input(f"\n{pregunta} (s/n): ").strip().lower()
+    return respuesta in ['s', 'si', 'sí', 'y', 'yes']
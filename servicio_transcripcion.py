@@ -0,0 +1,233 @@
+"""
+Servicio local de transcripción (modelo Whisper siempre cargado)
+
+Cada ejecución de transcribir_audios.py paga la carga del modelo (de segundos a
+decenas de segundos y varios GB de RAM) aunque solo haya un audio nuevo. Este
+servicio carga el modelo una vez y se queda escuchando en localhost; mientras
+está corriendo, transcribir_audios.py le envía los audios en lugar de cargar su
+propio modelo, y la latencia de un audio es solo la de la inferencia. Si el
+servicio no responde, transcribir_audios.py transcribe en su propio proceso
+como siempre.
+
+Protocolo (HTTP en 127.0.0.1, JSON):
+    GET  /estado       -> {"modelo": "faster_whisper/medium/int8", "procesos": 2,
+                           "en_curso": 0, "atendidos": 15}
+    POST /transcribir  {"ruta": "/ruta/absoluta/Cal_x.mp3", "vad": true}
+                       -> 200 {"transcripcion": {...transcripcion_data...}}
+                       -> 422 {"error": "..."} si no se pudo transcribir
+El servicio lee el audio de disco, así que solo atiende rutas de la misma
+máquina; no guarda nada: el cliente escribe el _transcripcion.json. Si el
+servicio deja de responder a media ejecución (ServicioNoDisponible), el cliente
+transcribe los audios restantes con su propio modelo.
+
+Con --procesos N el servicio mantiene N procesos con su propio modelo (como
+transcribir_audios.py --procesos) y atiende hasta N audios a la vez.
+
+El servicio usa la misma caché de transcripciones que transcribir_audios.py
+(--sin-cache para desactivarla): un audio que ya transcribió, aunque llegue
+desde otra carpeta o en otro contenedor, se responde sin pasar por el modelo.
+
+Uso:
+    python servicio_transcripcion.py                 (Ctrl+C para detener)
+    python servicio_transcripcion.py --procesos 4 --backend faster_whisper
+"""
+
+import argparse
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+
+
+PUERTO_SERVICIO = 8765
+URL_SERVICIO = f"http://127.0.0.1:{PUERTO_SERVICIO}"
+TIMEOUT_ESTADO = 1.0  # Segundos para decidir si el servicio está corriendo
+TIMEOUT_TRANSCRIPCION = 3600.0  # Segundos máximos por audio
+
+
+class ServicioNoDisponible(OSError):
+    """El servicio no respondió: se detuvo, se reinició o agotó el tiempo de espera"""
+
+
+class ClienteTranscripcion:
+    """Cliente del servicio; lo usa transcribir_audios.py"""
+
+    def __init__(self, url: str = URL_SERVICIO):
+        self.url = url.rstrip('/')
+
+    def _solicitud(self, ruta: str, datos: Optional[Dict], timeout: float) -> Dict:
+        cuerpo = json.dumps(datos).encode('utf-8') if datos is not None else None
+        solicitud = urllib.request.Request(f"{self.url}{ruta}", data=cuerpo,
+                                           headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(solicitud, timeout=timeout) as respuesta:
+            return json.loads(respuesta.read().decode('utf-8'))
+
+    def estado(self) -> Optional[Dict]:
+        """Estado del servicio, o None si no está corriendo"""
+        try:
+            return self._solicitud('/estado', None, TIMEOUT_ESTADO)
+        except (OSError, ValueError):
+            return None
+
+    def transcribir(self, audio_path: Path, vad: bool) -> Optional[Dict]:
+        """
+        transcripcion_data del audio, o None si el servicio no pudo transcribirlo.
+        Lanza ServicioNoDisponible si el servicio no respondió.
+        """
+        try:
+            respuesta = self._solicitud('/transcribir',
+                                        {'ruta': str(Path(audio_path).resolve()), 'vad': vad},
+                                        TIMEOUT_TRANSCRIPCION)
+            return respuesta.get('transcripcion')
+        except urllib.error.HTTPError as e:
+            try:
+                detalle = json.loads(e.read().decode('utf-8')).get('error', e.reason)
+            except ValueError:
+                detalle = e.reason
+            print(f"[!] El servicio no pudo transcribir {Path(audio_path).name}: {detalle}")
+        except (OSError, ValueError) as e:
+            raise ServicioNoDisponible(str(e)) from e
+        return None
+
+
+class ServicioTranscripcion:
+    """Modelo (o pool de modelos) cargado durante toda la vida del servicio"""
+
+    def __init__(self, model_name: str, backend: str, procesos: int = 1, usar_cache: bool = True):
+        import transcribir_audios as ta
+
+        self.procesos = max(1, procesos)
+        self._lock = threading.Lock()
+        self._en_curso = 0
+        self._atendidos = 0
+        self._pool = None
+
+        if self.procesos == 1:
+            self._modelo = ta.cargar_modelo_whisper(model_name, backend)
+            self._cache = ta.cache_transcripciones(usar_cache)
+            self._transcribir_local = threading.Lock()  # Un modelo atiende un audio a la vez
+            self.nombre_modelo = self._modelo.nombre
+            return
+
+        hilos = ta.HILOS_POR_PROCESO or max(1, (os.cpu_count() or 1) // self.procesos)
+        print(f"\n[+] {self.procesos} procesos de Whisper con {hilos} hilos cada uno")
+        self._pool = ProcessPoolExecutor(max_workers=self.procesos, initializer=ta._inicializar_trabajador,
+                                         initargs=(model_name, backend, hilos, usar_cache))
+        # Se arrancan todos los procesos (y se cargan sus modelos) antes de aceptar audios
+        listos = [self._pool.submit(ta.nombre_modelo_trabajador) for _ in range(self.procesos)]
+        wait(listos)
+        self.nombre_modelo = listos[0].result()
+
+    def transcribir(self, audio_path: Path, vad: bool) -> Optional[Dict]:
+        import transcribir_audios as ta
+
+        with self._lock:
+            self._en_curso += 1
+        try:
+            if self._pool is not None:
+                return self._pool.submit(ta._transcribir_en_trabajador, audio_path, vad).result()
+            with self._transcribir_local:
+                return ta.transcribir_audio(self._modelo, audio_path, vad=vad, cache=self._cache)
+        finally:
+            with self._lock:
+                self._en_curso -= 1
+                self._atendidos += 1
+
+    def estado(self) -> Dict:
+        with self._lock:
+            return {'modelo': self.nombre_modelo, 'procesos': self.procesos,
+                    'en_curso': self._en_curso, 'atendidos': self._atendidos}
+
+    def cerrar(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+
+
+def crear_manejador(servicio: ServicioTranscripcion):
+    """Clase de manejador HTTP que atiende con el servicio indicado"""
+    from transcribir_audios import AUDIO_EXTENSIONS
+
+    class ManejadorTranscripcion(BaseHTTPRequestHandler):
+        def _responder(self, codigo: int, datos: Dict) -> None:
+            cuerpo = json.dumps(datos, ensure_ascii=False).encode('utf-8')
+            self.send_response(codigo)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def do_GET(self):
+            if self.path == '/estado':
+                self._responder(200, servicio.estado())
+            else:
+                self._responder(404, {'error': 'ruta desconocida'})
+
+        def do_POST(self):
+            if self.path != '/transcribir':
+                self._responder(404, {'error': 'ruta desconocida'})
+                return
+            try:
+                longitud = int(self.headers.get('Content-Length', 0))
+                datos = json.loads(self.rfile.read(longitud).decode('utf-8'))
+                audio_path = Path(datos['ruta'])
+            except (ValueError, KeyError, TypeError):
+                self._responder(400, {'error': 'se esperaba {"ruta": ..., "vad": ...}'})
+                return
+
+            if audio_path.suffix.lower() not in AUDIO_EXTENSIONS or not audio_path.is_file():
+                self._responder(400, {'error': f'no es un audio existente: {audio_path}'})
+                return
+
+            transcripcion_data = servicio.transcribir(audio_path, bool(datos.get('vad', True)))
+            if transcripcion_data is None:
+                self._responder(422, {'error': 'error al transcribir (ver la consola del servicio)'})
+            else:
+                self._responder(200, {'transcripcion': transcripcion_data})
+
+        def log_message(self, formato, *args):
+            pass  # transcribir_audio ya informa cada audio
+
+    return ManejadorTranscripcion
+
+
+def main():
+    from transcribir_audios import BACKEND_TRANSCRIPCION, BACKENDS, USAR_CACHE, WHISPER_MODEL
+
+    parser = argparse.ArgumentParser(description="Servicio local de transcripción con Whisper")
+    parser.add_argument('--puerto', type=int, default=PUERTO_SERVICIO,
+                        help=f"Puerto en 127.0.0.1 (por defecto {PUERTO_SERVICIO})")
+    parser.add_argument('--modelo', default=WHISPER_MODEL, help="Modelo de Whisper")
+    parser.add_argument('--backend', choices=BACKENDS, default=BACKEND_TRANSCRIPCION,
+                        help="Motor de transcripción")
+    parser.add_argument('--procesos', type=int, default=1,
+                        help="Procesos con su propio modelo (audios atendidos a la vez)")
+    parser.add_argument('--sin-cache', dest='usar_cache', action='store_false', default=USAR_CACHE,
+                        help="No usar la caché de transcripciones")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("SERVICIO DE TRANSCRIPCIÓN CON WHISPER")
+    print("="*60)
+
+    servicio = ServicioTranscripcion(args.modelo, args.backend, args.procesos, args.usar_cache)
+    # Solo localhost: el servicio lee rutas arbitrarias del disco
+    servidor = ThreadingHTTPServer(('127.0.0.1', args.puerto), crear_manejador(servicio))
+
+    print(f"\n[✓] Servicio listo en http://127.0.0.1:{args.puerto} ({servicio.nombre_modelo})")
+    print("    transcribir_audios.py lo usará automáticamente. Ctrl+C para detener")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[!] Deteniendo el servicio...")
+    finally:
+        servidor.server_close()
+        servicio.cerrar()
+
+
+if __name__ == "__main__":
+    main()
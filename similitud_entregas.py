@@ -0,0 +1,424 @@
+"""
+Índice de similitud entre entregas (MinHash + LSH)
+
+Además de las copias exactas (duplicados_entregas.py) llegan versiones
+ligeramente editadas del mismo reporte. Este módulo extrae el texto de cada PDF
+con PyPDF2, lo divide en fragmentos de TAMANO_FRAGMENTO palabras y lo resume en
+una firma MinHash de NUM_PERMUTACIONES valores: la proporción de valores que
+coinciden entre dos firmas estima la similitud de Jaccard de sus fragmentos.
+
+Las firmas se guardan en un índice persistente, un archivo JSON por tarea en
+SIMILITUD_DIR, junto con el semestre de cada entrega. Así una entrega también se
+compara con las de semestres anteriores aunque su carpeta ya no exista. Una
+entrega ya indexada no se vuelve a leer mientras no cambien su tamaño y fecha.
+
+Los pares con similitud mayor o igual al umbral se encuentran con LSH: la firma
+se divide en bandas y solo se comparan las entregas que coinciden por completo
+en alguna banda, en lugar de todos contra todos. Los pares se unen en grupos
+(componentes conexas) para el reporte.
+
+Las entregas sin texto suficiente (escaneos sin OCR) se indexan sin firma y no
+se comparan.
+
+Uso:
+    python similitud_entregas.py                     (tareas de CALIFICAR_ROOT)
+    python similitud_entregas.py --umbral 0.7 --tarea "3. Sensores"
+    python similitud_entregas.py --raiz D:\\tareas\\2025-2 --semestre 2025-2
+                                                     (indexar un semestre anterior)
+    python similitud_entregas.py --json reporte.json (guardar también el reporte)
+"""
+
+import argparse
+import json
+import os
+import re
+import unicodedata
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PyPDF2 import PdfReader
+
+from bitacora_calificacion import clave_entrega
+from cache_contenido import calcular_clave
+from manifiesto_archivos import ManifiestoArchivos
+
+
+# Configuración
+UMBRAL_SIMILITUD = 0.8  # Similitud de Jaccard mínima para reportar un par
+NUM_PERMUTACIONES = 128  # Valores por firma MinHash
+TAMANO_FRAGMENTO = 5  # Palabras por fragmento (shingle)
+MIN_FRAGMENTOS = 30  # Con menos fragmentos el texto no alcanza para comparar
+MARGEN_LSH = 0.1  # Las bandas se ajustan a umbral - margen para no perder pares
+SEMILLA = 1  # Semilla de las permutaciones (cambiarla invalida el índice)
+PROCESOS_SIMILITUD = min(4, os.cpu_count() or 1)  # Procesos para extraer texto
+SIMILITUD_DIR = Path(__file__).parent / "similitud"
+
+PRIMO = 4294967311  # Primo mayor que 2^32: a*x + b cabe en 64 bits
+BLOQUE_FRAGMENTOS = 4096  # Fragmentos por bloque al calcular la firma
+
+
+def semestre_actual() -> str:
+    """Semestre de la fecha actual: '<año>-1' (ene-jun) o '<año>-2' (jul-dic)"""
+    hoy = datetime.now()
+    return f"{hoy.year}-{1 if hoy.month <= 6 else 2}"
+
+
+def extraer_texto(pdf_path: Path) -> str:
+    """Texto de todas las páginas del PDF (las páginas ilegibles se omiten)"""
+    partes = []
+    with open(pdf_path, 'rb') as f:
+        reader = PdfReader(f, strict=False)
+        for pagina in reader.pages:
+            try:
+                partes.append(pagina.extract_text() or '')
+            except Exception:
+                continue
+    return "\n".join(partes)
+
+
+def palabras_normalizadas(texto: str) -> List[str]:
+    """Palabras en minúsculas y sin acentos"""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return re.findall(r'[0-9a-z]+', texto)
+
+
+def fragmentos(palabras: List[str], tamano: int = TAMANO_FRAGMENTO) -> np.ndarray:
+    """Hashes (32 bits) distintos de las secuencias de tamano palabras"""
+    hashes = {
+        zlib.crc32(' '.join(palabras[i:i + tamano]).encode('utf-8'))
+        for i in range(len(palabras) - tamano + 1)
+    }
+    return np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+
+
+def coeficientes(num_permutaciones: int = NUM_PERMUTACIONES,
+                 semilla: int = SEMILLA) -> Tuple[np.ndarray, np.ndarray]:
+    """Coeficientes (a, b) de las permutaciones h(x) = (a*x + b) mod PRIMO"""
+    rng = np.random.default_rng(semilla)
+    a = rng.integers(1, 2**32, size=num_permutaciones, dtype=np.uint64)
+    b = rng.integers(0, 2**32, size=num_permutaciones, dtype=np.uint64)
+    return a, b
+
+
+def firma_minhash(hashes: np.ndarray, num_permutaciones: int = NUM_PERMUTACIONES,
+                  semilla: int = SEMILLA) -> np.ndarray:
+    """Mínimo de cada permutación sobre los hashes de los fragmentos"""
+    a, b = coeficientes(num_permutaciones, semilla)
+    firma = np.full(num_permutaciones, PRIMO, dtype=np.uint64)
+    for inicio in range(0, len(hashes), BLOQUE_FRAGMENTOS):
+        bloque = hashes[inicio:inicio + BLOQUE_FRAGMENTOS]
+        valores = (np.outer(a, bloque) + b[:, None]) % PRIMO
+        np.minimum(firma, valores.min(axis=1), out=firma)
+    return firma
+
+
+def calcular_firma(pdf_path: Path, num_permutaciones: int = NUM_PERMUTACIONES,
+                   tamano_fragmento: int = TAMANO_FRAGMENTO) -> Optional[List[int]]:
+    """Firma MinHash del texto del PDF, o None si no tiene texto suficiente"""
+    hashes = fragmentos(palabras_normalizadas(extraer_texto(pdf_path)), tamano_fragmento)
+    if len(hashes) < MIN_FRAGMENTOS:
+        return None
+    return firma_minhash(hashes, num_permutaciones).tolist()
+
+
+def _calcular_firma_segura(argumentos: Tuple[Path, int, int]) -> Tuple[Optional[List[int]], Optional[str]]:
+    """calcular_firma para un proceso del pool: retorna (firma, error)"""
+    try:
+        return calcular_firma(*argumentos), None
+    except Exception as e:
+        return None, str(e)
+
+
+def parametros_lsh(umbral: float, num_permutaciones: int = NUM_PERMUTACIONES) -> Tuple[int, int]:
+    """
+    (bandas, filas) cuya curva S, (1/bandas)^(1/filas), queda lo más cerca
+    posible por debajo de umbral - MARGEN_LSH. Los candidatos se verifican con
+    la firma completa, así que conviene pecar de más candidatos que de menos.
+    """
+    objetivo = max(0.0, umbral - MARGEN_LSH)
+    mejor = (num_permutaciones, 1)
+    for filas in range(1, num_permutaciones + 1):
+        bandas = num_permutaciones // filas
+        if (1 / bandas) ** (1 / filas) <= objetivo:
+            mejor = (bandas, filas)
+    return mejor
+
+
+def similitud_estimada(firma_a: np.ndarray, firma_b: np.ndarray) -> float:
+    """Proporción de valores iguales entre dos firmas (estima la similitud de Jaccard)"""
+    return float(np.mean(firma_a == firma_b))
+
+
+def agrupar_pares(pares: List[Tuple[str, str, float]]) -> List[List[str]]:
+    """Componentes conexas de los pares (unión-búsqueda), de la más grande a la más pequeña"""
+    padre: Dict[str, str] = {}
+
+    def raiz(x: str) -> str:
+        while padre.setdefault(x, x) != x:
+            padre[x] = padre[padre[x]]
+            x = padre[x]
+        return x
+
+    for a, b, _ in pares:
+        padre[raiz(a)] = raiz(b)
+
+    grupos: Dict[str, List[str]] = {}
+    for x in padre:
+        grupos.setdefault(raiz(x), []).append(x)
+    return sorted((sorted(g) for g in grupos.values()), key=len, reverse=True)
+
+
+class IndiceSimilitud:
+    """Firmas MinHash de las entregas, en un archivo JSON por tarea"""
+
+    def __init__(self, directorio: Path = SIMILITUD_DIR,
+                 num_permutaciones: int = NUM_PERMUTACIONES,
+                 tamano_fragmento: int = TAMANO_FRAGMENTO):
+        self.directorio = Path(directorio)
+        self.num_permutaciones = num_permutaciones
+        self.tamano_fragmento = tamano_fragmento
+        self.parametros = {
+            'permutaciones': num_permutaciones,
+            'fragmento': tamano_fragmento,
+            'semilla': SEMILLA
+        }
+        self._tareas: Dict[str, Dict[str, Dict]] = {}  # tarea -> {id: entrada}
+
+    @staticmethod
+    def identificador(semestre: str, pdf_info: Dict) -> str:
+        """Identificador de una entrega en el índice: <semestre>/<grupo>/<tarea>/<archivo>"""
+        return f"{semestre}/{clave_entrega(pdf_info)}"
+
+    def _ruta(self, tarea: str) -> Path:
+        return self.directorio / f"{calcular_clave(tarea)[:16]}.json"
+
+    def entradas(self, tarea: str) -> Dict[str, Dict]:
+        """Entradas indexadas de la tarea (se cargan del disco la primera vez)"""
+        if tarea in self._tareas:
+            return self._tareas[tarea]
+
+        entradas = {}
+        ruta = self._ruta(tarea)
+        if ruta.exists():
+            try:
+                with open(ruta, 'r', encoding='utf-8') as f:
+                    datos = json.load(f)
+                if datos.get('parametros') == self.parametros:
+                    entradas = datos.get('entregas', {})
+                else:
+                    print(f"[!] Índice de similitud de {tarea} con otros parámetros, se reconstruye")
+            except (OSError, json.JSONDecodeError):
+                print(f"[!] Índice de similitud de {tarea} ilegible, se reconstruye")
+
+        self._tareas[tarea] = entradas
+        return entradas
+
+    def tareas(self) -> List[str]:
+        """Nombres de las tareas con índice en disco"""
+        nombres = []
+        for ruta in sorted(self.directorio.glob("*.json")):
+            try:
+                with open(ruta, 'r', encoding='utf-8') as f:
+                    nombres.append(json.load(f)['tarea'])
+            except (OSError, json.JSONDecodeError, KeyError):
+                continue
+        return nombres
+
+    def guardar(self, tarea: str) -> None:
+        """Escribe el índice de la tarea de forma atómica"""
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        ruta = self._ruta(tarea)
+        datos = {'tarea': tarea, 'parametros': self.parametros, 'entregas': self.entradas(tarea)}
+        temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+        try:
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(datos, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(temporal, ruta)
+        except OSError as e:
+            print(f"[!] No se pudo guardar el índice de similitud de {tarea}: {e}")
+            temporal.unlink(missing_ok=True)
+
+    def actualizar(self, entregas: List[Dict], semestre: str,
+                   procesos: int = PROCESOS_SIMILITUD, completo: bool = False) -> int:
+        """
+        Indexa las entregas (pdf_info) del semestre; solo se leen las nuevas o
+        modificadas. Con completo=True, entregas es el listado completo de sus
+        tareas en ese semestre y se quitan del índice las que ya no existen.
+        Retorna cuántas entregas se leyeron.
+        """
+        pendientes = []
+        vigentes: Dict[str, set] = {}
+        for pdf_info in entregas:
+            ident = self.identificador(semestre, pdf_info)
+            vigentes.setdefault(pdf_info['tarea'], set()).add(ident)
+            try:
+                st = pdf_info['ruta'].stat()
+            except OSError:
+                continue
+            previa = self.entradas(pdf_info['tarea']).get(ident)
+            if previa and previa['tamano'] == st.st_size and previa['mtime'] == st.st_mtime_ns:
+                continue
+            pendientes.append((pdf_info, ident, st))
+
+        if completo:
+            for tarea, ids in vigentes.items():
+                entradas = self.entradas(tarea)
+                for ident in [i for i, e in entradas.items()
+                              if e['semestre'] == semestre and i not in ids]:
+                    del entradas[ident]
+
+        if pendientes:
+            print(f"[+] Extrayendo texto de {len(pendientes)} PDFs para el índice de similitud...")
+            argumentos = [(p['ruta'], self.num_permutaciones, self.tamano_fragmento)
+                          for p, _, _ in pendientes]
+            if procesos > 1 and len(pendientes) > 1:
+                with ProcessPoolExecutor(max_workers=procesos) as pool:
+                    resultados = list(pool.map(_calcular_firma_segura, argumentos, chunksize=4))
+            else:
+                resultados = [_calcular_firma_segura(a) for a in argumentos]
+
+            for (pdf_info, ident, st), (firma, error) in zip(pendientes, resultados):
+                if error:
+                    print(f"[!] No se pudo leer el texto de {pdf_info['archivo']}: {error}")
+                self.entradas(pdf_info['tarea'])[ident] = {
+                    'semestre': semestre,
+                    'entrega': clave_entrega(pdf_info),
+                    'tamano': st.st_size,
+                    'mtime': st.st_mtime_ns,
+                    'firma': firma
+                }
+
+        for tarea in vigentes:
+            self.guardar(tarea)
+
+        return len(pendientes)
+
+    def pares(self, tarea: str, umbral: float = UMBRAL_SIMILITUD) -> List[Tuple[str, str, float]]:
+        """Pares (id_a, id_b, similitud) de la tarea con similitud >= umbral, de mayor a menor"""
+        con_firma = [(i, e['firma']) for i, e in self.entradas(tarea).items() if e.get('firma')]
+        if len(con_firma) < 2:
+            return []
+
+        ids = [i for i, _ in con_firma]
+        firmas = np.array([f for _, f in con_firma], dtype=np.uint64)
+        bandas, filas = parametros_lsh(umbral, self.num_permutaciones)
+
+        # Candidatos: entregas que caen en la misma cubeta en al menos una banda
+        candidatos = set()
+        for banda in range(bandas):
+            cubetas: Dict[bytes, List[int]] = {}
+            segmento = firmas[:, banda * filas:(banda + 1) * filas]
+            for indice, fila in enumerate(segmento):
+                cubetas.setdefault(fila.tobytes(), []).append(indice)
+            for miembros in cubetas.values():
+                if len(miembros) > 1:
+                    candidatos.update(combinations(miembros, 2))
+
+        pares = []
+        for i, j in candidatos:
+            similitud = similitud_estimada(firmas[i], firmas[j])
+            if similitud >= umbral:
+                pares.append((ids[i], ids[j], similitud))
+
+        pares.sort(key=lambda p: (-p[2], p[0], p[1]))
+        return pares
+
+    def sin_firma(self, tarea: str) -> int:
+        """Entregas de la tarea indexadas sin texto suficiente para compararse"""
+        return sum(1 for e in self.entradas(tarea).values() if not e.get('firma'))
+
+    def grupos(self, tarea: str, umbral: float = UMBRAL_SIMILITUD) -> List[Dict]:
+        """
+        Grupos de entregas parecidas de la tarea:
+        [{'miembros': [ids], 'pares': [(a, b, similitud)], 'maxima': similitud}]
+        """
+        pares = self.pares(tarea, umbral)
+        resultado = []
+        for miembros in agrupar_pares(pares):
+            conjunto = set(miembros)
+            propios = [p for p in pares if p[0] in conjunto]
+            resultado.append({
+                'miembros': miembros,
+                'pares': propios,
+                'maxima': max(p[2] for p in propios)
+            })
+        return resultado
+
+
+def imprimir_grupos(tarea: str, grupos: List[Dict]) -> None:
+    """Muestra los grupos de entregas parecidas de una tarea"""
+    print(f"\n[!] {tarea}: {len(grupos)} grupos de entregas parecidas")
+    for numero, grupo in enumerate(grupos, 1):
+        print(f"  Grupo {numero} ({len(grupo['miembros'])} entregas, hasta {grupo['maxima']:.0%}):")
+        for a, b, similitud in grupo['pares']:
+            print(f"     {similitud:>4.0%}  {a}")
+            print(f"           {b}")
+
+
+def entregas_de_raiz(root_dir: Path) -> List[Dict]:
+    """Todas las entregas de alumnos (calificadas o no) de una carpeta de calificación"""
+    manifiesto = ManifiestoArchivos(root_dir)
+    manifiesto.actualizar()
+    return [
+        {'ruta': ruta, 'grupo': grupo, 'tarea': tarea, 'archivo': archivo}
+        for grupo, tarea, archivo, ruta, _ in manifiesto.archivos(['entrega_pendiente', 'entrega_calificada'])
+    ]
+
+
+def main():
+    from calificar_gemini import CALIFICAR_ROOT
+
+    parser = argparse.ArgumentParser(description="Reporte de entregas parecidas (MinHash + LSH)")
+    parser.add_argument('--raiz', type=Path, default=CALIFICAR_ROOT,
+                        help="Carpeta de calificación a indexar")
+    parser.add_argument('--semestre', default=semestre_actual(),
+                        help="Semestre de las entregas de --raiz (por defecto, el actual)")
+    parser.add_argument('--umbral', type=float, default=UMBRAL_SIMILITUD,
+                        help="Similitud mínima entre 0 y 1")
+    parser.add_argument('--tarea', help="Reportar solo esta tarea")
+    parser.add_argument('--json', type=Path, help="Guardar también el reporte en este archivo")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("ÍNDICE DE SIMILITUD ENTRE ENTREGAS")
+    print("="*60)
+
+    indice = IndiceSimilitud(SIMILITUD_DIR)
+
+    print(f"\n[+] Indexando {args.raiz} (semestre {args.semestre})")
+    entregas = entregas_de_raiz(args.raiz)
+    if args.tarea:
+        entregas = [p for p in entregas if p['tarea'] == args.tarea]
+    leidas = indice.actualizar(entregas, args.semestre, completo=True)
+    print(f"[✓] {len(entregas)} entregas en la carpeta ({leidas} leídas, el resto ya indexadas)")
+
+    tareas = [args.tarea] if args.tarea else indice.tareas()
+    reporte = {}
+    for tarea in tareas:
+        grupos = indice.grupos(tarea, args.umbral)
+        if grupos:
+            imprimir_grupos(tarea, grupos)
+            reporte[tarea] = grupos
+        sin_firma = indice.sin_firma(tarea)
+        if sin_firma:
+            print(f"    {tarea}: {sin_firma} entregas sin texto extraíble (no se comparan)")
+
+    if not reporte:
+        print(f"\n[✓] Sin entregas con similitud ≥ {args.umbral:.0%}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'umbral': args.umbral, 'tareas': reporte}, f, ensure_ascii=False, indent=2)
+        print(f"\n[✓] Reporte guardado en {args.json}")
+
+    print("="*60)
+
+
+if __name__ == "__main__":
+    main()
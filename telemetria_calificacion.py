@@ -0,0 +1,187 @@
+"""
+Telemetría de costo y latencia por entrega
+
+Cada PDF que llega a la etapa de base de datos deja una línea en el registro de
+la ejecución (telemetria/ejecucion_<fecha>.jsonl) con:
+    origen            api | lote | cache | bitacora | duplicado (de dónde salió la calificación)
+    tokens_prompt, tokens_respuesta, tokens_cache   (usage metadata de la respuesta)
+    latencia_api      segundos de la llamada a la API
+    espera_limite     segundos esperando cuota del limitador
+    pdf_bytes         tamaño del PDF
+    bytes_enviados    tamaño enviado a la API (menor si se adelgazó el PDF)
+    partes            rangos de páginas, si el PDF se calificó por partes
+    reparaciones      correcciones locales a la respuesta (esquema_calificacion.py)
+    tiempo_render     segundos generando la página de calificación (ReportLab)
+    tiempo_fusion     segundos fusionando con el original (PyPDF2)
+    tiempo_bd         segundos del lote de base de datos que la guardó
+    estado            exitoso | fallido
+
+Además se mantiene un archivo de texto en formato Prometheus (para el textfile
+collector de node_exporter) con contadores y cuantiles, y al final de main se
+imprime un resumen con p50/p95/p99 y el costo estimado.
+
+Las entregas de un lote comparten la solicitud: tokens y latencia se reparten
+entre los PDFs del lote.
+"""
+
+import json
+import math
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from bitacora_calificacion import clave_entrega
+
+
+# Métricas con resumen de percentiles: (clave, nombre Prometheus, descripción)
+METRICAS_TIEMPO = [
+    ('latencia_api', 'calificacion_latencia_api_segundos', 'Latencia de la API por entrega'),
+    ('espera_limite', 'calificacion_espera_limite_segundos', 'Espera por cuota de la API'),
+    ('tiempo_render', 'calificacion_render_segundos', 'Generación de la página de calificación'),
+    ('tiempo_fusion', 'calificacion_fusion_segundos', 'Fusión con el PDF original'),
+    ('tiempo_bd', 'calificacion_bd_segundos', 'Lote de base de datos'),
+]
+METRICAS_TAMANO = [
+    ('pdf_bytes', 'calificacion_pdf_bytes', 'Tamaño del PDF original'),
+    ('bytes_enviados', 'calificacion_bytes_enviados', 'Tamaño del PDF enviado a la API'),
+]
+TIPOS_TOKENS = ['prompt', 'respuesta', 'cache']
+CUANTILES = [0.5, 0.95, 0.99]
+
+
+def metricas_entrega(pdf_info: Dict) -> Dict:
+    """Métricas acumuladas de una entrega a lo largo del pipeline"""
+    return pdf_info.setdefault('metricas', {})
+
+
+def percentil(valores: List[float], q: float) -> float:
+    """Percentil por rango más cercano (valores ordenados)"""
+    if not valores:
+        return 0.0
+    indice = max(0, math.ceil(q * len(valores)) - 1)
+    return valores[indice]
+
+
+class TelemetriaCalificacion:
+    """Registro JSONL + archivo Prometheus + resumen de una ejecución"""
+
+    def __init__(self, directorio: Path, archivo_prometheus: Optional[Path] = None,
+                 precio_entrada_millon: float = 0.0, precio_salida_millon: float = 0.0):
+        directorio = Path(directorio)
+        directorio.mkdir(parents=True, exist_ok=True)
+        marca = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+        self.ruta_jsonl = directorio / f"ejecucion_{marca}.jsonl"
+        self.ruta_prometheus = Path(archivo_prometheus) if archivo_prometheus else \
+            directorio / "calificacion.prom"
+        self.precio_entrada_millon = precio_entrada_millon
+        self.precio_salida_millon = precio_salida_millon
+
+        self._lock = threading.Lock()
+        self._valores: Dict[str, List[float]] = {
+            clave: [] for clave, _, _ in METRICAS_TIEMPO + METRICAS_TAMANO
+        }
+        self._tokens = {tipo: 0 for tipo in TIPOS_TOKENS}
+        self._estados: Dict[str, int] = {}
+        self._origenes: Dict[str, int] = {}
+
+    def registrar(self, pdf_info: Dict, metricas: Dict) -> None:
+        """Agrega la línea de una entrega al registro y a los acumulados"""
+        registro = {
+            'entrega': clave_entrega(pdf_info),
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            **metricas
+        }
+
+        with self._lock:
+            with open(self.ruta_jsonl, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+            for clave, valores in self._valores.items():
+                if metricas.get(clave) is not None:
+                    valores.append(float(metricas[clave]))
+            for tipo in TIPOS_TOKENS:
+                self._tokens[tipo] += int(metricas.get(f'tokens_{tipo}', 0) or 0)
+
+            estado = metricas.get('estado', 'desconocido')
+            self._estados[estado] = self._estados.get(estado, 0) + 1
+            origen = metricas.get('origen')
+            if origen:
+                self._origenes[origen] = self._origenes.get(origen, 0) + 1
+
+    def costo_estimado(self) -> float:
+        """Costo en USD según los precios por millón de tokens configurados"""
+        entrada = self._tokens['prompt'] - self._tokens['cache']
+        return (entrada * self.precio_entrada_millon
+                + self._tokens['respuesta'] * self.precio_salida_millon) / 1_000_000
+
+    def escribir_prometheus(self) -> None:
+        """Reescribe el archivo Prometheus de forma atómica"""
+        with self._lock:
+            lineas = [
+                "# HELP calificacion_entregas_total Entregas procesadas por estado",
+                "# TYPE calificacion_entregas_total counter",
+            ]
+            for estado, cuenta in sorted(self._estados.items()):
+                lineas.append(f'calificacion_entregas_total{{estado="{estado}"}} {cuenta}')
+
+            lineas += [
+                "# HELP calificacion_origen_total Origen de la calificación",
+                "# TYPE calificacion_origen_total counter",
+            ]
+            for origen, cuenta in sorted(self._origenes.items()):
+                lineas.append(f'calificacion_origen_total{{origen="{origen}"}} {cuenta}')
+
+            lineas += [
+                "# HELP calificacion_tokens_total Tokens consumidos",
+                "# TYPE calificacion_tokens_total counter",
+            ]
+            for tipo in TIPOS_TOKENS:
+                lineas.append(f'calificacion_tokens_total{{tipo="{tipo}"}} {self._tokens[tipo]}')
+
+            for clave, nombre, descripcion in METRICAS_TIEMPO + METRICAS_TAMANO:
+                valores = sorted(self._valores[clave])
+                lineas += [f"# HELP {nombre} {descripcion}", f"# TYPE {nombre} summary"]
+                for q in CUANTILES:
+                    lineas.append(f'{nombre}{{quantile="{q}"}} {percentil(valores, q):.6g}')
+                lineas.append(f"{nombre}_sum {sum(valores):.6g}")
+                lineas.append(f"{nombre}_count {len(valores)}")
+
+        self.ruta_prometheus.parent.mkdir(parents=True, exist_ok=True)
+        temporal = self.ruta_prometheus.with_name(f"{self.ruta_prometheus.name}.{os.getpid()}.tmp")
+        try:
+            temporal.write_text("\n".join(lineas) + "\n", encoding='utf-8')
+            os.replace(temporal, self.ruta_prometheus)
+        except OSError as e:
+            print(f"[!] No se pudo escribir el archivo de métricas: {e}")
+
+    def imprimir_resumen(self) -> None:
+        """Tabla de percentiles, tokens y costo estimado de la ejecución"""
+        with self._lock:
+            if not any(self._estados.values()):
+                return
+
+            print("\n" + "="*60)
+            print("TELEMETRÍA")
+            print("="*60)
+            print(f"{'Métrica':<18}{'p50':>10}{'p95':>10}{'p99':>10}{'n':>8}")
+            for clave, _, _ in METRICAS_TIEMPO + METRICAS_TAMANO:
+                valores = sorted(self._valores[clave])
+                if not valores:
+                    continue
+                if clave in ('pdf_bytes', 'bytes_enviados'):
+                    fila = [f"{percentil(valores, q) / 1024:.0f}KB" for q in CUANTILES]
+                else:
+                    fila = [f"{percentil(valores, q):.2f}s" for q in CUANTILES]
+                print(f"{clave:<18}{fila[0]:>10}{fila[1]:>10}{fila[2]:>10}{len(valores):>8}")
+
+            print(f"\nTokens: {self._tokens['prompt']:,} de entrada "
+                  f"({self._tokens['cache']:,} desde caché), {self._tokens['respuesta']:,} de salida")
+            if self._origenes:
+                print("Origen: " + ", ".join(f"{o}={c}" for o, c in sorted(self._origenes.items())))
+            if self.precio_entrada_millon or self.precio_salida_millon:
+                print(f"Costo estimado: ${self.costo_estimado():.4f} USD")
+            print(f"Registro: {self.ruta_jsonl}")
+            print("="*60)
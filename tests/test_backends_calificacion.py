@@ -0,0 +1,31 @@
+"""Pruebas del backend falso (sin red)"""
+
+import json
+
+from backends_calificacion import BackendFalso
+
+
+def calificar(rubrica):
+    backend = BackendFalso(latencia=0.0)
+    return json.loads(backend.generar(f"RÚBRICA:\n{rubrica}\n", b'%PDF-1.4 prueba').text)
+
+
+def test_criterios_de_la_rubrica():
+    calificacion = calificar("1. Servidor SSH (6 puntos)\n2. Documentación (4 puntos)")
+    assert [(c['nombre'], c['puntos_maximos']) for c in calificacion['criterios']] == [
+        ('Servidor SSH', 6.0), ('Documentación', 4.0)
+    ]
+    assert 0.0 <= calificacion['calificacion_total'] <= 10.0
+
+
+def test_criterios_de_cero_puntos_se_omiten():
+    calificacion = calificar("1. Servidor SSH (5 puntos)\n2. Asistencia (0 puntos)")
+    assert [c['nombre'] for c in calificacion['criterios']] == ['Servidor SSH']
+
+
+def test_rubrica_solo_con_ceros_usa_criterios_genericos():
+    calificacion = calificar("1. Asistencia (0 puntos)\n2. Puntualidad (0 puntos)")
+    assert [c['nombre'] for c in calificacion['criterios']] == [
+        nombre for nombre, _ in BackendFalso.CRITERIOS_GENERICOS
+    ]
+    assert 0.0 <= calificacion['calificacion_total'] <= 10.0
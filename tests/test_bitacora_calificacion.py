@@ -0,0 +1,83 @@
+"""Pruebas de la reanudación con la bitácora de calificación"""
+
+import json
+
+from bitacora_calificacion import BITACORA_ARCHIVO, BitacoraCalificacion
+
+ENTREGA = {'grupo': '8A', 'tarea': 'T1', 'archivo': 'ana.pdf'}
+
+
+def escribir(ruta, registros, extra=''):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        for r in registros:
+            f.write(json.dumps(r) + "\n")
+        f.write(extra)
+
+
+def registro(etapa, fecha, **datos):
+    return {'entrega': '8A/T1/ana.pdf', 'etapa': etapa, 'fecha': fecha, 'datos': datos}
+
+
+def test_reanuda_en_la_ultima_etapa_registrada(tmp_path):
+    bitacora = BitacoraCalificacion(tmp_path)
+    bitacora.registrar(ENTREGA, 'calificado', {'clave': 'abc'})
+    bitacora.registrar(ENTREGA, 'renderizado')
+
+    releida = BitacoraCalificacion(tmp_path)
+    assert releida.ultima_etapa(ENTREGA) == 'renderizado'
+    assert releida.datos(ENTREGA, 'calificado') == {'clave': 'abc'}
+    assert releida.datos(ENTREGA, 'fusionado') is None
+
+
+def test_nueva_calificacion_reinicia_las_etapas(tmp_path):
+    escribir(tmp_path / BITACORA_ARCHIVO, [
+        registro('calificado', '2025-01-01T10:00:00', clave='vieja'),
+        registro('renderizado', '2025-01-01T10:00:01'),
+        registro('fusionado', '2025-01-01T10:00:02'),
+        registro('calificado', '2025-01-02T10:00:00', clave='nueva'),
+    ])
+
+    bitacora = BitacoraCalificacion(tmp_path)
+    assert bitacora.ultima_etapa(ENTREGA) == 'calificado'
+    assert bitacora.datos(ENTREGA, 'calificado') == {'clave': 'nueva'}
+
+
+def test_linea_cortada_al_final_se_ignora(tmp_path):
+    escribir(tmp_path / BITACORA_ARCHIVO,
+             [registro('calificado', '2025-01-01T10:00:00')],
+             extra='{"entrega": "8A/T1/ana.pdf", "eta')
+
+    assert BitacoraCalificacion(tmp_path).ultima_etapa(ENTREGA) == 'calificado'
+
+
+def test_fragmentos_se_combinan_por_fecha(tmp_path):
+    # El fragmento volvió a calificar después de que la bitácora común llegó a fusionado
+    escribir(tmp_path / BITACORA_ARCHIVO, [
+        registro('calificado', '2025-01-01T10:00:00'),
+        registro('fusionado', '2025-01-01T10:05:00'),
+    ])
+    escribir(tmp_path / BITACORA_ARCHIVO.replace('.jsonl', '.1de2.jsonl'), [
+        registro('calificado', '2025-01-01T11:00:00', clave='fragmento'),
+    ])
+
+    bitacora = BitacoraCalificacion(tmp_path, sufijo='2de2')
+    assert bitacora.ultima_etapa(ENTREGA) == 'calificado'
+    assert bitacora.datos(ENTREGA, 'calificado') == {'clave': 'fragmento'}
+
+
+def test_misma_fecha_conserva_el_orden_de_escritura(tmp_path):
+    escribir(tmp_path / BITACORA_ARCHIVO, [
+        registro('calificado', '2025-01-01T10:00:00'),
+        registro('renderizado', '2025-01-01T10:00:00'),
+    ])
+    escribir(tmp_path / BITACORA_ARCHIVO.replace('.jsonl', '.1de2.jsonl'), [
+        registro('fusionado', '2025-01-01T10:00:00'),
+    ])
+
+    assert BitacoraCalificacion(tmp_path).ultima_etapa(ENTREGA) == 'fusionado'
+
+
+def test_escribe_en_el_archivo_del_fragmento(tmp_path):
+    BitacoraCalificacion(tmp_path, sufijo='1de3').registrar(ENTREGA, 'calificado')
+    assert (tmp_path / '.bitacora_calificacion.1de3.jsonl').exists()
+    assert not (tmp_path / BITACORA_ARCHIVO).exists()
@@ -0,0 +1,52 @@
+"""Pruebas del armado del pipeline de calificar_gemini.py"""
+
+import threading
+
+import calificar_gemini
+from calificar_gemini import crear_pipeline, repartir_metricas_lote
+
+ENTREGA = {'grupo': '8A', 'tarea': 'T1', 'archivo': 'ana.pdf'}
+
+
+def test_entregas_se_liberan_aunque_falle_el_guardado(monkeypatch):
+    """Como en vigilar_tareas.py: una entrega en curso se puede volver a encolar"""
+    def guardar_con_error(*_):
+        raise OSError("fsync falló en la carpeta compartida")
+
+    monkeypatch.setattr(calificar_gemini, 'guardar_lote_db', guardar_con_error)
+
+    en_curso = set()
+    lock_en_curso = threading.Lock()
+
+    def liberar(lote):
+        with lock_en_curso:
+            for pdf_info, _ in lote:
+                en_curso.discard(pdf_info['archivo'])
+
+    pipeline = crear_pipeline({'procesos_render': 1}, None, None, None, None, None, {},
+                              al_guardar=liberar)
+    pipeline.calificar = lambda unidad: [(p, 'guardar', {'calificacion': 8.0}) for p in unidad]
+
+    en_curso.add(ENTREGA['archivo'])
+    pipeline.ejecutar([[ENTREGA]])
+
+    assert ENTREGA['archivo'] not in en_curso
+
+
+def test_metricas_de_un_lote_suman_el_uso_real(tmp_path):
+    metricas_lote = {'tokens_prompt': 1003, 'tokens_respuesta': 302, 'tokens_cache': 2,
+                     'bytes_enviados': 10001, 'latencia_api': 3.0}
+    entregas = []
+    for i in range(3):
+        ruta = tmp_path / f"alumno{i}.pdf"
+        ruta.write_bytes(b'%PDF-1.4')
+        entregas.append({**ENTREGA, 'archivo': ruta.name, 'ruta': ruta})
+
+    for posicion, pdf_info in enumerate(entregas):
+        repartir_metricas_lote(pdf_info, metricas_lote, len(entregas), posicion)
+
+    metricas = [p['metricas'] for p in entregas]
+    for clave in ('tokens_prompt', 'tokens_respuesta', 'tokens_cache', 'bytes_enviados'):
+        assert sum(m[clave] for m in metricas) == metricas_lote[clave]
+    assert [m['tokens_prompt'] for m in metricas] == [335, 334, 334]
+    assert all(m['latencia_api'] == 1.0 and m['lote'] == 3 for m in metricas)
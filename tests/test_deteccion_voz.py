@@ -0,0 +1,87 @@
+"""Pruebas de la detección de voz y de la traducción de tiempos"""
+
+import numpy as np
+import pytest
+
+import deteccion_voz
+from deteccion_voz import (
+    FRECUENCIA, RELLENO, SEPARACION, detectar_voz, empaquetar_voz, recortar_silencios,
+    reubicar_segmentos, tiempo_original
+)
+
+# Dos regiones de la grabación original: 2.0–3.0 s y 10.0–12.0 s
+MAPA = [(0.0, 2.0, 1.0), (1.5, 10.0, 2.0)]
+
+
+@pytest.fixture(autouse=True)
+def detector_por_energia(monkeypatch):
+    """Las pruebas usan el detector por energía aunque webrtcvad esté instalado"""
+    monkeypatch.setattr(deteccion_voz, 'WEBRTCVAD_DISPONIBLE', False)
+
+
+def grabacion(duracion, voz):
+    """Ruido de fondo bajo con un tono de 220 Hz en cada intervalo (inicio, fin) de voz"""
+    rng = np.random.default_rng(0)
+    audio = rng.normal(0, 0.001, int(duracion * FRECUENCIA)).astype(np.float32)
+    for inicio, fin in voz:
+        t = np.arange(int(inicio * FRECUENCIA), int(fin * FRECUENCIA))
+        audio[t] += (0.3 * np.sin(2 * np.pi * 220 * t / FRECUENCIA)).astype(np.float32)
+    return audio
+
+
+def test_tiempo_original_dentro_de_cada_region():
+    assert tiempo_original(0.5, MAPA) == 2.5
+    assert tiempo_original(1.5, MAPA) == 10.0
+    assert tiempo_original(3.0, MAPA) == 11.5
+
+
+def test_tiempo_original_en_la_separacion_y_fuera_de_la_pista():
+    # La separación entre regiones se asigna al final de la región anterior
+    assert tiempo_original(1.2, MAPA) == 3.0
+    assert tiempo_original(9.0, MAPA) == 12.0
+    assert tiempo_original(-0.1, MAPA) == 2.0
+    assert tiempo_original(4.0, []) == 4.0
+
+
+def test_reubicar_segmentos_conserva_los_demas_campos():
+    segmentos = [{'start': 0.2, 'end': 0.9, 'text': 'hola'}, {'start': 1.6, 'end': 2.5, 'text': 'bien'}]
+    assert reubicar_segmentos(segmentos, MAPA) == [
+        {'start': 2.2, 'end': 2.9, 'text': 'hola'},
+        {'start': 10.1, 'end': 11.0, 'text': 'bien'},
+    ]
+
+
+def test_detectar_voz_une_pausas_cortas_y_agrega_relleno():
+    audio = grabacion(20, [(2.0, 3.0), (3.3, 4.0), (10.0, 12.0)])
+    regiones = [(inicio / FRECUENCIA, fin / FRECUENCIA) for inicio, fin in detectar_voz(audio)]
+    assert len(regiones) == 2
+    for (inicio, fin), (esperado_inicio, esperado_fin) in zip(regiones, [(2.0, 4.0), (10.0, 12.0)]):
+        assert inicio == pytest.approx(esperado_inicio - RELLENO, abs=0.05)
+        assert fin == pytest.approx(esperado_fin + RELLENO, abs=0.05)
+
+
+def test_empaquetar_y_traducir_recupera_los_tiempos_originales():
+    audio = grabacion(20, [(2.0, 3.0), (10.0, 12.0)])
+    regiones = [(2 * FRECUENCIA, 3 * FRECUENCIA), (10 * FRECUENCIA, 12 * FRECUENCIA)]
+    pista, mapa = empaquetar_voz(audio, regiones)
+
+    assert len(pista) == int((1.0 + SEPARACION + 2.0) * FRECUENCIA)
+    assert mapa == [(0.0, 2.0, 1.0), (1.0 + SEPARACION, 10.0, 2.0)]
+    muestra = int((1.0 + SEPARACION + 0.7) * FRECUENCIA)
+    assert pista[muestra] == audio[int(10.7 * FRECUENCIA)]
+    assert tiempo_original(muestra / FRECUENCIA, mapa) == 10.7
+
+
+def test_recortar_silencios_en_grabacion_con_pausas():
+    audio = grabacion(30, [(2.0, 5.0), (20.0, 24.0)])
+    recorte = recortar_silencios(audio)
+    assert recorte is not None
+    assert len(recorte['mapa']) == 2
+    assert recorte['duracion_voz'] == pytest.approx(7.0 + 4 * RELLENO, abs=0.1)
+    assert tiempo_original(recorte['mapa'][1][0], recorte['mapa']) == pytest.approx(20.0 - RELLENO, abs=0.05)
+
+
+def test_recortar_silencios_sin_voz_o_sin_pausas_retorna_none():
+    assert recortar_silencios(grabacion(10, [])) is None
+    assert recortar_silencios(np.zeros(10 * FRECUENCIA, dtype=np.float32)) is None
+    assert recortar_silencios(grabacion(10, [(0.0, 10.0)])) is None
@@ -0,0 +1,103 @@
+"""Pruebas de la recuperación y reparación local de respuestas"""
+
+import json
+
+import pytest
+
+from esquema_calificacion import (
+    ErrorCalificacionInvalida, _puntos_en_rubrica, interpretar_json, reparar_calificacion
+)
+
+RUBRICA = {'criterios': [
+    {'nombre': 'Configuración correcta del servidor SSH', 'puntos': 6},
+    {'nombre': 'Documentación', 'puntos': 4},
+]}
+
+
+def criterio(nombre, obtenidos, maximos, comentario='ok'):
+    return {'nombre': nombre, 'puntos_obtenidos': obtenidos,
+            'puntos_maximos': maximos, 'comentario': comentario}
+
+
+def calificacion(total, criterios, **extra):
+    datos = {'calificacion_total': total, 'calificacion_maxima': 10, 'criterios': criterios,
+             'retroalimentacion_general': 'Bien', 'fortalezas': ['a'], 'areas_mejora': ['b']}
+    datos.update(extra)
+    return datos
+
+
+def test_json_completo_con_marcadores():
+    datos, reparado = interpretar_json('```json\n{"a": [1, 2]}\n```')
+    assert datos == {'a': [1, 2]}
+    assert not reparado
+
+
+def test_json_truncado_se_cierra_en_el_ultimo_elemento():
+    texto = json.dumps(calificacion(8, [criterio('A', 5, 6), criterio('B', 3, 4)]))
+    datos, reparado = interpretar_json(texto[:texto.index('"B"') + 10])
+    assert reparado
+    assert datos['criterios'] == [criterio('A', 5, 6), {'nombre': 'B'}]
+
+    # El criterio cortado se descarta y el total se conserva (no están todos)
+    resultado, _ = reparar_calificacion(datos, completa=False)
+    assert [c['nombre'] for c in resultado['criterios']] == ['A']
+    assert resultado['calificacion_total'] == 8.0
+
+
+def test_json_sin_objeto_lanza_error():
+    with pytest.raises(json.JSONDecodeError):
+        interpretar_json('lo siento, no puedo calificar')
+
+
+def test_puntos_en_rubrica_exacto_y_contenido():
+    puntos = {'ssh': 3.0, 'configuracion ssh': 5.0, 'firewall': 2.0}
+    assert _puntos_en_rubrica('SSH', puntos) == 3.0
+    assert _puntos_en_rubrica('Configuracion SSH del equipo', puntos) == 5.0
+    assert _puntos_en_rubrica('Reglas', puntos) is None
+
+
+def test_puntos_en_rubrica_ambiguo_retorna_none():
+    puntos = {'ssh': 3.0, 'vpn': 2.0}
+    assert _puntos_en_rubrica('ssh y vpn', puntos) is None
+    # Empate con los mismos puntos: no hay ambigüedad en el máximo
+    assert _puntos_en_rubrica('ssh y vpn', {'ssh': 2.0, 'vpn': 2.0}) == 2.0
+
+
+def test_reparar_corrige_maximos_recorta_y_recalcula_total():
+    datos = calificacion('9/10', [
+        criterio('Configuración correcta del servidor SSH', '7,5', 10),
+        criterio('documentación', -1, 4),
+    ], fortalezas='Claro', areas_mejora=['', ' Ortografía '])
+
+    resultado, reparaciones = reparar_calificacion(datos, RUBRICA)
+
+    assert [c['puntos_maximos'] for c in resultado['criterios']] == [6.0, 4.0]
+    assert [c['puntos_obtenidos'] for c in resultado['criterios']] == [6.0, 0.0]
+    assert resultado['calificacion_total'] == 6.0
+    assert resultado['fortalezas'] == ['Claro']
+    assert resultado['areas_mejora'] == ['Ortografía']
+    assert len(reparaciones) == 6
+
+
+def test_reparar_sin_cambios_no_reporta_reparaciones():
+    datos = calificacion(8.0, [
+        criterio('Configuración correcta del servidor SSH', 5, 6),
+        criterio('Documentación', 3, 4),
+    ])
+    resultado, reparaciones = reparar_calificacion(datos, RUBRICA)
+    assert reparaciones == []
+    assert resultado['calificacion_total'] == 8.0
+
+
+def test_criterios_incompletos_conservan_el_total():
+    datos = calificacion(12, [criterio('Documentación', 3, 4)])
+    resultado, _ = reparar_calificacion(datos, RUBRICA)
+    assert resultado['calificacion_total'] == 10.0
+
+
+def test_sin_total_ni_criterios_completos_se_descarta():
+    datos = calificacion(None, [criterio('Documentación', 3, 4)])
+    with pytest.raises(ErrorCalificacionInvalida):
+        reparar_calificacion(datos, RUBRICA)
+    with pytest.raises(ErrorCalificacionInvalida):
+        reparar_calificacion(calificacion(None, [criterio('A', 1, 2)]), completa=False)
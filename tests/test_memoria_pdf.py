@@ -0,0 +1,64 @@
+"""Pruebas de la fusión incremental de la portada con el PDF original"""
+
+from io import BytesIO
+
+from PyPDF2 import PdfReader
+from reportlab.pdfgen import canvas
+
+from memoria_pdf import fusionar_incremental
+
+
+def generar_pdf(textos, comprimir=True):
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pageCompression=int(comprimir))
+    for texto in textos:
+        c.drawString(72, 720, texto)
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def textos(ruta):
+    with open(ruta, 'rb') as f:
+        return [pagina.extract_text().strip() for pagina in PdfReader(f).pages]
+
+
+def test_portada_queda_como_primera_pagina(tmp_path):
+    original = tmp_path / 'entrega.pdf'
+    original.write_bytes(generar_pdf(['pagina uno', 'pagina dos']))
+    salida = tmp_path / 'calificado.pdf'
+
+    assert fusionar_incremental(generar_pdf(['PORTADA']), original, salida)
+    assert textos(salida) == ['PORTADA', 'pagina uno', 'pagina dos']
+
+
+def test_original_se_conserva_byte_a_byte(tmp_path):
+    contenido = generar_pdf(['pagina uno'], comprimir=False)
+    original = tmp_path / 'entrega.pdf'
+    original.write_bytes(contenido)
+    salida = tmp_path / 'calificado.pdf'
+
+    assert fusionar_incremental(generar_pdf(['PORTADA']), original, salida)
+    assert original.read_bytes() == contenido
+    assert salida.read_bytes().startswith(contenido)
+
+
+def test_fusion_repetida_sobre_la_salida(tmp_path):
+    original = tmp_path / 'entrega.pdf'
+    original.write_bytes(generar_pdf(['pagina uno']))
+    primera = tmp_path / 'primera.pdf'
+    segunda = tmp_path / 'segunda.pdf'
+
+    assert fusionar_incremental(generar_pdf(['PORTADA 1']), original, primera)
+    assert fusionar_incremental(generar_pdf(['PORTADA 2']), primera, segunda)
+    assert textos(segunda) == ['PORTADA 2', 'PORTADA 1', 'pagina uno']
+
+
+def test_original_invalido_no_crea_salida(tmp_path):
+    original = tmp_path / 'entrega.pdf'
+    original.write_bytes(b'no es un pdf')
+    salida = tmp_path / 'calificado.pdf'
+
+    assert not fusionar_incremental(generar_pdf(['PORTADA']), original, salida)
+    assert not salida.exists()
+    assert list(tmp_path.iterdir()) == [original]
@@ -0,0 +1,85 @@
+"""Pruebas del reparto de pendientes en fragmentos y de los bloqueos"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+import pytest
+
+from reparto_trabajo import (
+    BLOQUEOS_DIRNAME, BloqueoFragmento, ErrorBloqueo, clave_reparto, filtrar_fragmento,
+    numero_fragmento, parsear_fragmento, seleccionar_pendientes
+)
+
+
+def pendientes(n):
+    return [{'grupo': f"G{i % 3}", 'tarea': 'T1', 'archivo': f"alumno{i}.pdf"} for i in range(n)]
+
+
+def test_numero_fragmento_es_determinista_y_esta_en_rango():
+    for total in (1, 2, 5, 16):
+        numeros = [numero_fragmento(f"G/T/{i}.pdf", total) for i in range(200)]
+        assert numeros == [numero_fragmento(f"G/T/{i}.pdf", total) for i in range(200)]
+        assert set(numeros) == set(range(1, total + 1))
+
+
+def test_fragmentos_reparten_cada_pendiente_una_sola_vez():
+    todos = pendientes(100)
+    partes = [filtrar_fragmento(todos, (i, 4)) for i in range(1, 5)]
+    claves = sorted(clave_reparto(p) for parte in partes for p in parte)
+    assert claves == sorted(clave_reparto(p) for p in todos)
+    # El fragmento de un pendiente no depende de qué otros haya
+    assert filtrar_fragmento(todos[:10], (2, 4)) == [p for p in partes[1] if p in todos[:10]]
+
+
+def test_copias_exactas_van_al_fragmento_del_original():
+    original = {'grupo': 'G1', 'tarea': 'T1', 'archivo': 'ana.pdf'}
+    copia = {'grupo': 'G2', 'tarea': 'T1', 'archivo': 'beto.pdf', 'copia_de': 'G1/T1/ana.pdf'}
+    assert clave_reparto(original) == clave_reparto(copia) == 'G1/T1/ana.pdf'
+    for total in (2, 3, 7):
+        fragmento = (numero_fragmento('G1/T1/ana.pdf', total), total)
+        assert filtrar_fragmento([original, copia], fragmento) == [original, copia]
+
+
+@pytest.mark.parametrize('texto', ['2', 'a/b', '0/3', '4/3', '1/0', '1/2/3'])
+def test_parsear_fragmento_invalido(texto):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parsear_fragmento(texto)
+
+
+def test_parsear_fragmento_valido():
+    assert parsear_fragmento('2/4') == (2, 4)
+
+
+def test_seleccionar_aplica_grupo_fragmento_y_limite():
+    todos = pendientes(60)
+    args = argparse.Namespace(grupo=['G1'], tarea=None, fragmento=(1, 2), limite=3)
+    seleccion = seleccionar_pendientes(todos, args)
+    esperados = filtrar_fragmento([p for p in todos if p['grupo'] == 'G1'], (1, 2))[:3]
+    assert seleccion == esperados
+
+
+def test_bloqueo_rechaza_el_mismo_fragmento_y_otro_reparto(tmp_path):
+    with BloqueoFragmento(tmp_path, 'calificar', (1, 2)):
+        with pytest.raises(ErrorBloqueo):
+            BloqueoFragmento(tmp_path, 'calificar', (1, 2)).tomar()
+        with pytest.raises(ErrorBloqueo):
+            BloqueoFragmento(tmp_path, 'calificar', (1, 3)).tomar()
+        with pytest.raises(ErrorBloqueo):
+            BloqueoFragmento(tmp_path, 'calificar').tomar()
+        # Otro fragmento del mismo reparto y otro programa sí pueden ejecutarse
+        with BloqueoFragmento(tmp_path, 'calificar', (2, 2)), BloqueoFragmento(tmp_path, 'transcribir'):
+            pass
+    assert list((tmp_path / BLOQUEOS_DIRNAME).iterdir()) == []
+
+
+def test_bloqueo_abandonado_en_esta_maquina_se_retira(tmp_path):
+    proceso = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                             capture_output=True, text=True, check=True)
+    bloqueo = BloqueoFragmento(tmp_path, 'calificar')
+    bloqueo.directorio.mkdir()
+    bloqueo.ruta.write_text(json.dumps({'host': bloqueo.host, 'pid': int(proceso.stdout),
+                                        'fragmento': [1, 1]}))
+    with bloqueo:
+        assert json.loads(bloqueo.ruta.read_text())['pid'] != int(proceso.stdout)
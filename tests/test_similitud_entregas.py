@@ -0,0 +1,87 @@
+"""Pruebas de las firmas MinHash y la búsqueda de pares con LSH"""
+
+import random
+
+import numpy as np
+
+from similitud_entregas import (
+    MARGEN_LSH, NUM_PERMUTACIONES, IndiceSimilitud, agrupar_pares, firma_minhash,
+    fragmentos, palabras_normalizadas, parametros_lsh, similitud_estimada
+)
+
+
+def texto_aleatorio(semilla, n_palabras=400):
+    rng = random.Random(semilla)
+    return [f"p{rng.randrange(5000)}" for _ in range(n_palabras)]
+
+
+def jaccard(a, b):
+    a, b = set(a.tolist()), set(b.tolist())
+    return len(a & b) / len(a | b)
+
+
+def firma(palabras):
+    return firma_minhash(fragmentos(palabras))
+
+
+def test_palabras_sin_acentos_ni_mayusculas():
+    assert palabras_normalizadas("Función ÓPTIMA, año 2024!") == ['funcion', 'optima', 'ano', '2024']
+
+
+def test_firma_es_determinista():
+    palabras = texto_aleatorio(1)
+    assert np.array_equal(firma(palabras), firma(list(palabras)))
+    assert similitud_estimada(firma(palabras), firma(palabras)) == 1.0
+
+
+def test_similitud_estimada_aproxima_jaccard():
+    original = texto_aleatorio(1)
+    copia = list(original)
+    copia[100:160] = texto_aleatorio(2, 60)  # Se reescribe un párrafo
+
+    real = jaccard(fragmentos(original), fragmentos(copia))
+    estimada = similitud_estimada(firma(original), firma(copia))
+    # Error estándar de MinHash: sqrt(J(1-J)/k) ≈ 0.03 con 128 permutaciones
+    assert abs(estimada - real) < 0.12
+
+
+def test_textos_distintos_no_se_parecen():
+    assert similitud_estimada(firma(texto_aleatorio(1)), firma(texto_aleatorio(2))) < 0.1
+
+
+def test_parametros_lsh_quedan_por_debajo_del_umbral():
+    for umbral in (0.5, 0.7, 0.8, 0.9):
+        bandas, filas = parametros_lsh(umbral)
+        assert bandas * filas <= NUM_PERMUTACIONES
+        assert (1 / bandas) ** (1 / filas) <= umbral - MARGEN_LSH
+
+
+def test_agrupar_pares_une_componentes():
+    pares = [('a', 'b', 0.9), ('b', 'c', 0.85), ('x', 'y', 0.95)]
+    assert agrupar_pares(pares) == [['a', 'b', 'c'], ['x', 'y']]
+
+
+def test_pares_encuentra_solo_las_copias(tmp_path):
+    indice = IndiceSimilitud(tmp_path)
+    original = texto_aleatorio(1)
+    casi_igual = list(original)
+    casi_igual[200] = 'cambio'
+    entradas = indice.entradas('T1')
+    for ident, palabras in [('ana', original), ('beto', casi_igual),
+                            ('carla', texto_aleatorio(3)), ('dora', texto_aleatorio(4))]:
+        entradas[ident] = {'firma': firma(palabras).tolist()}
+    entradas['eva'] = {'firma': None}
+
+    pares = indice.pares('T1')
+    assert [(a, b) for a, b, _ in pares] in ([('ana', 'beto')], [('beto', 'ana')])
+    assert pares[0][2] >= 0.8
+    assert indice.sin_firma('T1') == 1
+
+
+def test_indice_con_otros_parametros_se_reconstruye(tmp_path):
+    indice = IndiceSimilitud(tmp_path)
+    indice.entradas('T1')['ana'] = {'firma': [1, 2, 3]}
+    indice.guardar('T1')
+
+    assert IndiceSimilitud(tmp_path).entradas('T1') == {'ana': {'firma': [1, 2, 3]}}
+    assert IndiceSimilitud(tmp_path, num_permutaciones=64).entradas('T1') == {}
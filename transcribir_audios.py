@@ -5,36 +5,105 @@ Este script busca todos los archivos Cal_*.mp3 en las carpetas de tareas,
 los transcribe usando Whisper (modelo medium) y guarda las transcripciones
 en formato JSON con metadata.
 
+El motor se elige con BACKEND_TRANSCRIPCION (o --backend): openai-whisper,
+openai-whisper cuantizado a int8 o faster-whisper (CTranslate2, int8). Ver
+backends_transcripcion.py; el formato de la transcripción es el mismo con
+cualquiera de ellos.
+
 Uso:
     python transcribir_audios.py
-
-El script procesará todos los audios que no tengan transcripción aún.
+    python transcribir_audios.py --grupo 8A --si
+    python transcribir_audios.py --fragmento 1/3 --si    (máquina 1 de 3)
+
+El script procesará todos los audios que no tengan transcripción aún. Acepta
+los mismos argumentos que calificar_gemini.py para filtrar, limitar, omitir la
+confirmación y repartir los audios entre varias máquinas (reparto_trabajo.py).
+
+Con PROCESOS_WHISPER > 1 (o --procesos N) los audios se transcriben en un pool de
+procesos: cada proceso carga su propio modelo y usa una parte de los núcleos
+(hilos de torch o de CTranslate2), y cada transcripción se guarda en cuanto
+termina. Los audios más largos se envían primero para que ningún proceso se
+quede al final con el audio más pesado. Cada proceso ocupa la memoria de un
+modelo completo (~2-3 GB con medium).
+
+Antes de transcribir se quitan los silencios largos de la grabación
+(deteccion_voz.py): el modelo solo decodifica las regiones con voz y los
+tiempos de los segmentos se traducen a los de la grabación original. Se
+desactiva con DETECTAR_VOZ = False o --sin-vad.
+
+Si el servicio de transcripción (servicio_transcripcion.py) está corriendo, los
+audios se le envían a él, que ya tiene el modelo cargado; si no responde, el
+modelo se carga en este proceso. Si deja de responder a media ejecución, los
+audios que no atendió se transcriben también en este proceso.
+
+Caché de transcripciones: cada transcripción se guarda también en
+CACHE_TRANSCRIPCIONES_DIR con dos claves, el hash del archivo y el hash del
+audio decodificado, ambas junto con el backend, el modelo, el idioma y si se
+usó detección de voz. Un audio que reaparece en otra carpeta (las copias de
+return_all_feedback en la carpeta Calificado de cada integrante del equipo, un
+audio copiado o regrabado idéntico) se resuelve de la caché sin cargar el
+modelo; si solo cambia el contenedor (otro MP3 con el mismo audio) basta
+decodificarlo. Se desactiva con USAR_CACHE = False o --sin-cache.
 """
 
+import argparse
+import hashlib
 import json
+import os
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Optional
-import whisper
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from backends_transcripcion import (BACKENDS, FRECUENCIA_MUESTREO, BackendTranscripcion,
+                                    crear_backend_transcripcion, nombre_backend)
+from cache_contenido import CacheContenido, calcular_clave, hash_archivo
+from deteccion_voz import recortar_silencios, reubicar_segmentos
+from manifiesto_archivos import ManifiestoArchivos
+from servicio_transcripcion import URL_SERVICIO, ClienteTranscripcion, ServicioNoDisponible
+from reparto_trabajo import BloqueoFragmento, ErrorBloqueo, agregar_argumentos, confirmar, seleccionar_pendientes
 
 
 # Configuración
 CALIFICAR_ROOT = Path(r"D:\tareas\Calificar")
 WHISPER_MODEL = "medium"  # Opciones: tiny, base, small, medium, large
+BACKEND_TRANSCRIPCION = "auto"  # auto, whisper, whisper_int8, faster_whisper
+DETECTAR_VOZ = True  # Transcribir solo las regiones con voz (deteccion_voz.py)
+USAR_SERVICIO = True  # Enviar los audios al servicio de transcripción si está corriendo
 AUDIO_EXTENSIONS = ['.mp3', '.wav', '.m4a']
+PROCESOS_WHISPER = max(1, min(4, (os.cpu_count() or 1) // 4))  # Procesos con su propio modelo (1 = sin pool)
+HILOS_POR_PROCESO = None  # Hilos de cómputo por proceso (None: núcleos / procesos)
+IDIOMA = 'es'  # Idioma de las grabaciones (se pasa al modelo y forma parte de la clave de la caché)
 
+# Caché de transcripciones por contenido del audio
+USAR_CACHE = True
+CACHE_TRANSCRIPCIONES_DIR = Path(__file__).parent / "cache" / "transcripciones"
+CACHE_TRANSCRIPCIONES_MAX_MB = 100  # Desalojo LRU al superar el límite
+VERSION_CACHE_TRANSCRIPCION = "1"  # Cambiarla invalida las transcripciones guardadas
 
-def cargar_modelo_whisper(model_name: str = WHISPER_MODEL):
+# Campos que dependen solo del audio; el resto se toma del archivo donde aparece
+CAMPOS_CACHEABLES = ['transcripcion', 'duracion_segundos', 'idioma_detectado',
+                     'duracion_voz_segundos', 'segmentos']
+
+_modelo_trabajador = None  # Modelo de cada proceso del pool
+_cache_trabajador = None  # Caché de transcripciones de cada proceso del pool
+
+
+def cargar_modelo_whisper(model_name: str = WHISPER_MODEL, backend: str = BACKEND_TRANSCRIPCION,
+                          hilos: Optional[int] = None) -> BackendTranscripcion:
     """
-    Carga el modelo de Whisper.
+    Carga el modelo de Whisper en el backend indicado.
     La primera vez descargará el modelo (puede tardar varios minutos).
     """
     print(f"\n[+] Cargando modelo Whisper '{model_name}'...")
     print("    (Esto puede tardar unos minutos la primera vez)")
 
     try:
-        model = whisper.load_model(model_name)
-        print(f"[✓] Modelo '{model_name}' cargado exitosamente")
+        model = crear_backend_transcripcion(backend, model_name, hilos)
+        print(f"[✓] Modelo '{model_name}' cargado exitosamente ({model.nombre})")
         return model
     except Exception as e:
         print(f"[!] Error al cargar el modelo: {e}")
@@ -43,6 +112,65 @@ def cargar_modelo_whisper(model_name: str = WHISPER_MODEL):
         raise
 
 
+def cache_transcripciones(usar: bool = USAR_CACHE) -> Optional[CacheContenido]:
+    """Caché de transcripciones configurada, o None si está desactivada"""
+    if not usar:
+        return None
+    return CacheContenido(CACHE_TRANSCRIPCIONES_DIR, CACHE_TRANSCRIPCIONES_MAX_MB * 1024 * 1024)
+
+
+def clave_transcripcion(huella: str, nombre_modelo: str, vad: bool) -> str:
+    """
+    Clave de caché de una transcripción. huella es 'archivo:<sha256 del archivo>'
+    o 'audio:<sha256 del audio decodificado>'; nombre_modelo es el nombre del
+    backend (p. ej. "faster_whisper/medium/int8").
+    """
+    return calcular_clave('transcripcion', VERSION_CACHE_TRANSCRIPCION, huella,
+                          nombre_modelo, IDIOMA, 'vad' if vad else 'completo')
+
+
+def huella_archivo(audio_path: Path) -> str:
+    return f"archivo:{hash_archivo(audio_path)}"
+
+
+def huella_audio(audio) -> str:
+    """Huella del audio decodificado: no cambia con la etiqueta ni el contenedor"""
+    muestras = np.ascontiguousarray(audio, dtype=np.float32)
+    return f"audio:{hashlib.sha256(memoryview(muestras).cast('B')).hexdigest()}"
+
+
+def transcripcion_desde_cache(audio_path: Path, contenido: Dict, inicio: float) -> Dict:
+    """transcripcion_data de un audio a partir del contenido guardado en la caché"""
+    return {
+        'alumno': extraer_nombre_alumno(audio_path.name),
+        'tarea': audio_path.parent.name,
+        'audio_file': audio_path.name,
+        **{campo: contenido[campo] for campo in CAMPOS_CACHEABLES},
+        'tiempo_procesamiento': round(time.time() - inicio, 2)
+    }
+
+
+def _leer_cache(cache: CacheContenido, clave: str) -> Optional[Dict]:
+    """Contenido guardado para la clave, o None si no existe o le faltan campos"""
+    contenido = cache.obtener(clave)
+    if contenido is None or any(campo not in contenido for campo in CAMPOS_CACHEABLES):
+        return None
+    return contenido
+
+
+def buscar_en_cache(cache: Optional[CacheContenido], audio_path: Path,
+                    nombre_modelo: str, vad: bool) -> Optional[Dict]:
+    """transcripcion_data si el mismo archivo ya se transcribió con esta configuración"""
+    if cache is None:
+        return None
+    inicio = time.time()
+    try:
+        contenido = _leer_cache(cache, clave_transcripcion(huella_archivo(audio_path), nombre_modelo, vad))
+    except OSError:
+        return None
+    return transcripcion_desde_cache(audio_path, contenido, inicio) if contenido else None
+
+
 def buscar_audios_sin_transcribir(root_dir: Path) -> List[Dict]:
     """
     Busca todos los archivos Cal_*.mp3 que no tengan transcripción.
@@ -56,40 +184,36 @@ def buscar_audios_sin_transcribir(root_dir: Path) -> List[Dict]:
         print(f"[!] No existe el directorio: {root_dir}")
         return []
 
-    # Recorrer todas las carpetas de grupos y tareas
-    for grupo_dir in root_dir.iterdir():
-        if not grupo_dir.is_dir():
-            continue
+    # Solo se vuelven a listar las carpetas de tarea que cambiaron desde la última búsqueda
+    manifiesto = ManifiestoArchivos(root_dir)
+    revision = manifiesto.actualizar()
+    print(f"    Carpetas de tarea: {revision['carpetas']} ({revision['escaneadas']} con cambios)")
 
-        for tarea_dir in grupo_dir.iterdir():
-            if not tarea_dir.is_dir():
-                continue
-
-            # Buscar archivos de audio con prefijo "Cal_"
-            for ext in AUDIO_EXTENSIONS:
-                for audio_file in tarea_dir.glob(f"Cal_*{ext}"):
-                    # Verificar si ya existe la transcripción
-                    json_file = audio_file.with_suffix('.json')
-                    transcripcion_file = audio_file.parent / f"{audio_file.stem}_transcripcion.json"
+    for grupo, tarea, archivo, audio_file, _ in manifiesto.archivos(['audio_pendiente']):
+        if audio_file.suffix.lower() not in AUDIO_EXTENSIONS:
+            continue
 
-                    if json_file.exists() or transcripcion_file.exists():
-                        continue  # Ya tiene transcripción
+        # Agregar a la lista de pendientes
+        audios_pendientes.append({
+            'ruta': audio_file,
+            'grupo': grupo,
+            'tarea': tarea,
+            'archivo': archivo
+        })
 
-                    # Agregar a la lista de pendientes
-                    audios_pendientes.append({
-                        'ruta': audio_file,
-                        'grupo': grupo_dir.name,
-                        'tarea': tarea_dir.name,
-                        'archivo': audio_file.name
-                    })
+    audios_pendientes.sort(key=lambda a: (a['grupo'], a['tarea'], a['archivo']))
 
     print(f"[+] Se encontraron {len(audios_pendientes)} audios sin transcribir")
     return audios_pendientes
 
 
-def transcribir_audio(model, audio_path: Path, verbose: bool = False) -> Dict:
+def transcribir_audio(model: BackendTranscripcion, audio_path: Path, verbose: bool = False,
+                      vad: bool = DETECTAR_VOZ, cache: Optional[CacheContenido] = None) -> Dict:
     """
     Transcribe un archivo de audio usando Whisper.
+    Con vad, solo se transcriben las regiones con voz. Con cache, un audio
+    ya transcrito (mismo archivo o mismo audio decodificado) no se vuelve a
+    transcribir.
     Retorna diccionario con la transcripción y metadata.
     """
     print(f"\n[→] Transcribiendo: {audio_path.name}")
@@ -98,12 +222,36 @@ def transcribir_audio(model, audio_path: Path, verbose: bool = False) -> Dict:
         # Transcribir con Whisper
         inicio = time.time()
 
-        result = model.transcribe(
-            str(audio_path),
-            language='es',  # Español
-            verbose=verbose,
-            fp16=False  # Desactivar fp16 para compatibilidad con CPU
-        )
+        claves = []
+        if cache is not None:
+            claves.append(clave_transcripcion(huella_archivo(audio_path), model.nombre, vad))
+            contenido = _leer_cache(cache, claves[0])
+            if contenido is not None:
+                print("[✓] Transcripción tomada de la caché (mismo archivo)")
+                return transcripcion_desde_cache(audio_path, contenido, inicio)
+
+        audio = model.cargar_audio(audio_path)
+        duracion_audio = len(audio) / FRECUENCIA_MUESTREO
+
+        if cache is not None:
+            claves.append(clave_transcripcion(huella_audio(audio), model.nombre, vad))
+            contenido = _leer_cache(cache, claves[1])
+            if contenido is not None:
+                cache.guardar(claves[0], contenido)  # La próxima vez sin decodificar
+                print("[✓] Transcripción tomada de la caché (mismo audio)")
+                return transcripcion_desde_cache(audio_path, contenido, inicio)
+
+        recorte = recortar_silencios(audio, FRECUENCIA_MUESTREO) if vad else None
+
+        if recorte is None:
+            # Poco silencio o ninguna voz detectada: se transcribe la grabación completa
+            result = model.transcribir(audio, IDIOMA, verbose)
+            segmentos = result.get('segments', [])
+            duracion_voz = duracion_audio
+        else:
+            result = model.transcribir(recorte['pista'], IDIOMA, verbose)
+            segmentos = reubicar_segmentos(result.get('segments', []), recorte['mapa'])
+            duracion_voz = recorte['duracion_voz']
 
         duracion = time.time() - inicio
 
@@ -113,13 +261,26 @@ def transcribir_audio(model, audio_path: Path, verbose: bool = False) -> Dict:
             'tarea': audio_path.parent.name,
             'audio_file': audio_path.name,
             'transcripcion': result['text'].strip(),
-            'duracion_segundos': round(result.get('duration', 0), 2),
-            'idioma_detectado': result.get('language', 'es'),
-            'tiempo_procesamiento': round(duracion, 2)
+            'duracion_segundos': round(duracion_audio, 2),
+            'idioma_detectado': result.get('language', IDIOMA),
+            'tiempo_procesamiento': round(duracion, 2),
+            'duracion_voz_segundos': round(duracion_voz, 2),
+            # Tiempos respecto a la grabación original
+            'segmentos': [
+                {'inicio': round(s['start'], 2), 'fin': round(s['end'], 2), 'texto': s['text'].strip()}
+                for s in segmentos
+            ]
         }
 
+        if claves:
+            contenido = {campo: transcripcion_data[campo] for campo in CAMPOS_CACHEABLES}
+            for clave in claves:
+                cache.guardar(clave, contenido)
+
         print(f"[✓] Transcripción completada en {duracion:.1f}s")
         print(f"    Duración del audio: {transcripcion_data['duracion_segundos']}s")
+        if recorte is not None:
+            print(f"    Voz detectada: {transcripcion_data['duracion_voz_segundos']}s (el resto era silencio)")
         print(f"    Texto ({len(transcripcion_data['transcripcion'])} caracteres): "
               f"{transcripcion_data['transcripcion'][:100]}...")
 
@@ -178,33 +339,175 @@ def guardar_transcripcion(audio_path: Path, transcripcion_data: Dict):
         return False
 
 
-def mostrar_resumen(total: int, exitosos: int, fallidos: int, saltados: int, tiempo_total: float):
+def _inicializar_trabajador(model_name: str, backend: str, hilos: int, usar_cache: bool = USAR_CACHE) -> None:
+    """Carga el modelo una vez por proceso del pool, con su parte de los núcleos"""
+    global _modelo_trabajador, _cache_trabajador
+    _modelo_trabajador = cargar_modelo_whisper(model_name, backend, hilos)
+    _cache_trabajador = cache_transcripciones(usar_cache)
+
+
+def _transcribir_en_trabajador(audio_path: Path, vad: bool) -> Optional[Dict]:
+    return transcribir_audio(_modelo_trabajador, audio_path, vad=vad, cache=_cache_trabajador)
+
+
+def nombre_modelo_trabajador() -> str:
+    """Backend y modelo cargados en este proceso del pool"""
+    return _modelo_trabajador.nombre
+
+
+def transcribir_en_serie(audios: List[Dict], model_name: str = WHISPER_MODEL,
+                         backend: str = BACKEND_TRANSCRIPCION, vad: bool = DETECTAR_VOZ,
+                         usar_cache: bool = USAR_CACHE) -> Iterator[Tuple[Dict, Optional[Dict]]]:
+    """Transcribe los audios uno por uno con un solo modelo: (audio_info, transcripcion_data)"""
+    model = cargar_modelo_whisper(model_name, backend)
+    cache = cache_transcripciones(usar_cache)
+    for audio_info in audios:
+        yield audio_info, transcribir_audio(model, audio_info['ruta'], vad=vad, cache=cache)
+
+
+def transcribir_en_paralelo(audios: List[Dict], procesos: int, model_name: str = WHISPER_MODEL,
+                            backend: str = BACKEND_TRANSCRIPCION, vad: bool = DETECTAR_VOZ,
+                            hilos: Optional[int] = HILOS_POR_PROCESO,
+                            usar_cache: bool = USAR_CACHE) -> Iterator[Tuple[Dict, Optional[Dict]]]:
+    """
+    Transcribe los audios en un pool de procesos, cada uno con su modelo.
+    Produce (audio_info, transcripcion_data) en el orden en que terminan.
+    """
+    hilos = hilos or max(1, (os.cpu_count() or 1) // procesos)
+    print(f"\n[+] {procesos} procesos de Whisper con {hilos} hilos cada uno")
+
+    def tamano(audio_info: Dict) -> int:
+        try:
+            return audio_info['ruta'].stat().st_size
+        except OSError:
+            return 0
+
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_trabajador,
+                             initargs=(model_name, backend, hilos, usar_cache)) as executor:
+        futuros = {
+            executor.submit(_transcribir_en_trabajador, audio_info['ruta'], vad): audio_info
+            for audio_info in sorted(audios, key=tamano, reverse=True)
+        }
+        for futuro in as_completed(futuros):
+            audio_info = futuros[futuro]
+            try:
+                yield audio_info, futuro.result()
+            except Exception as e:
+                # Incluye BrokenProcessPool si un proceso no pudo cargar el modelo
+                print(f"[!] Error al transcribir {audio_info['archivo']}: {e}")
+                yield audio_info, None
+
+
+def transcribir_localmente(audios: List[Dict], procesos: int, model_name: str = WHISPER_MODEL,
+                           backend: str = BACKEND_TRANSCRIPCION, vad: bool = DETECTAR_VOZ,
+                           usar_cache: bool = USAR_CACHE) -> Iterator[Tuple[Dict, Optional[Dict]]]:
+    """Transcribe con modelos cargados en este proceso: en un pool si procesos > 1"""
+    # Más procesos que audios solo cargaría modelos de sobra
+    procesos = max(1, min(procesos, len(audios)))
+    if procesos > 1:
+        return transcribir_en_paralelo(audios, procesos, model_name, backend, vad, usar_cache=usar_cache)
+    return transcribir_en_serie(audios, model_name, backend, vad, usar_cache)
+
+
+def transcribir_con_servicio(audios: List[Dict], cliente: ClienteTranscripcion, procesos: int,
+                             vad: bool = DETECTAR_VOZ,
+                             respaldo: Optional[Callable[[List[Dict]], Iterator[Tuple[Dict, Optional[Dict]]]]] = None
+                             ) -> Iterator[Tuple[Dict, Optional[Dict]]]:
+    """
+    Envía los audios al servicio de transcripción, hasta procesos a la vez.
+    Produce (audio_info, transcripcion_data) en el orden en que terminan.
+    Si el servicio deja de responder, los audios que no atendió se transcriben
+    con respaldo(audios) (por ejemplo transcribir_localmente).
+    """
+    caido = threading.Event()
+
+    def enviar(audio_info: Dict) -> Optional[Dict]:
+        if caido.is_set():
+            raise ServicioNoDisponible("el servicio dejó de responder")
+        try:
+            return cliente.transcribir(audio_info['ruta'], vad)
+        except ServicioNoDisponible:
+            caido.set()  # Los audios que aún no se enviaron no esperan al servicio
+            raise
+
+    sin_atender = []
+    with ThreadPoolExecutor(max_workers=max(1, procesos)) as executor:
+        futuros = {executor.submit(enviar, audio_info): audio_info for audio_info in audios}
+        for futuro in as_completed(futuros):
+            try:
+                yield futuros[futuro], futuro.result()
+            except ServicioNoDisponible as e:
+                if not sin_atender:
+                    print(f"\n[!] El servicio de transcripción dejó de responder: {e}")
+                sin_atender.append(futuros[futuro])
+
+    if not sin_atender:
+        return
+    if respaldo is None:
+        for audio_info in sin_atender:
+            yield audio_info, None
+        return
+    print(f"\n[+] {len(sin_atender)} audios se transcriben en este proceso")
+    yield from respaldo(sin_atender)
+
+
+def mostrar_resumen(total: int, exitosos: int, fallidos: int, saltados: int, tiempo_total: float,
+                    desde_cache: int = 0):
     """Muestra un resumen del proceso de transcripción"""
     print("\n" + "="*60)
     print("RESUMEN DE TRANSCRIPCIONES")
     print("="*60)
     print(f"Total de audios procesados: {total}")
     print(f"Transcripciones exitosas: {exitosos}")
+    if desde_cache:
+        print(f"  De la caché (sin transcribir): {desde_cache}")
     print(f"Errores: {fallidos}")
     print(f"Saltados (ya transcritos): {saltados}")
     print(f"Tiempo total: {tiempo_total/60:.1f} minutos")
 
-    if exitosos > 0:
-        print(f"Tiempo promedio por audio: {tiempo_total/exitosos:.1f} segundos")
+    transcritos = exitosos - desde_cache
+    if transcritos > 0:
+        print(f"Tiempo promedio por audio: {tiempo_total/transcritos:.1f} segundos")
 
     print("="*60)
 
 
-def main():
+def leer_argumentos(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Argumentos de línea de comandos (ver reparto_trabajo.py)"""
+    parser = argparse.ArgumentParser(description="Transcripción de audios con Whisper (Fase 2)")
+    agregar_argumentos(parser, CALIFICAR_ROOT, "audios")
+    parser.add_argument('--procesos', type=int, default=PROCESOS_WHISPER,
+                        help=f"Procesos de Whisper, cada uno con su modelo (por defecto {PROCESOS_WHISPER})")
+    parser.add_argument('--backend', choices=BACKENDS, default=BACKEND_TRANSCRIPCION,
+                        help=f"Motor de transcripción (por defecto {BACKEND_TRANSCRIPCION})")
+    parser.add_argument('--sin-vad', dest='vad', action='store_false', default=DETECTAR_VOZ,
+                        help="Transcribir la grabación completa, sin quitar silencios")
+    parser.add_argument('--servicio', default=URL_SERVICIO,
+                        help=f"URL del servicio de transcripción (por defecto {URL_SERVICIO})")
+    parser.add_argument('--sin-servicio', dest='usar_servicio', action='store_false', default=USAR_SERVICIO,
+                        help="Cargar el modelo en este proceso aunque el servicio esté corriendo")
+    parser.add_argument('--sin-cache', dest='usar_cache', action='store_false', default=USAR_CACHE,
+                        help="Transcribir aunque el audio ya esté en la caché de transcripciones")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
     """Función principal"""
+    args = leer_argumentos(argv)
+
     print("="*60)
     print("TRANSCRIPCIÓN DE AUDIOS CON WHISPER")
     print("Sistema de Calificación Automática - Fase 2")
     print("="*60)
 
+    bloqueo = BloqueoFragmento(args.raiz, 'transcribir', args.fragmento)
     try:
+        # Ninguna otra ejecución (en esta u otra máquina) toma los mismos audios
+        bloqueo.tomar()
+
         # Buscar audios sin transcribir
-        audios_pendientes = buscar_audios_sin_transcribir(CALIFICAR_ROOT)
+        audios_pendientes = buscar_audios_sin_transcribir(args.raiz)
+        audios_pendientes = seleccionar_pendientes(audios_pendientes, args)
 
         if not audios_pendientes:
             print("\n[+] No hay audios pendientes de transcribir")
@@ -224,14 +527,10 @@ def main():
         print(f"\n[!] Se procesarán {len(audios_pendientes)} audios")
         print("    Esto puede tomar varios minutos dependiendo de la duración de los audios")
 
-        confirmar = input("\n¿Continuar con la transcripción? (s/n): ").strip().lower()
-        if confirmar not in ['s', 'si', 'sí', 'y', 'yes']:
+        if not confirmar(args, "¿Continuar con la transcripción?"):
             print("\n[!] Proceso cancelado por el usuario")
             return 1
 
-        # Cargar modelo de Whisper
-        model = cargar_modelo_whisper(WHISPER_MODEL)
-
         # Procesar cada audio
         print("\n" + "="*60)
         print("INICIANDO TRANSCRIPCIONES")
@@ -240,16 +539,49 @@ def main():
         estadisticas = {
             'exitosos': 0,
             'fallidos': 0,
-            'saltados': 0
+            'saltados': 0,
+            'desde_cache': 0
         }
 
         inicio_total = time.time()
 
-        for i, audio_info in enumerate(audios_pendientes, 1):
-            print(f"\n[{i}/{len(audios_pendientes)}] Procesando: {audio_info['archivo']}")
-
-            # Transcribir
-            transcripcion_data = transcribir_audio(model, audio_info['ruta'])
+        # El servicio ya tiene el modelo cargado; si no está corriendo se carga aquí
+        cliente = ClienteTranscripcion(args.servicio)
+        estado = cliente.estado() if args.usar_servicio else None
+        nombre_modelo = estado['modelo'] if estado else nombre_backend(args.backend, WHISPER_MODEL)
+
+        # Los audios que ya están en la caché se guardan sin cargar ningún modelo
+        cache = cache_transcripciones(args.usar_cache)
+        por_transcribir = []
+        for audio_info in audios_pendientes:
+            transcripcion_data = buscar_en_cache(cache, audio_info['ruta'], nombre_modelo, args.vad)
+            if transcripcion_data is None:
+                por_transcribir.append(audio_info)
+            elif guardar_transcripcion(audio_info['ruta'], transcripcion_data):
+                estadisticas['exitosos'] += 1
+                estadisticas['desde_cache'] += 1
+            else:
+                estadisticas['fallidos'] += 1
+        if estadisticas['desde_cache']:
+            print(f"\n[✓] {estadisticas['desde_cache']} audios tomados de la caché de transcripciones")
+
+        def localmente(audios: List[Dict]) -> Iterator[Tuple[Dict, Optional[Dict]]]:
+            return transcribir_localmente(audios, args.procesos, WHISPER_MODEL, args.backend,
+                                          args.vad, args.usar_cache)
+
+        if not por_transcribir:
+            resultados = iter(())
+        elif estado:
+            print(f"\n[+] Usando el servicio de transcripción: {estado['modelo']} "
+                  f"({estado['procesos']} procesos)")
+            resultados = transcribir_con_servicio(por_transcribir, cliente, estado['procesos'], args.vad,
+                                                  respaldo=localmente)
+        else:
+            resultados = localmente(por_transcribir)
+
+        # Cada transcripción se guarda en cuanto termina
+        for i, (audio_info, transcripcion_data) in enumerate(resultados, 1):
+            print(f"\n[{i}/{len(por_transcribir)}] Terminado: {audio_info['archivo']}")
 
             if transcripcion_data:
                 # Guardar transcripción
@@ -260,10 +592,6 @@ def main():
             else:
                 estadisticas['fallidos'] += 1
 
-            # Pequeña pausa entre transcripciones
-            if i < len(audios_pendientes):
-                time.sleep(0.5)
-
         tiempo_total = time.time() - inicio_total
 
         # Mostrar resumen
@@ -272,18 +600,24 @@ def main():
             estadisticas['exitosos'],
             estadisticas['fallidos'],
             estadisticas['saltados'],
-            tiempo_total
+            tiempo_total,
+            estadisticas['desde_cache']
         )
 
         print("\n✓ Proceso de transcripción completado")
         print("\nPróximo paso:")
         print("  Ejecuta calificar_gemini.py para calificar las tareas con IA")
 
+    except ErrorBloqueo as e:
+        print(f"\n[!] {e}")
+        return 1
     except Exception as e:
         print(f"\n[!] Error: {e}")
         import traceback
         traceback.print_exc()
         return 1
+    finally:
+        bloqueo.liberar()
 
     return 0
 
@@ -0,0 +1,370 @@
+"""
+Modo vigilancia: calificación continua con Gemini
+
+En lugar de ejecutar calificar_gemini.py y confirmar a mano, este script se
+queda corriendo, vigila CALIFICAR_ROOT y envía al pipeline de calificación:
+- cada PDF nuevo de un alumno, en cuanto termina de escribirse
+- cada Cal_<nombre>_transcripcion.json nuevo (recalifica el PDF correspondiente
+  con las observaciones del profesor)
+
+Así la calificación llega minutos después de que el profesor termina de grabar.
+
+Un PDF que tiene audio Cal_<nombre>.mp3 sin transcribir se deja en espera hasta
+que aparezca su transcripción, para no calificarlo dos veces.
+
+Eventos del sistema de archivos:
+- Con watchdog instalado (pip install watchdog) se usan los eventos nativos
+  (inotify en Linux, ReadDirectoryChangesW en Windows).
+- Sin watchdog se revisa la carpeta cada INTERVALO_SONDEO segundos con el
+  manifiesto incremental (manifiesto_archivos.py).
+
+Archivos a medias: un archivo se procesa cuando lleva ESPERA_ESTABLE_SEGUNDOS
+sin eventos y sin cambiar de tamaño ni fecha; los PDFs además deben terminar con
+%%EOF y las transcripciones deben ser JSON válido.
+
+Mientras corre, el modo vigilancia toma el bloqueo de calificación de la carpeta
+(reparto_trabajo.py), así que no convive con otra ejecución de calificar_gemini.py.
+
+Uso:
+    python vigilar_tareas.py        (Ctrl+C para detener)
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_DISPONIBLE = True
+except ImportError:
+    WATCHDOG_DISPONIBLE = False
+
+from bitacora_calificacion import BitacoraCalificacion, clave_entrega
+from cache_contenido import CacheContenido
+from calificar_gemini import (
+    CACHE_DIR, CACHE_MAX_MB, CALIFICAR_ROOT, buscar_pdfs_sin_calificar,
+    cargar_credenciales, conectar_db, configurar_backend, crear_pipeline,
+    crear_registro_rubricas, crear_telemetria
+)
+from manifiesto_archivos import ManifiestoArchivos
+from persistencia_calificaciones import RepositorioCalificaciones
+from reparto_trabajo import BloqueoFragmento, ErrorBloqueo
+
+
+# Configuración
+ESPERA_ESTABLE_SEGUNDOS = 5.0  # Sin eventos ni cambios de tamaño antes de procesar
+INTERVALO_SONDEO = 10.0        # Sin watchdog: cada cuánto revisar la carpeta
+SUFIJO_TRANSCRIPCION = "_transcripcion.json"
+
+
+def pdf_de_evento(ruta: Path) -> Optional[Tuple[Path, str]]:
+    """
+    PDF a calificar por un cambio en ruta, y el motivo ('pdf' o 'transcripcion').
+    Retorna None si el archivo no interesa.
+    """
+    nombre = ruta.name
+    if nombre.startswith('.') or any(p.startswith('.') for p in ruta.parent.parts[-2:]):
+        return None  # Bitácora, manifiesto, portadas temporales
+
+    if ruta.suffix.lower() == '.pdf' and not nombre.startswith("Cal_"):
+        return ruta, 'pdf'
+
+    # Cal_<nombre>_transcripcion.json -> <nombre>.pdf
+    if nombre.startswith("Cal_") and nombre.endswith(SUFIJO_TRANSCRIPCION):
+        base = nombre[len("Cal_"):-len(SUFIJO_TRANSCRIPCION)]
+        return ruta.parent / f"{base}.pdf", 'transcripcion'
+
+    return None
+
+
+def archivo_completo(ruta: Path) -> bool:
+    """Comprueba que un PDF o JSON no esté a medio escribir"""
+    try:
+        if ruta.suffix.lower() == '.pdf':
+            with open(ruta, 'rb') as f:
+                f.seek(max(0, ruta.stat().st_size - 1024))
+                return b'%%EOF' in f.read()
+        with open(ruta, 'r', encoding='utf-8') as f:
+            json.load(f)
+        return True
+    except (OSError, ValueError):
+        return False  # Bloqueado por otro proceso o incompleto
+
+
+def tiene_audio_sin_transcribir(pdf_path: Path) -> bool:
+    """True si existe Cal_<nombre>.<audio> pero todavía no su transcripción"""
+    prefijo = f"Cal_{pdf_path.stem}."
+    try:
+        nombres = os.listdir(pdf_path.parent)
+    except OSError:
+        return False
+
+    audios = [n for n in nombres
+              if n.startswith(prefijo) and Path(n).suffix.lower() not in ('.pdf', '.json', '.tmp')]
+    if not audios:
+        return False
+    return f"Cal_{pdf_path.stem}{SUFIJO_TRANSCRIPCION}" not in nombres
+
+
+class VigilanteTareas:
+    """
+    Agrupa los eventos por PDF y lo entrega a encolar(pdf_info) cuando sus
+    archivos dejaron de cambiar. Los eventos pueden llegar desde cualquier hilo.
+    """
+
+    def __init__(self, root_dir: Path, encolar: Callable[[Dict], bool],
+                 espera: float = ESPERA_ESTABLE_SEGUNDOS):
+        self.root_dir = Path(root_dir)
+        self.encolar = encolar
+        self.espera = espera
+        self._eventos: queue.Queue = queue.Queue()
+        # pdf -> {'motivo', 'archivo', 'ultimo_evento', 'firma'}
+        self._candidatos: Dict[Path, Dict] = {}
+
+    def notificar(self, ruta: Path) -> None:
+        """Registra que ruta se creó o cambió"""
+        self._eventos.put((Path(ruta), time.monotonic()))
+
+    def _recibir_eventos(self) -> None:
+        while True:
+            try:
+                ruta, momento = self._eventos.get_nowait()
+            except queue.Empty:
+                return
+
+            destino = pdf_de_evento(ruta)
+            if destino is None:
+                continue
+            pdf_path, motivo = destino
+
+            candidato = self._candidatos.setdefault(pdf_path, {'motivo': motivo, 'firma': None})
+            if motivo == 'transcripcion':
+                candidato['motivo'] = motivo  # La transcripción manda: hay que recalificar
+            candidato['archivo'] = ruta
+            candidato['ultimo_evento'] = momento
+
+    def revisar(self) -> None:
+        """Procesa los eventos recibidos y encola los PDFs que ya están estables"""
+        self._recibir_eventos()
+        ahora = time.monotonic()
+
+        for pdf_path, candidato in list(self._candidatos.items()):
+            if ahora - candidato['ultimo_evento'] < self.espera:
+                continue
+
+            archivo = candidato['archivo']
+            try:
+                info = archivo.stat()
+            except OSError:
+                del self._candidatos[pdf_path]  # Se borró o se renombró
+                continue
+
+            firma = (info.st_size, info.st_mtime_ns)
+            if firma != candidato['firma']:
+                # Primera revisión o siguió cambiando: esperar otro intervalo
+                candidato['firma'] = firma
+                candidato['ultimo_evento'] = ahora
+                continue
+
+            if not archivo_completo(archivo):
+                candidato['ultimo_evento'] = ahora
+                continue
+
+            if not pdf_path.exists():
+                del self._candidatos[pdf_path]
+                continue
+
+            if candidato['motivo'] == 'pdf' and tiene_audio_sin_transcribir(pdf_path):
+                print(f"[→] Esperando transcripción del audio: {pdf_path.name}")
+                del self._candidatos[pdf_path]
+                continue
+
+            relativa = pdf_path.relative_to(self.root_dir)
+            if len(relativa.parts) != 3:
+                del self._candidatos[pdf_path]  # Fuera de <grupo>/<tarea>/
+                continue
+
+            pdf_info = {
+                'ruta': pdf_path,
+                'grupo': relativa.parts[0],
+                'tarea': relativa.parts[1],
+                'archivo': pdf_path.name
+            }
+            if self.encolar(pdf_info):
+                del self._candidatos[pdf_path]
+            # Si no se pudo encolar (el mismo PDF sigue en proceso) se reintenta después
+
+
+if WATCHDOG_DISPONIBLE:
+    class ManejadorEventos(FileSystemEventHandler):
+        """Reenvía los eventos de watchdog al vigilante"""
+
+        def __init__(self, vigilante: VigilanteTareas):
+            self.vigilante = vigilante
+
+        def on_created(self, event):
+            if not event.is_directory:
+                self.vigilante.notificar(Path(event.src_path))
+
+        def on_modified(self, event):
+            if not event.is_directory:
+                self.vigilante.notificar(Path(event.src_path))
+
+        def on_moved(self, event):
+            if not event.is_directory:
+                self.vigilante.notificar(Path(event.dest_path))
+
+
+def sondear(manifiesto: ManifiestoArchivos, vistos: Dict[Path, Tuple[int, int]],
+            vigilante: Optional[VigilanteTareas]) -> Dict[Path, Tuple[int, int]]:
+    """
+    Sin watchdog: notifica los archivos nuevos o cambiados según el manifiesto.
+    Sin vigilante solo retorna el estado actual (línea base).
+    """
+    # Un archivo sobrescrito no cambia el mtime de su carpeta: se revisa cada archivo
+    manifiesto.actualizar(revisar_archivos=True)
+
+    actuales = {}
+    for _, _, _, ruta, registro in manifiesto.archivos(
+            ['entrega_pendiente', 'entrega_calificada', 'otro']):
+        if pdf_de_evento(ruta) is None:
+            continue
+        actuales[ruta] = (registro[0], registro[1])
+        if vigilante is not None and vistos.get(ruta) != actuales[ruta]:
+            vigilante.notificar(ruta)
+
+    return actuales
+
+
+def main():
+    """Función principal"""
+    print("="*60)
+    print("CALIFICACIÓN AUTOMÁTICA - MODO VIGILANCIA")
+    print("="*60)
+
+    bloqueo = BloqueoFragmento(CALIFICAR_ROOT, 'calificar')
+    try:
+        # Cargar configuración
+        print("\n[+] Cargando configuración...")
+        credentials = cargar_credenciales()
+
+        print("[+] Configurando Gemini API...")
+        backend = configurar_backend(credentials)
+        print(f"    Backend: {backend.nombre_modelo}")
+
+        # Las rúbricas editadas mientras el script corre se recargan solas
+        rubricas = crear_registro_rubricas(backend)
+
+        # Los PDFs de la carpeta no los toma a la vez otra ejecución de calificar_gemini.py
+        bloqueo.tomar()
+
+        print("[+] Conectando a la base de datos...")
+        conn = conectar_db(credentials['db_config'])
+        # La conexión puede cerrarse tras horas sin actividad: se comprueba antes de cada lote
+        repositorio = RepositorioCalificaciones(conn, reconectar=True)
+        repositorio.precargar()
+
+        bitacora = BitacoraCalificacion(CALIFICAR_ROOT)
+        cache = CacheContenido(CACHE_DIR, CACHE_MAX_MB * 1024 * 1024)
+
+        stats = {'exitosos': 0, 'fallidos': 0, 'procesados': 0, 'total': 0}
+        en_curso = set()
+        lock_en_curso = threading.Lock()
+
+        def liberar(lote):
+            with lock_en_curso:
+                for pdf_info, _ in lote:
+                    en_curso.discard(clave_entrega(pdf_info))
+
+        telemetria = crear_telemetria(credentials)
+        pipeline = crear_pipeline(credentials, backend, rubricas.contexto, cache, bitacora,
+                                  repositorio, stats, telemetria,
+                                  al_guardar=liberar, intervalo_reporte=60.0)
+        pipeline.iniciar()
+
+        def encolar(pdf_info: Dict) -> bool:
+            # Un PDF no entra dos veces al pipeline al mismo tiempo
+            with lock_en_curso:
+                if clave_entrega(pdf_info) in en_curso:
+                    return False
+                en_curso.add(clave_entrega(pdf_info))
+            stats['total'] += 1
+            print(f"\n[+] En cola: {pdf_info['grupo']} / {pdf_info['tarea']} / {pdf_info['archivo']}")
+            pipeline.encolar([pdf_info])
+            return True
+
+        vigilante = VigilanteTareas(CALIFICAR_ROOT, encolar)
+
+        # Trabajo acumulado antes de arrancar
+        for pdf_info in buscar_pdfs_sin_calificar(CALIFICAR_ROOT, bitacora):
+            vigilante.notificar(pdf_info['ruta'])
+
+        observador = None
+        if WATCHDOG_DISPONIBLE:
+            observador = Observer()
+            observador.schedule(ManejadorEventos(vigilante), str(CALIFICAR_ROOT), recursive=True)
+            observador.start()
+            print(f"\n[✓] Vigilando {CALIFICAR_ROOT} (eventos del sistema de archivos)")
+        else:
+            print(f"\n[!] watchdog no está instalado; se revisará la carpeta cada "
+                  f"{INTERVALO_SONDEO:.0f}s (pip install watchdog)")
+            print(f"[✓] Vigilando {CALIFICAR_ROOT}")
+        print("    Ctrl+C para detener")
+
+        # Línea base del sondeo: lo que ya existía lo cubre buscar_pdfs_sin_calificar
+        manifiesto = ManifiestoArchivos(CALIFICAR_ROOT)
+        vistos = sondear(manifiesto, {}, None) if observador is None else {}
+        ultimo_sondeo = time.monotonic()
+
+        try:
+            while True:
+                if observador is None and time.monotonic() - ultimo_sondeo >= INTERVALO_SONDEO:
+                    vistos = sondear(manifiesto, vistos, vigilante)
+                    ultimo_sondeo = time.monotonic()
+
+                vigilante.revisar()
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            print("\n[!] Deteniendo: se terminan los PDFs que ya están en cola...")
+
+        if observador is not None:
+            observador.stop()
+            observador.join()
+
+        pipeline.cerrar()
+        backend.liberar_prefijos()
+
+        # Resumen
+        print("\n" + "="*60)
+        print("RESUMEN DE CALIFICACIONES")
+        print("="*60)
+        print(f"Total procesados: {stats['procesados']}")
+        print(f"Exitosos: {stats['exitosos']}")
+        print(f"Fallidos: {stats['fallidos']}")
+        print("="*60)
+
+        telemetria.imprimir_resumen()
+
+        conn.close()
+
+    except ErrorBloqueo as e:
+        print(f"\n[!] {e}")
+        return 1
+    except Exception as e:
+        print(f"\n[!] Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        bloqueo.liberar()
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())